@@ -0,0 +1,31 @@
+"""
+ASGI config for AbbaRestaurante project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Production runs it under gunicorn with uvicorn workers (see render.yaml):
+the high-frequency read endpoints (kitchen polling, public menu, menu and
+room bill lists) and the SSE event stream are async views, so an idle
+dashboard connection does not tie up one of a limited pool of worker
+threads. It still keeps its own idle thread: Django gives each ASGI request
+a thread for its sync_to_async calls, which lives as long as the request
+(about 250 KB per open stream, under uvicorn as under gunicorn).
+
+Like wsgi.py, importing this module does no database work.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+"""
+
+import os
+from pathlib import Path
+
+# Load environment variables from .env file
+from dotenv import load_dotenv
+env_path = Path(__file__).resolve().parent.parent / '.env'
+load_dotenv(env_path)
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AbbaRestaurante.settings')
+
+application = get_asgi_application()
@@ -10,11 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 import dj_database_url
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 from pathlib import Path
-import pusher
-import cloudinary
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -60,23 +59,36 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'cloudinary',
     'restaurant.apps.RestaurantConfig',
     
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'restaurant.middleware.StaticFilesMiddleware',  # WhiteNoise, también async (ASGI)
+    'restaurant.middleware.MetricsMiddleware',  # latencia y tiempo en BD por vista (/metrics)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    
+    'restaurant.middleware.QueryBudgetMiddleware',  # consultas por vista y @query_budget
 ]
 
+# Presupuestos de consultas SQL (restaurant/query_budget.py). Fracción de requests
+# instrumentados y, en modo estricto (tests), fallar en vez de registrar el exceso
+TESTING = sys.argv[1:2] == ['test']
+QUERY_BUDGET_SAMPLE_RATE = float(os.environ.get('QUERY_BUDGET_SAMPLE_RATE', 1.0 if DEBUG else 0.1))
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', str(TESTING)) == 'True'
+
+# Métricas Prometheus (restaurant/metrics.py). gunicorn.conf.py define este directorio: los workers
+# comparten los contadores en archivos mmap. Vacío (manage.py, runserver): contadores en memoria
+PROMETHEUS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR', '')
+# Si se define, /metrics exige el header "Authorization: Bearer <METRICS_TOKEN>";
+# sin token, fuera de DEBUG solo lo ve un usuario staff con sesión iniciada
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'AbbaRestaurante.urls'
 
 TEMPLATES = [
@@ -99,19 +111,35 @@ TEMPLATES = [
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 # Configuración de la base de datos para desarrollo y producción
 
+# Pool de conexiones por proceso (ver restaurant/db_pool.py): psycopg 3 en PostgreSQL,
+# restaurant.backends.mysql en MySQL. Conexiones máximas = workers × DB_POOL_MAX_SIZE
+DB_POOL = os.environ.get('DB_POOL', 'True') == 'True'
+DB_POOL_OPTIONS = {
+    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 4)),
+    # Segundos esperando una conexión libre antes de fallar el request
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    # Segundos que una conexión sobre min_size puede quedar inactiva
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+}
+# Revisar cada conexión al prestarla (un SELECT 1 / ping) y reemplazarla si se cayó
+DB_HEALTH_CHECKS = os.environ.get('DB_HEALTH_CHECKS', 'True') == 'True'
+
 if DEBUG:
     # Configuración para desarrollo local (MySQL)
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.mysql',
+            'ENGINE': 'restaurant.backends.mysql',  # MySQL de Django + pool de conexiones
             'NAME': os.environ.get('DB_NAME', 'abbarestaurante'),
             'USER': os.environ.get('DB_USER', 'root'),
             'PASSWORD': os.environ.get('DB_PASSWORD', 'Inacap.2025'),
             'HOST': os.environ.get('DB_HOST', 'localhost'),
             'PORT': os.environ.get('DB_PORT', '3306'),
+            'CONN_HEALTH_CHECKS': DB_HEALTH_CHECKS,
             'OPTIONS': {
                 'charset': 'utf8mb4',
                 'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                **({'pool': DB_POOL_OPTIONS} if DB_POOL else {}),
             }
         }
     }
@@ -122,7 +150,17 @@ else:
     if not DATABASE_URL:
         raise ValueError("DATABASE_URL environment variable must be set in production")
 
-    DATABASES = {'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)}
+    # Bajo ASGI cada request usa la BD desde su propio hilo: sin pool, las conexiones
+    # persistentes quedarían abiertas por hilo, así que se cierran al terminar cada request
+    DATABASES = {'default': dj_database_url.parse(
+        DATABASE_URL,
+        conn_max_age=0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        conn_health_checks=DB_HEALTH_CHECKS,
+    )}
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.mysql':
+        DATABASES['default']['ENGINE'] = 'restaurant.backends.mysql'
+    if DB_POOL:
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = DB_POOL_OPTIONS
 
 
 
@@ -155,29 +193,11 @@ PUSHER_KEY = os.environ.get('PUSHER_KEY', '')
 PUSHER_SECRET = os.environ.get('PUSHER_SECRET', '')
 PUSHER_CLUSTER = os.environ.get('PUSHER_CLUSTER', '')
 
-# Instancia del cliente Pusher para ser usada en las vistas
-# En producción, ssl=True es crucial para usar wss://
+# El cliente Pusher se construye una sola vez, al enviar el primer evento
+# (restaurant/notifications.py). En producción, ssl=True es crucial para usar wss://
 PUSHER_SSL = not DEBUG
 
-# Solo crear cliente Pusher si todas las variables están configuradas
-pusher_client = None
-if all([PUSHER_APP_ID, PUSHER_KEY, PUSHER_SECRET, PUSHER_CLUSTER]):
-    pusher_client = pusher.Pusher(
-      app_id=PUSHER_APP_ID,
-      key=PUSHER_KEY,
-      secret=PUSHER_SECRET,
-      cluster=PUSHER_CLUSTER,
-      ssl=PUSHER_SSL
-    )
-
-# Cloudinary Configuration for Cloud Storage
-cloudinary.config(
-    cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', 'dvjcrc3ei'),
-    api_key=os.environ.get('CLOUDINARY_API_KEY', '638756761769688'),
-    api_secret=os.environ.get('CLOUDINARY_API_SECRET', 'dnD4bo63Fi7PSvbo2MYqoF4q00U')
-)
-
-# Cloudinary Storage Settings
+# Cloudinary Storage Settings (restaurant/images.py configura cloudinary al usarlo por primera vez)
 CLOUDINARY_STORAGE = {
     'CLOUD_NAME': os.environ.get('CLOUDINARY_CLOUD_NAME', 'dvjcrc3ei'),
     'API_KEY': os.environ.get('CLOUDINARY_API_KEY', '638756761769688'),
@@ -187,6 +207,9 @@ CLOUDINARY_STORAGE = {
 # Use Cloudinary for media file storage in production AND development (for consistency)
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Destino de los derivados de fotos del menú (restaurant/images.py): 'cloudinary' o 'local' (MEDIA_ROOT)
+MENU_IMAGE_BACKEND = os.environ.get('MENU_IMAGE_BACKEND', 'cloudinary')
+
 # Timezone Configuration for Chile (Santiago)
 TIME_ZONE = 'America/Santiago'
 USE_TZ = True
@@ -0,0 +1,26 @@
+"""
+gunicorn settings, loaded automatically from the project directory.
+
+Workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR (see restaurant/metrics.py).
+"""
+import glob
+import os
+import tempfile
+
+# Activa el modo multiproceso de las métricas (settings.py lo lee); los workers heredan el entorno del master
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'abbarestaurante-metrics'))
+
+
+def on_starting(server):
+    # Empezar de cero: los archivos de un arranque anterior sumarían contadores de procesos muertos
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(metrics_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    # Un worker que termina deja de contar en los gauges "live" (requests en curso)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,75 @@
+"""
+MySQL backend with a per-process connection pool.
+
+Django only pools PostgreSQL connections (psycopg 3). This engine
+('restaurant.backends.mysql') accepts the same OPTIONS['pool'] setting
+(True or a dict of min_size, max_size, timeout, max_idle) and borrows
+connections from restaurant.db_pool.ConnectionPool instead of opening one
+per request. Without OPTIONS['pool'] it behaves like the stock backend.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.mysql import base
+
+from restaurant.db_pool import ConnectionPool
+
+
+def _reset(connection):
+    # Nada de una transacción a medio terminar debe pasar al siguiente request
+    connection.rollback()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    _connection_pools = {}
+
+    @property
+    def pool(self):
+        pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if self.alias == NO_DB_ALIAS or not pool_options:
+            return None
+
+        if self.alias not in self._connection_pools:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured("El pool de conexiones no admite conexiones persistentes (CONN_MAX_AGE)")
+            if pool_options is True:
+                pool_options = {}
+            conn_params = self.get_connection_params()
+            pool = ConnectionPool(
+                connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                check=(lambda connection: connection.ping()) if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                reset=_reset,
+                **pool_options,
+            )
+            # Si dos hilos crean el pool a la vez, gana el primero
+            self._connection_pools.setdefault(self.alias, pool)
+        return self._connection_pools[self.alias]
+
+    def close_pool(self):
+        if self.pool:
+            self.pool.close()
+            del self._connection_pools[self.alias]
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        if self.pool:
+            return self.pool.getconn()
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        if self.connection is not None and self.pool:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
+                # La conexión vuelve al pool: este wrapper ya no puede usarla
+                self.connection = None
+            return
+        return super()._close()
+
+    def close_if_health_check_failed(self):
+        if self.pool:
+            # El pool revisa las conexiones al prestarlas
+            return
+        return super().close_if_health_check_failed()
@@ -0,0 +1,170 @@
+"""
+Versioned in-process cache of the menu catalog.
+
+The menu changes a few times a day but is read on every waiter, admin and
+public menu page. MenuCatalog is an immutable snapshot of all menu items
+with their image URLs resolved, the category groupings and the JSON
+payloads the views embed, built once per catalog version.
+
+The version is the pair of ResourceVersion counters 'menu' and 'categories',
+which the post_save/post_delete signals bump on every MenuItem or Category
+change. Each process checks the counters at most once every
+MENU_CATALOG_CHECK_INTERVAL seconds (one primary key query) and rebuilds
+the snapshot lazily when they moved; in between, reads cost no queries.
+Changes made in this process are picked up right after they commit.
+"""
+import json
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from .image_urls import responsive_images, thumbnail_fields
+from .models import Category, MenuItem, ResourceVersion
+
+MENU_CATALOG_CHECK_INTERVAL = getattr(settings, 'MENU_CATALOG_CHECK_INTERVAL', 2)
+
+# Recursos cuyo contador forma la versión del catálogo
+CATALOG_RESOURCES = ('menu', 'categories')
+
+_catalog = None
+_versions = None
+_next_check = 0.0
+_lock = threading.Lock()
+
+
+class MenuCatalog:
+    """
+    Snapshot of the menu at one catalog version.
+
+    Attributes:
+        version (str): e.g. 'menu12-categories3', usable as an ETag
+        items (list): Item dicts (id, name, description, price, category,
+            available, image_url, images) ordered by category and name;
+            images holds the src/srcset of each size class (image_urls.py)
+        grouped_menu (dict): Category name -> item dicts, 'Otros' for items
+            without category (public menu)
+        waiter_items (list): Available item dicts (waiter order form)
+        waiter_categories (list): Sorted, capitalized categories of the
+            available items (duplicates like 'Pizzas'/'pizzas' merged)
+        categories (list): Category dicts as returned by api_categories
+        items_json (str): All items, as returned by api_menu_items
+        waiter_items_json (str): Available items for the waiter dashboard
+        pages (dict): Rendered public menu pages (page_cache.CachedPage) of
+            this version, filled on first request
+    """
+
+    def __init__(self, version, items, categories):
+        self.version = version
+        self.items = items
+        self.categories = categories
+
+        self.grouped_menu = {}
+        for item in items:
+            self.grouped_menu.setdefault(item['category'] or 'Otros', []).append(item)
+
+        self.waiter_items = [item for item in items if item['available']]
+        self.waiter_categories = sorted({item['category'].capitalize() for item in self.waiter_items})
+
+        self.items_json = json.dumps([serialize_menu_item(item) for item in items])
+        self.waiter_items_json = json.dumps([{
+            'id': item['id'],
+            'name': item['name'],
+            'price': float(item['price']),
+            'image_url': item['image_url'],
+            **thumbnail_fields(item['images']),
+            'description': item['description'],
+        } for item in self.waiter_items])
+
+        self.pages = {}
+
+
+def serialize_menu_item(item):
+    """JSON-ready dict of a catalog item (api_menu_items format)."""
+    return {
+        'id': item['id'],
+        'name': item['name'],
+        'description': item['description'],
+        'price': float(item['price']),
+        'category': item['category'],
+        'available': item['available'],
+        'image_url': item['image_url'],
+        **thumbnail_fields(item['images']),
+    }
+
+
+def build_menu_catalog(version):
+    """Load the menu from the database into a new MenuCatalog."""
+    items = [{
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'price': item.price,
+        'category': item.category,
+        'available': item.available,
+        'image_url': item.image_url,
+        'images': responsive_images(item),
+    } for item in MenuItem.objects.order_by('category', 'name')]
+
+    categories = [{
+        'id': category.id,
+        'name': category.name,
+        'description': category.description or '',
+        'created_at': category.created_at.isoformat(),
+    } for category in Category.objects.order_by('name')]
+
+    return MenuCatalog(version, items, categories)
+
+
+def catalog_versions():
+    """
+    Current {'menu': n, 'categories': n} counters, re-read from the database
+    at most once every MENU_CATALOG_CHECK_INTERVAL seconds.
+    """
+    global _versions, _next_check
+    if _versions is not None and time.monotonic() < _next_check:
+        return _versions
+    with _lock:
+        if _versions is None or time.monotonic() >= _next_check:
+            _versions = ResourceVersion.get_versions(*CATALOG_RESOURCES)
+            _next_check = time.monotonic() + MENU_CATALOG_CHECK_INTERVAL
+        return _versions
+
+
+def get_menu_catalog():
+    """
+    The MenuCatalog for the current catalog version, rebuilt if it changed.
+    """
+    global _catalog
+    versions = catalog_versions()
+    version = '-'.join(f'{name}{versions[name]}' for name in CATALOG_RESOURCES)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+    with _lock:
+        if _catalog is None or _catalog.version != version:
+            _catalog = build_menu_catalog(version)
+        return _catalog
+
+
+async def aget_menu_catalog():
+    """
+    get_menu_catalog() for async views. While the catalog is current it is
+    returned without leaving the event loop; checks and rebuilds run in a thread.
+    """
+    versions = _versions
+    catalog = _catalog
+    if versions is not None and catalog is not None and time.monotonic() < _next_check:
+        if catalog.version == '-'.join(f'{name}{versions[name]}' for name in CATALOG_RESOURCES):
+            return catalog
+    return await sync_to_async(get_menu_catalog)()
+
+
+def invalidate_menu_catalog():
+    """Force a version check on the next read, once the current transaction commits."""
+    def _expire():
+        global _next_check
+        _next_check = 0.0
+    transaction.on_commit(_expire)
@@ -0,0 +1,199 @@
+"""
+Database connection pooling.
+
+Each process keeps a pool of open connections per database alias.
+Requests borrow one when they first touch the database, and Django hands
+it back when it closes the connection at the end of the request
+(CONN_MAX_AGE = 0). A poll therefore costs no new connection, and the
+connection count is bounded by workers × max_size.
+
+- PostgreSQL: Django's native psycopg 3 pool (OPTIONS['pool']).
+- MySQL: ConnectionPool below, used by the restaurant.backends.mysql
+  engine with the same OPTIONS['pool'] settings.
+
+Settings (OPTIONS['pool'], built from DB_POOL_* in settings.py): min_size,
+max_size, timeout (seconds to wait for a free connection before failing)
+and max_idle (seconds before closing an idle connection above min_size).
+With CONN_HEALTH_CHECKS, connections are checked when they are borrowed.
+
+pool_stats() returns the pool metrics of this process (in use, waits,
+timeouts, ...); /restaurant/ready/ includes them.
+"""
+import threading
+import time
+from collections import Counter, deque
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections.
+
+    Mirrors the parts of psycopg_pool.ConnectionPool that Django's pooled
+    backends use (open, getconn, putconn, close, get_stats), with the same
+    statistic names, so pool_stats() reads both alike.
+
+    Args:
+        connect (callable): Opens a new connection
+        check (callable): Optional; raises if a borrowed connection is broken
+        reset (callable): Optional; cleans a returned connection, raises if unusable
+    """
+
+    def __init__(self, connect, min_size=1, max_size=4, timeout=10.0, max_idle=300.0,
+                 check=None, reset=None):
+        self._connect = connect
+        self._check = check
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        # (conexión, momento en que se devolvió); las más recientes al final
+        self._idle = deque()
+        self._size = 0
+        self._waiting = 0
+        self._stats = Counter()
+        self._cond = threading.Condition()
+
+    def open(self):
+        """Compatibility with psycopg_pool: connections are opened on demand."""
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            self._stats['requests_num'] += 1
+            queued = False
+            while True:
+                self._expire_idle()
+                if self._idle:
+                    connection, _ = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reservar el lugar y conectar fuera del lock
+                    self._size += 1
+                    connection = None
+                    break
+                if not queued:
+                    queued = True
+                    self._stats['requests_queued'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['requests_errors'] += 1
+                    raise PoolTimeout(f"No hubo conexión libre en {self.timeout:g} s (max_size={self.max_size})")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if queued:
+                self._stats['requests_wait_ms'] += int((time.monotonic() - start) * 1000)
+
+        if connection is not None and self._check is not None:
+            try:
+                self._check(connection)
+            except Exception:
+                # Conexión caída: descartarla y abrir otra en su lugar
+                self._count('connections_lost')
+                self._close_quietly(connection)
+                connection = None
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._stats['connections_errors'] += 1
+                    self._cond.notify()
+                raise
+            self._count('connections_num')
+        return connection
+
+    def putconn(self, connection):
+        if self._reset is not None:
+            try:
+                self._reset(connection)
+            except Exception:
+                self._count('returns_bad')
+                self._discard(connection)
+                return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+        for connection, _ in idle:
+            self._close_quietly(connection)
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                'pool_min': self.min_size,
+                'pool_max': self.max_size,
+                'pool_size': self._size,
+                'pool_available': len(self._idle),
+                'requests_waiting': self._waiting,
+                **self._stats,
+            }
+
+    def _count(self, stat):
+        with self._cond:
+            self._stats[stat] += 1
+
+    def _expire_idle(self):
+        """Close the oldest idle connections past max_idle (keeping min_size). Holds the lock."""
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            connection, _ = self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(connection)
+
+    def _discard(self, connection):
+        self._close_quietly(connection)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def pool_stats(alias=DEFAULT_DB_ALIAS):
+    """
+    Connection pool metrics of this process.
+
+    Returns:
+        dict: max_size, size (open connections), in_use, idle, waiting
+            (threads waiting right now), requests, waits (requests that had
+            to wait), wait_ms, timeouts, connections_opened, connections_lost;
+            None if the alias is not pooled
+    """
+    pool = getattr(connections[alias], 'pool', None)
+    if pool is None:
+        return None
+    stats = pool.get_stats()
+    return {
+        'max_size': stats.get('pool_max', 0),
+        'size': stats.get('pool_size', 0),
+        'in_use': stats.get('pool_size', 0) - stats.get('pool_available', 0),
+        'idle': stats.get('pool_available', 0),
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'waits': stats.get('requests_queued', 0),
+        'wait_ms': stats.get('requests_wait_ms', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'connections_opened': stats.get('connections_num', 0),
+        'connections_lost': stats.get('connections_lost', 0) + stats.get('returns_bad', 0),
+    }
@@ -0,0 +1,142 @@
+"""
+View decorators for the restaurant app.
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.decorators import user_passes_test
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .catalog import CATALOG_RESOURCES, catalog_versions
+from .models import OrderChange, ResourceVersion
+from .query_budget import QueryBudget
+from .roles import has_role
+
+
+def require_role(*roles, allow_superuser=False):
+    """
+    Restrict a view to users that belong to any of the given roles.
+
+    Roles are resolved through the cached role lookup in roles.py, so the
+    check costs no extra queries once the user's groups are cached. Like
+    user_passes_test, unauthorized users are redirected to the login page.
+
+    Usage:
+        @login_required
+        @require_role('Garzón', 'Administrador')
+        def my_view(request): ...
+    """
+    return user_passes_test(lambda u: has_role(u, *roles, allow_superuser=allow_superuser))
+
+
+def resource_stamp(*resources):
+    """
+    Build a cheap version stamp for the given resources.
+
+    'orders' uses the settled revision of the order change feed
+    (OrderChange.snapshot_revision(), the revision api_orders returns): it
+    stops before a revision whose transaction may still be in flight, so the
+    stamp changes when that transaction commits. 'date' is the local date
+    (for endpoints whose result depends on "today"), 'menu' and 'categories'
+    come from the menu catalog's periodically checked versions and any other
+    name is looked up in ResourceVersion.
+
+    Returns:
+        str: A stamp such as 'orders42-menu7'
+    """
+    named = [r for r in resources if r not in ('orders', 'date') + CATALOG_RESOURCES]
+    versions = ResourceVersion.get_versions(*named) if named else {}
+    if set(resources) & set(CATALOG_RESOURCES):
+        versions.update(catalog_versions())
+    parts = []
+    for resource in resources:
+        if resource == 'orders':
+            version = OrderChange.snapshot_revision()
+        elif resource == 'date':
+            version = timezone.localdate().isoformat()
+        else:
+            version = versions[resource]
+        parts.append(f'{resource}{version}')
+    return '-'.join(parts)
+
+
+def etag_versioned(*resources):
+    """
+    Conditional GET for read endpoints backed by the given resources.
+
+    The ETag is computed from resource_stamp() before the view runs, so a
+    matching If-None-Match returns 304 without running the ORM query or the
+    JSON serialization. Other methods (POST, PUT, DELETE) pass through.
+    Apply it below the authentication decorators so a 304 is never sent to
+    an unauthorized user. Works on sync and async views.
+
+    Usage:
+        @login_required
+        @etag_versioned('orders', 'menu')
+        def my_view(request): ...
+    """
+    def etag_func(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        return resource_stamp(*resources)
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _async_view(request, *args, **kwargs):
+                # condition() llama a etag_func dentro del event loop: calcular el sello
+                # (consultas síncronas) en un hilo y entregarlo ya listo
+                stamp = await sync_to_async(etag_func)(request, *args, **kwargs)
+                conditional_view = condition(etag_func=lambda *a, **kw: stamp)(view_func)
+                response = await conditional_view(request, *args, **kwargs)
+                if response.has_header('ETag'):
+                    patch_cache_control(response, private=True, no_cache=True)
+                return response
+            return _async_view
+
+        conditional_view = condition(etag_func=etag_func)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                # Permite que el navegador guarde la respuesta pero siempre revalide
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def query_budget(queries=None, duplicates=None, db_ms=None):
+    """
+    Declare the SQL query budget of a view, enforced by QueryBudgetMiddleware.
+
+    A request over budget is logged (QUERY_BUDGET_STRICT: raises
+    QueryBudgetExceeded, so tests fail). The count includes the session and
+    user lookups of the request. Works at any position in the decorator stack,
+    since functools.wraps copies the attribute to the outer wrappers.
+
+    `queries` is the highest count measured (with `manage.py simulate_dinner_rush
+    --max-lines 30` on SQLite and PostgreSQL, sequential and --concurrent, and
+    with direct requests on a cold cache for orders of 1 to 40 lines and every
+    method of the view) plus 25%, rounded up and at least 2 more. The measured
+    maximum is noted next to each budget.
+
+    Args:
+        queries (int): Maximum queries per request
+        duplicates (int): Maximum executions of the same query fingerprint (N+1)
+        db_ms (float): Maximum database time per request, in milliseconds
+
+    Usage:
+        @login_required
+        @query_budget(queries=8, duplicates=1)
+        def my_view(request): ...
+    """
+    budget = QueryBudget(queries=queries, duplicates=duplicates, db_ms=db_ms)
+
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
@@ -0,0 +1,394 @@
+"""
+Self-hosted real-time events (Server-Sent Events).
+
+notify() (notifications.py) publishes every event to the broadcaster in
+addition to Pusher. /restaurant/api/events/?channels=cocina,garzon streams
+the events of those channels to the browser as SSE, with the same event
+names the signals send to Pusher ('nuevo-pedido', 'actualizacion-estado',
+'pedido-listo', 'cargo-habitacion', 'pedido-pagado', 'item-disponibilidad').
+
+Two backends (EVENTS_BACKEND):
+
+- 'memory': subscribers of this process only. Enough for a single worker
+  and for development/offline use.
+- 'postgres': events are published with pg_notify() and one listener
+  thread per process LISTENs and fans them out to its local subscribers,
+  so every worker sees the events of every other worker.
+
+'auto' (default) picks 'postgres' when the database is PostgreSQL.
+
+Each subscriber has a bounded queue; a subscriber that falls too far
+behind is closed, and its browser reconnects and resynchronizes.
+
+Event log: notify() also records every event in RealtimeEvent, whose
+primary key is a global sequence number. SSE frames carry it as the event
+id, so a reconnecting EventSource sends Last-Event-ID and gets only the
+events it missed; /restaurant/api/events/log/?after=<seq> returns the same
+replay as JSON (used by Pusher clients). The log keeps EVENT_LOG_RETENTION
+seconds and at most EVENT_LOG_MAX_EVENTS events; a client whose sequence
+fell out of the window is told to resynchronize ('resync').
+"""
+import asyncio
+import json
+import queue
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+EVENTS_BACKEND = getattr(settings, 'EVENTS_BACKEND', 'auto')
+# Comentario de keepalive si no hubo eventos en este tiempo (detecta clientes desconectados)
+SSE_KEEPALIVE = getattr(settings, 'SSE_KEEPALIVE', 15)
+# Duración máxima de un stream; el navegador reconecta solo (EventSource)
+SSE_STREAM_TIMEOUT = getattr(settings, 'SSE_STREAM_TIMEOUT', 300)
+SSE_RETRY_MS = 3000
+SUBSCRIBER_QUEUE_SIZE = 200
+
+# Ventana del registro de eventos: segundos y cantidad máxima de eventos
+EVENT_LOG_RETENTION = getattr(settings, 'EVENT_LOG_RETENTION', 6 * 60 * 60)
+EVENT_LOG_MAX_EVENTS = getattr(settings, 'EVENT_LOG_MAX_EVENTS', 5000)
+# Podar el registro cada tantas inserciones
+EVENT_LOG_PRUNE_EVERY = 200
+# Eventos por respuesta de replay; si faltan más, el cliente debe resincronizar
+EVENT_REPLAY_LIMIT = 500
+
+PG_NOTIFY_CHANNEL = 'restaurant_events'
+# pg_notify acepta hasta 8000 bytes de payload
+PG_NOTIFY_MAX_BYTES = 7900
+
+# Canal SSE (?channels=) -> roles que pueden escucharlo (Administrador y superusuarios, todos)
+SSE_CHANNEL_ROLES = {
+    'cocina': ('Cocinero',),
+    'garzon': ('Garzón',),
+    'recepcion': ('Recepcionista',),
+    'admin': (),
+}
+
+
+def pusher_channel(name):
+    """Pusher/broadcaster channel of an SSE channel name ('cocina' -> 'cocina-channel')."""
+    return f'{name}-channel'
+
+
+def record_event(channels, event_name, data):
+    """Append an event to the log and return its sequence number."""
+    from .models import RealtimeEvent
+
+    seq = RealtimeEvent.record(channels, event_name, data)
+    if seq % EVENT_LOG_PRUNE_EVERY == 0:
+        prune_event_log(seq)
+    return seq
+
+
+def prune_event_log(latest_seq=None):
+    """
+    Delete events outside the retention window. The newest event is always
+    kept, so the log still knows the current sequence after a quiet period.
+
+    Returns:
+        int: Number of events deleted
+    """
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import RealtimeEvent
+
+    if latest_seq is None:
+        latest_seq = RealtimeEvent.latest_seq()
+    cutoff = timezone.now() - timedelta(seconds=EVENT_LOG_RETENTION)
+    deleted, _ = RealtimeEvent.objects.filter(
+        Q(seq__lte=latest_seq - EVENT_LOG_MAX_EVENTS) | Q(created_at__lt=cutoff, seq__lt=latest_seq)
+    ).delete()
+    return deleted
+
+
+def replay_events(channels, after, limit=EVENT_REPLAY_LIMIT):
+    """
+    Events of `channels` with a sequence number greater than `after`.
+
+    Returns:
+        dict: {'events': [{'seq', 'name', 'data'}, ...], 'last_seq': sequence
+            to resume from, 'resync': True when events after `after` are no
+            longer in the log (or exceed `limit`) and the client must reload
+            its state instead}
+    """
+    from django.db.models import Max, Min
+    from .models import RealtimeEvent
+
+    bounds = RealtimeEvent.objects.aggregate(first=Min('seq'), last=Max('seq'))
+    last_seq = bounds['last'] or 0
+    # Hueco: lo siguiente a `after` ya se podó, o `after` viene de otra base de datos
+    if bounds['first'] is None:
+        gap = after > 0
+    else:
+        gap = after < bounds['first'] - 1 or after > last_seq
+    if gap:
+        return {'events': [], 'last_seq': last_seq, 'resync': True}
+
+    events = [event.as_event() for event in RealtimeEvent.after(after, channels)[:limit + 1]]
+    if len(events) > limit:
+        return {'events': [], 'last_seq': last_seq, 'resync': True}
+    return {'events': events, 'last_seq': max([last_seq] + [event['seq'] for event in events]), 'resync': False}
+
+
+class Subscription:
+    """
+    Events of some channels, queued for one SSE client.
+
+    With `loop`, the queue is an asyncio.Queue read with aget() from that
+    event loop (ASGI); put() may still be called from any thread.
+    """
+
+    def __init__(self, channels, loop=None):
+        self.channels = frozenset(channels)
+        self.closed = False
+        self._loop = loop
+        if loop is None:
+            self._queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        else:
+            self._queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        if self._loop is None:
+            self._put_nowait(event)
+            return
+        try:
+            # El asyncio.Queue solo se toca desde su event loop
+            self._loop.call_soon_threadsafe(self._put_nowait, event)
+        except RuntimeError:
+            # Event loop cerrado
+            self.closed = True
+
+    def _put_nowait(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            # Cliente demasiado lento: cerrar para que reconecte y resincronice
+            self.closed = True
+
+    def get(self, timeout):
+        """Next event dict, or None after `timeout` seconds without events."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        """get() for subscriptions bound to an event loop."""
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroadcaster:
+    """In-process fan-out of events to SSE subscriptions."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        """True when published events can reach a subscriber."""
+        return bool(self._subscriptions)
+
+    def subscribe(self, channels, loop=None):
+        subscription = Subscription(channels, loop)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def deliver(self, event):
+        """Queue an event ({'channel', 'name', 'data', 'seq'}) for the local subscribers."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if event['channel'] in subscription.channels:
+                subscription.put(event)
+
+    def publish(self, channels, event_name, data, seq=None):
+        for channel in channels:
+            self.deliver({'channel': channel, 'name': event_name, 'data': data, 'seq': seq})
+
+
+class PostgresEventBroadcaster(EventBroadcaster):
+    """
+    Broadcaster shared by all processes through PostgreSQL LISTEN/NOTIFY.
+
+    Events are published with pg_notify() on the caller's connection (after
+    commit, so autocommit sends them right away); each process runs one
+    listener thread on a dedicated connection.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    @property
+    def active(self):
+        # Otros procesos pueden tener suscriptores
+        return True
+
+    def subscribe(self, channels, loop=None):
+        self._ensure_listener()
+        return super().subscribe(channels, loop)
+
+    def publish(self, channels, event_name, data, seq=None):
+        payloads = []
+        for channel in channels:
+            event = {'channel': channel, 'name': event_name, 'data': data, 'seq': seq}
+            payload = json.dumps(event, cls=DjangoJSONEncoder)
+            if len(payload.encode('utf-8')) > PG_NOTIFY_MAX_BYTES:
+                if seq is None:
+                    print(f"[EVENTS] {event_name} too large for pg_notify ({len(payload)} bytes), delivered locally only")
+                    self.deliver(json.loads(payload))
+                    continue
+                # Solo la referencia: cada listener lee el evento del registro
+                payload = json.dumps({'channel': channel, 'seq': seq})
+            payloads.append(payload)
+        if not payloads:
+            return
+        # Un solo round-trip para todos los canales del evento
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload', [PG_NOTIFY_CHANNEL, payloads])
+
+    def _ensure_listener(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen_forever, name='events-listener', daemon=True)
+                self._listener.start()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"[EVENTS] Listener error, reconnecting: {str(e)}")
+                time.sleep(1)
+
+    def _listen(self):
+        # Conexión propia (psycopg 3), fuera del pool y del manejo por request de Django
+        conn = connection.Database.connect(**connection.get_connection_params(), autocommit=True)
+        try:
+            conn.execute(f'LISTEN {PG_NOTIFY_CHANNEL}')
+            while True:
+                for notification in conn.notifies(timeout=SSE_KEEPALIVE):
+                    self.deliver(self._resolve(json.loads(notification.payload)))
+                # Sin notificaciones: comprobar que la conexión sigue viva
+                conn.execute('SELECT 1')
+        finally:
+            conn.close()
+
+    def _resolve(self, event):
+        """Complete a by-reference notification ({'channel', 'seq'}) from the event log."""
+        if 'name' in event:
+            return event
+        from .models import RealtimeEvent
+
+        try:
+            logged = RealtimeEvent.objects.get(seq=event['seq'])
+        finally:
+            # Este hilo no atiende requests: devolver la conexión (al pool) de inmediato
+            connection.close()
+        return {'channel': event['channel'], **logged.as_event()}
+
+
+def build_broadcaster():
+    backend = EVENTS_BACKEND
+    if backend == 'auto':
+        backend = 'postgres' if connection.vendor == 'postgresql' else 'memory'
+    return PostgresEventBroadcaster() if backend == 'postgres' else EventBroadcaster()
+
+
+broadcaster = build_broadcaster()
+
+
+def format_sse(event):
+    """SSE frame of an event dict; its sequence number becomes the event id."""
+    data = json.dumps(event['data'], cls=DjangoJSONEncoder)
+    event_id = f"id: {event['seq']}\n" if event.get('seq') is not None else ''
+    return f"{event_id}event: {event['name']}\ndata: {data}\n\n"
+
+
+def _replay_frames(subscription, after):
+    """
+    SSE frames of the logged events a client missed since `after`
+    (or a 'resync' frame), and the sequence the live stream resumes from.
+    """
+    if after is None:
+        return [], 0
+    replay = replay_events(subscription.channels, after)
+    frames = [format_sse(event) for event in replay['events']]
+    if replay['resync']:
+        frames.insert(0, format_sse({'seq': replay['last_seq'], 'name': 'resync', 'data': {'last_seq': replay['last_seq']}}))
+    return frames, replay['last_seq']
+
+
+def _release_db_connection():
+    """
+    Close this thread's database connection: after the replay a stream does
+    not use the database, and would otherwise hold a connection for minutes.
+    """
+    connection.close()
+
+
+def sse_stream(subscription, after=None, timeout=SSE_STREAM_TIMEOUT):
+    """
+    Generator of SSE frames for a subscription; unsubscribes when the
+    client disconnects, the subscription is closed or `timeout` expires.
+
+    With `after` (the client's Last-Event-ID), the logged events it missed
+    are sent first, or a 'resync' event when they are no longer available.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        # La suscripción ya está activa: lo que llegue durante el replay queda en cola
+        frames, last_seq = _replay_frames(subscription, after)
+        _release_db_connection()
+        yield from frames
+        while not subscription.closed and time.monotonic() < deadline:
+            event = subscription.get(timeout=min(SSE_KEEPALIVE, max(deadline - time.monotonic(), 0)))
+            if event is None:
+                yield ': keepalive\n\n'
+            elif event.get('seq') is None or event['seq'] > last_seq:
+                yield format_sse(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+async def asse_stream(channels, after=None, timeout=SSE_STREAM_TIMEOUT):
+    """
+    sse_stream() as an async generator, for ASGI: a waiting client does not
+    tie up one of the server's worker threads. It still keeps the idle thread
+    Django gives each ASGI request for sync_to_async (about 250 KB per stream).
+    It subscribes on the running event loop when iteration starts.
+    """
+    subscription = broadcaster.subscribe(channels, loop=asyncio.get_running_loop())
+    deadline = time.monotonic() + timeout
+    try:
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        frames, last_seq = await sync_to_async(_replay_frames)(subscription, after)
+        await sync_to_async(_release_db_connection)()
+        for frame in frames:
+            yield frame
+        while not subscription.closed and time.monotonic() < deadline:
+            event = await subscription.aget(timeout=min(SSE_KEEPALIVE, max(deadline - time.monotonic(), 0)))
+            if event is None:
+                yield ': keepalive\n\n'
+            elif event.get('seq') is None or event['seq'] > last_seq:
+                yield format_sse(event)
+    finally:
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1,216 @@
+"""
+Background export jobs.
+
+request_export() stores an ExportJob row and, once the transaction commits,
+hands its id to an in-process thread pool. The worker claims the job with an
+atomic UPDATE (so a job is never run twice, even if several processes pick
+it up), writes the file under EXPORT_ROOT and sends an 'exportacion-lista'
+Pusher event. Clients can also poll the job status endpoint.
+
+A request with the same kind, format and filters as a job created less than
+EXPORT_CACHE_TTL seconds ago reuses that job and its artifact instead of
+generating the file again.
+
+Jobs left pending by a restarted process are picked up again the next time
+the pool starts, or by `python manage.py process_export_jobs`, which also
+removes artifacts older than EXPORT_RETENTION.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics
+from .exports import EXPORTERS
+from .models import ExportJob
+from .notifications import notify
+
+EXPORT_ROOT = getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+EXPORT_WORKERS = getattr(settings, 'EXPORT_WORKERS', 2)
+EXPORT_CACHE_TTL = getattr(settings, 'EXPORT_CACHE_TTL', 600)
+EXPORT_RETENTION = getattr(settings, 'EXPORT_RETENTION', 24 * 60 * 60)
+# Un job 'running' más antiguo que esto se da por perdido (proceso reiniciado)
+EXPORT_JOB_TIMEOUT = getattr(settings, 'EXPORT_JOB_TIMEOUT', 30 * 60)
+
+# Filtros aceptados por cada tipo de exportación (los mismos que las vistas síncronas)
+EXPORT_FILTERS = {
+    'orders': ('search', 'status', 'date_from', 'date_to'),
+    'roombills': ('status', 'date_from', 'date_to', 'room'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def normalize_filters(kind, filters):
+    """Keep only the known, non-empty filters of an export kind."""
+    normalized = {}
+    for key in EXPORT_FILTERS[kind]:
+        value = str(filters.get(key) or '').strip()
+        if value:
+            normalized[key] = value
+    return normalized
+
+
+def export_filters_hash(kind, export_format, filters):
+    payload = json.dumps([kind, export_format, filters], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def artifact_path(job):
+    return os.path.join(EXPORT_ROOT, job.file_path)
+
+
+def serialize_export_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'format': job.format,
+        'filters': job.filters,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'row_count': job.row_count,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': reverse('restaurant:api_export_job_download', args=[job.id]) if job.status == 'done' else None,
+    }
+
+
+def _get_executor():
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export-job')
+            # Retomar jobs que quedaron pendientes antes de un reinicio
+            for job_id in ExportJob.objects.filter(status='pending').values_list('id', flat=True):
+                _executor.submit(_run_in_thread, job_id)
+    return _executor
+
+
+def _run_in_thread(job_id):
+    try:
+        run_export_job(job_id)
+    finally:
+        # Cada hilo abre su propia conexión: cerrarla al terminar
+        connection.close()
+
+
+def submit_export_job(job_id):
+    """Hand a pending job to the background pool."""
+    _get_executor().submit(_run_in_thread, job_id)
+
+
+def request_export(kind, export_format, filters, user=None):
+    """
+    Enqueue an export, or reuse a recent job with identical filters.
+
+    Args:
+        kind (str): 'orders' or 'roombills'
+        export_format (str): 'xlsx' or 'csv'
+        filters (dict): Report filters (see EXPORT_FILTERS)
+        user (User): User requesting the export
+
+    Returns:
+        tuple: (ExportJob, reused)
+
+    Raises:
+        ValueError: If kind or format are not supported
+    """
+    if (kind, export_format) not in EXPORTERS:
+        raise ValueError(f'Exportación no soportada: {kind}.{export_format}')
+
+    filters = normalize_filters(kind, filters)
+    filters_hash = export_filters_hash(kind, export_format, filters)
+
+    cutoff = timezone.now() - timedelta(seconds=EXPORT_CACHE_TTL)
+    recent = ExportJob.objects.filter(
+        filters_hash=filters_hash,
+        status__in=('pending', 'running', 'done'),
+        created_at__gte=cutoff,
+    ).order_by('-created_at').first()
+    if recent and (recent.status != 'done' or os.path.exists(artifact_path(recent))):
+        return recent, True
+
+    job = ExportJob.objects.create(
+        kind=kind,
+        format=export_format,
+        filters=filters,
+        filters_hash=filters_hash,
+        requested_by=user if user is not None and user.is_authenticated else None,
+    )
+    transaction.on_commit(lambda: submit_export_job(job.id))
+    return job, False
+
+
+def run_export_job(job_id):
+    """
+    Generate the artifact of a pending job in the calling thread.
+
+    Returns:
+        bool: False if the job was not pending (already claimed elsewhere)
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    started = time.perf_counter()
+    job = ExportJob.objects.get(pk=job_id)
+    filter_queryset, writer = EXPORTERS[(job.kind, job.format)]
+    file_name = f"{job.kind}_{job.id}.{job.format}"
+    path = os.path.join(EXPORT_ROOT, file_name)
+    partial_path = path + '.part'
+
+    try:
+        os.makedirs(EXPORT_ROOT, exist_ok=True)
+        with open(partial_path, 'wb') as fileobj:
+            job.row_count = writer(filter_queryset(job.filters), fileobj)
+        os.replace(partial_path, path)
+        job.status = 'done'
+        job.file_path = file_name
+    except Exception as e:
+        print(f"[EXPORT] Error generating export {job.id}: {str(e)}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file_path', 'row_count', 'error', 'finished_at'])
+    metrics.EXPORT_DURATION.labels(job.kind, job.format, job.status).observe(time.perf_counter() - started)
+    notify(['admin-channel', 'recepcion-channel'], 'exportacion-lista', lambda: serialize_export_job(job))
+    return True
+
+
+def purge_export_jobs():
+    """
+    Fail jobs stuck in 'running' and delete jobs (and files) past EXPORT_RETENTION.
+
+    Returns:
+        tuple: (stale_jobs_failed, jobs_deleted)
+    """
+    now = timezone.now()
+    stale = ExportJob.objects.filter(
+        status='running', started_at__lt=now - timedelta(seconds=EXPORT_JOB_TIMEOUT)
+    ).update(status='failed', error='Tiempo de generación agotado', finished_at=now)
+
+    expired = ExportJob.objects.filter(created_at__lt=now - timedelta(seconds=EXPORT_RETENTION)).exclude(status='running')
+    deleted = 0
+    for job in expired.iterator():
+        if job.file_path and os.path.exists(artifact_path(job)):
+            os.remove(artifact_path(job))
+        job.delete()
+        deleted += 1
+    return stale, deleted
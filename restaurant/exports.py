@@ -0,0 +1,353 @@
+"""
+Excel exports for orders and room bills.
+
+Workbooks are written with openpyxl's write-only mode: rows are appended as
+they come off a .values().iterator() queryset, so memory stays constant no
+matter how many rows are exported. The finished file is written to a
+temporary file that the views stream back with a FileResponse.
+
+The CSV writers produce the same columns for background export jobs
+(see export_jobs.py).
+"""
+import csv
+import decimal
+import io
+import tempfile
+
+from django.utils import timezone
+
+from .lazy import lazy_import
+from .models import Order, RoomBill
+from .search import search_orders
+from .utils import filter_local_dates, format_order_identifier
+
+# openpyxl solo se importa al generar el primer Excel
+openpyxl = lazy_import('openpyxl')
+openpyxl_cell = lazy_import('openpyxl.cell')
+openpyxl_styles = lazy_import('openpyxl.styles')
+openpyxl_utils = lazy_import('openpyxl.utils')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+
+# Filas que se leen de la BD por cada viaje al iterar
+EXPORT_CHUNK_SIZE = 2000
+
+
+def filter_orders_for_export(params):
+    """
+    Orders matching the report filters (search, status, date_from, date_to).
+
+    Args:
+        params: A QueryDict or dict with the filter values
+    """
+    orders = Order.objects.all()
+
+    orders = search_orders(orders, params.get('search', ''))
+
+    status_query = params.get('status', '')
+    if status_query:
+        orders = orders.filter(status=status_query)
+
+    orders = filter_local_dates(orders, params.get('date_from', ''), params.get('date_to', ''))
+
+    return orders.order_by('-created_at')
+
+
+def filter_roombills_for_export(params):
+    """
+    Room bills matching the report filters (status, date_from, date_to, room).
+
+    Args:
+        params: A QueryDict or dict with the filter values
+    """
+    bills = RoomBill.objects.all()
+
+    # Filtrado opcional por estado (puede ser múltiple separado por comas)
+    status_query = params.get('status', '')
+    if status_query:
+        if status_query != 'all':
+            statuses = status_query.split(',')
+            bills = bills.filter(status__in=statuses)
+
+    # Filtrado opcional por fecha
+    bills = filter_local_dates(bills, params.get('date_from', ''), params.get('date_to', ''))
+
+    # Filtrado opcional por habitación
+    room_query = params.get('room', '')
+    if room_query:
+        bills = bills.filter(room_number__icontains=room_query)
+
+    return bills.order_by('-created_at')
+
+
+def _styled_cell(ws, value, font=None, fill=None, alignment=None, number_format=None):
+    cell = openpyxl_cell.WriteOnlyCell(ws, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if alignment:
+        cell.alignment = alignment
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+
+def _header_row(ws, headers, fill):
+    header_font = openpyxl_styles.Font(bold=True, color="FFFFFF")
+    return [
+        _styled_cell(ws, title, font=header_font, fill=fill, alignment=openpyxl_styles.Alignment(horizontal='center'))
+        for title in headers
+    ]
+
+
+def write_orders_workbook(orders, fileobj):
+    """
+    Write the orders report to fileobj as .xlsx.
+
+    Args:
+        orders: Order queryset (see filter_orders_for_export)
+        fileobj: Binary file-like object to write to
+
+    Returns:
+        int: Number of orders written
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Pedidos")
+
+    # Define styles
+    header_fill = openpyxl_styles.PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+    total_font = openpyxl_styles.Font(bold=True)
+    currency_format = '"$"#,##0'
+
+    headers = ['ID Order', 'Cliente/Habitación', 'Estado', 'Método de Pago', 'Fecha y Hora', 'Total']
+    # Adjust column widths (must be set before the first row in write-only mode)
+    for col_num in range(1, len(headers) + 1):
+        ws.column_dimensions[openpyxl_utils.get_column_letter(col_num)].width = 20
+
+    ws.append(_header_row(ws, headers, header_fill))
+
+    status_display = dict(Order.STATUS_CHOICES)
+    payment_display = dict(Order.PAYMENT_METHOD_CHOICES)
+    rows = orders.values(
+        'id', 'room_number', 'client_identifier', 'status', 'payment_method', 'created_at', 'total_amount'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    # Write data rows
+    count = 0
+    grand_total = decimal.Decimal('0.00')
+    for order in rows:
+        final_total = order['total_amount']
+        if final_total:
+            grand_total += final_total
+        ws.append([
+            order['id'],
+            format_order_identifier(order['room_number'], order['client_identifier']),
+            status_display.get(order['status'], order['status']),
+            payment_display.get(order['payment_method'], order['payment_method']),
+            timezone.localtime(order['created_at']).strftime('%Y-%m-%d %H:%M'),
+            _styled_cell(ws, final_total, number_format=currency_format),
+        ])
+        count += 1
+
+    # Write total row (after one empty row)
+    ws.append([])
+    ws.append([
+        None, None, None, None,
+        _styled_cell(ws, "Total Vendido:", font=total_font, alignment=openpyxl_styles.Alignment(horizontal='right')),
+        _styled_cell(ws, grand_total, font=total_font, number_format=currency_format,
+                     fill=openpyxl_styles.PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")),  # Yellow fill
+    ])
+
+    wb.save(fileobj)
+    return count
+
+
+def write_roombills_workbook(bills, fileobj):
+    """
+    Write the room bills report to fileobj as .xlsx.
+
+    Args:
+        bills: RoomBill queryset (see filter_roombills_for_export)
+        fileobj: Binary file-like object to write to
+
+    Returns:
+        int: Number of bills written
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Facturas")
+
+    # Definir estilos
+    header_fill = openpyxl_styles.PatternFill(start_color="6F4E37", end_color="6F4E37", fill_type="solid")  # Color café
+    total_font = openpyxl_styles.Font(bold=True)
+    total_fill = openpyxl_styles.PatternFill(start_color="FCD34D", end_color="FCD34D", fill_type="solid")
+    currency_format = '"$"#,##0.00'
+
+    headers = ['ID Factura', 'Habitación', 'Estado', 'Subtotal', 'Propina', 'Total', 'Método de Pago', 'Fecha de Creación', 'Fecha de Pago']
+    # Ajustar ancho de columnas (antes de la primera fila en modo write-only)
+    for col_num in range(1, len(headers) + 1):
+        ws.column_dimensions[openpyxl_utils.get_column_letter(col_num)].width = 18
+
+    ws.append(_header_row(ws, headers, header_fill))
+
+    status_display = dict(RoomBill.STATUS_CHOICES)
+    payment_display = dict(RoomBill.PAYMENT_METHOD_CHOICES)
+    rows = bills.values(
+        'id', 'room_number', 'status', 'total_amount', 'tip_amount', 'payment_method', 'created_at', 'paid_at'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    # Escribir datos
+    count = 0
+    grand_total = decimal.Decimal('0.00')
+    grand_subtotal = decimal.Decimal('0.00')
+    grand_tip = decimal.Decimal('0.00')
+    for bill in rows:
+        subtotal = bill['total_amount'] - bill['tip_amount']
+        grand_total += bill['total_amount']
+        grand_subtotal += subtotal
+        grand_tip += bill['tip_amount']
+
+        local_time = timezone.localtime(bill['created_at']).strftime('%Y-%m-%d %H:%M')
+        paid_time = timezone.localtime(bill['paid_at']).strftime('%Y-%m-%d %H:%M') if bill['paid_at'] else '-'
+
+        ws.append([
+            bill['id'],
+            bill['room_number'],
+            status_display.get(bill['status'], bill['status']),
+            _styled_cell(ws, float(subtotal), number_format=currency_format),
+            _styled_cell(ws, float(bill['tip_amount']), number_format=currency_format),
+            _styled_cell(ws, float(bill['total_amount']), number_format=currency_format),
+            payment_display.get(bill['payment_method'], bill['payment_method']) if bill['payment_method'] else '-',
+            local_time,
+            paid_time,
+        ])
+        count += 1
+
+    # Escribir filas de totales (después de una fila vacía)
+    ws.append([])
+    label_alignment = openpyxl_styles.Alignment(horizontal='right')
+    # Fila de Subtotal
+    ws.append([
+        None, None,
+        _styled_cell(ws, "Subtotal:", font=total_font, alignment=label_alignment),
+        _styled_cell(ws, float(grand_subtotal), font=total_font, fill=total_fill, number_format=currency_format),
+    ])
+    # Fila de Propina
+    ws.append([
+        None, None,
+        _styled_cell(ws, "Propina:", font=total_font, alignment=label_alignment),
+        None,
+        _styled_cell(ws, float(grand_tip), font=total_font, fill=total_fill, number_format=currency_format),
+    ])
+    # Fila de Total con Propina
+    ws.append([
+        None, None,
+        _styled_cell(ws, "TOTAL CON PROPINA:", font=openpyxl_styles.Font(bold=True, size=12), alignment=label_alignment),
+        None, None,
+        _styled_cell(ws, float(grand_total), font=openpyxl_styles.Font(bold=True, size=12), fill=total_fill, number_format=currency_format),
+    ])
+
+    wb.save(fileobj)
+    return count
+
+
+def _csv_writer(fileobj):
+    # utf-8-sig para que Excel reconozca los acentos al abrir el CSV
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    return text, csv.writer(text)
+
+
+def write_orders_csv(orders, fileobj):
+    """
+    Write the orders report to fileobj as CSV (same columns as the workbook).
+
+    Returns:
+        int: Number of orders written
+    """
+    text, writer = _csv_writer(fileobj)
+    writer.writerow(['ID Order', 'Cliente/Habitación', 'Estado', 'Método de Pago', 'Fecha y Hora', 'Total'])
+
+    status_display = dict(Order.STATUS_CHOICES)
+    payment_display = dict(Order.PAYMENT_METHOD_CHOICES)
+    rows = orders.values(
+        'id', 'room_number', 'client_identifier', 'status', 'payment_method', 'created_at', 'total_amount'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    count = 0
+    for order in rows:
+        writer.writerow([
+            order['id'],
+            format_order_identifier(order['room_number'], order['client_identifier']),
+            status_display.get(order['status'], order['status']),
+            payment_display.get(order['payment_method'], order['payment_method']) or '',
+            timezone.localtime(order['created_at']).strftime('%Y-%m-%d %H:%M'),
+            order['total_amount'],
+        ])
+        count += 1
+
+    text.flush()
+    text.detach()
+    return count
+
+
+def write_roombills_csv(bills, fileobj):
+    """
+    Write the room bills report to fileobj as CSV (same columns as the workbook).
+
+    Returns:
+        int: Number of bills written
+    """
+    text, writer = _csv_writer(fileobj)
+    writer.writerow(['ID Factura', 'Habitación', 'Estado', 'Subtotal', 'Propina', 'Total', 'Método de Pago', 'Fecha de Creación', 'Fecha de Pago'])
+
+    status_display = dict(RoomBill.STATUS_CHOICES)
+    payment_display = dict(RoomBill.PAYMENT_METHOD_CHOICES)
+    rows = bills.values(
+        'id', 'room_number', 'status', 'total_amount', 'tip_amount', 'payment_method', 'created_at', 'paid_at'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    count = 0
+    for bill in rows:
+        writer.writerow([
+            bill['id'],
+            bill['room_number'],
+            status_display.get(bill['status'], bill['status']),
+            bill['total_amount'] - bill['tip_amount'],
+            bill['tip_amount'],
+            bill['total_amount'],
+            payment_display.get(bill['payment_method'], bill['payment_method']) if bill['payment_method'] else '-',
+            timezone.localtime(bill['created_at']).strftime('%Y-%m-%d %H:%M'),
+            timezone.localtime(bill['paid_at']).strftime('%Y-%m-%d %H:%M') if bill['paid_at'] else '-',
+        ])
+        count += 1
+
+    text.flush()
+    text.detach()
+    return count
+
+
+# (kind, format) -> (filter, writer), used by export_jobs.py
+EXPORTERS = {
+    ('orders', 'xlsx'): (filter_orders_for_export, write_orders_workbook),
+    ('orders', 'csv'): (filter_orders_for_export, write_orders_csv),
+    ('roombills', 'xlsx'): (filter_roombills_for_export, write_roombills_workbook),
+    ('roombills', 'csv'): (filter_roombills_for_export, write_roombills_csv),
+}
+
+
+def build_workbook_file(writer, queryset):
+    """
+    Run a workbook writer into a temporary file and rewind it for streaming.
+
+    Returns:
+        file: Binary temporary file positioned at the start
+    """
+    fileobj = tempfile.TemporaryFile()
+    try:
+        writer(queryset, fileobj)
+        fileobj.seek(0)
+    except Exception:
+        fileobj.close()
+        raise
+    return fileobj
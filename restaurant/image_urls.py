@@ -0,0 +1,137 @@
+"""
+Responsive URLs for menu photos.
+
+Pages ask for a size class ('thumb', 'card', 'full': the CSS width the
+photo is displayed at) and a device pixel ratio, and get the smallest
+image that covers it:
+
+- Photos processed by images.py: the nearest derivative in
+  MenuItem.image_variants (WebP in srcset, JPEG as the plain src).
+- Older 'cloudinary:' references: a Cloudinary delivery transformation
+  (c_fill/c_limit, w_, q_auto, f_auto), resized on Cloudinary's side.
+- Anything else (a file uploaded before the pipeline): the original URL.
+
+responsive_images() builds every src/srcset of an item once per
+(item, image_version, image) and memoizes it; the menu catalog stores the
+result in its item dicts.
+"""
+import threading
+
+from .utils import get_cloudinary_url
+
+# Tamaño -> (ancho, alto, recortar) de los derivados que genera images.py.
+# Los recortados tienen exactamente ese tamaño; 'full' conserva la proporción
+IMAGE_SIZES = {
+    'thumb': (160, 160, True),
+    'card': (480, 360, True),
+    'full': (1280, 960, False),
+}
+
+# Ancho en píxeles CSS con que se muestra cada clase de tamaño
+SIZE_CLASSES = {
+    'thumb': 80,
+    'card': 240,
+    'full': 640,
+}
+
+DEVICE_PIXEL_RATIOS = (1, 2, 3)
+
+# Entradas memorizadas antes de vaciar la caché (una por item y versión de imagen)
+MAX_MEMOIZED_ITEMS = 2000
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _derivative_for(width):
+    """Smallest derivative size at least `width` pixels wide (or the largest)."""
+    for size, (derivative_width, _, _) in sorted(IMAGE_SIZES.items(), key=lambda entry: entry[1][0]):
+        if derivative_width >= width:
+            return size
+    return 'full'
+
+
+def _cloudinary_transformation(size_class, width):
+    derivative_width, derivative_height, crop = IMAGE_SIZES[size_class]
+    if crop:
+        height = round(width * derivative_height / derivative_width)
+        return f'c_fill,w_{width},h_{height},q_auto,f_auto'
+    return f'c_limit,w_{width},q_auto,f_auto'
+
+
+def image_url(image, variants, size_class, dpr=1, image_format='jpg'):
+    """
+    URL of a menu photo for a size class and device pixel ratio.
+
+    Args:
+        image (str): MenuItem.image name ('cloudinary:<public_id>' or a path)
+        variants (dict): MenuItem.image_variants
+        size_class (str): Key of SIZE_CLASSES
+        dpr (int): Device pixel ratio
+        image_format (str): Derivative format ('jpg' or 'webp'); Cloudinary uses f_auto
+
+    Returns:
+        str: URL, or None if the item has no photo
+    """
+    width = SIZE_CLASSES[size_class] * dpr
+    if variants:
+        derivative = variants.get(_derivative_for(width)) or variants.get('full', {})
+        return derivative.get(image_format) or derivative.get('jpg')
+    if not image:
+        return None
+    if image.startswith('cloudinary:'):
+        return get_cloudinary_url(image[len('cloudinary:'):], _cloudinary_transformation(size_class, width))
+    return None
+
+
+def image_srcset(image, variants, size_class):
+    """
+    srcset with one candidate per device pixel ratio ('url 1x, url 2x, ...').
+    A derivative that covers several ratios is listed once, with the highest.
+    """
+    candidates = {}
+    for dpr in DEVICE_PIXEL_RATIOS:
+        url = image_url(image, variants, size_class, dpr, image_format='webp')
+        if url:
+            candidates[url] = dpr
+    return ', '.join(f'{url} {dpr}x' for url, dpr in candidates.items())
+
+
+def responsive_images(item):
+    """
+    src/srcset of every size class of a MenuItem, memoized per image version.
+
+    Returns:
+        dict: Size class -> {'src': url, 'srcset': str}; empty without photo.
+            Photos without derivatives or transformations fall back to
+            item.image_url with an empty srcset.
+    """
+    image = str(item.image or '')
+    key = (item.id, item.image_version, image)
+    cached = _memo.get(key)
+    if cached is not None:
+        return cached
+
+    images = {}
+    if item.image_variants or image.startswith('cloudinary:'):
+        for size_class in SIZE_CLASSES:
+            images[size_class] = {
+                'src': image_url(image, item.image_variants, size_class),
+                'srcset': image_srcset(image, item.image_variants, size_class),
+            }
+    elif image:
+        # Archivo anterior al pipeline: no hay versiones reducidas
+        original = item.image_url
+        images = {size_class: {'src': original, 'srcset': ''} for size_class in SIZE_CLASSES}
+
+    with _memo_lock:
+        if len(_memo) >= MAX_MEMOIZED_ITEMS:
+            _memo.clear()
+        _memo[key] = images
+    return images
+
+
+def thumbnail_fields(images):
+    """'thumb_url'/'thumb_srcset' entries for JSON payloads of a menu item."""
+    thumb = images.get('thumb', {})
+    return {'thumb_url': thumb.get('src'), 'thumb_srcset': thumb.get('srcset', '')}
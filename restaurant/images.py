@@ -0,0 +1,322 @@
+"""
+Menu photo pipeline.
+
+An upload is processed in the request with Pillow: the header is checked
+before decoding (pixel limit), JPEGs are decoded directly at a reduced
+scale (Image.draft) so a 12 MB phone photo never expands to full
+resolution in memory, the EXIF orientation is applied and the metadata
+dropped. Fixed-size WebP and JPEG derivatives (IMAGE_SIZES) are written to
+a spool directory and the MenuItem is marked 'processing' with a new
+image_version.
+
+Once the transaction commits, a background thread publishes the spooled
+files to the configured backend (MENU_IMAGE_BACKEND: 'cloudinary', or
+'local' to store them under MEDIA_ROOT, e.g. offline or in development),
+retrying failed uploads, and then stores the derivative URLs in
+MenuItem.image_variants. A newer upload supersedes an older one still in
+flight: only the latest image_version is ever published.
+
+Items left 'processing' by a restarted process are picked up when the
+pool starts again, or by `python manage.py process_menu_images`.
+"""
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .image_urls import IMAGE_SIZES
+from .lazy import lazy_import
+from .models import MenuItem
+
+MENU_IMAGE_BACKEND = getattr(settings, 'MENU_IMAGE_BACKEND', 'cloudinary')
+MENU_IMAGE_SPOOL = getattr(settings, 'MENU_IMAGE_SPOOL', os.path.join(settings.BASE_DIR, 'image_spool'))
+MENU_IMAGE_WORKERS = getattr(settings, 'MENU_IMAGE_WORKERS', 1)
+MENU_IMAGE_UPLOAD_RETRIES = getattr(settings, 'MENU_IMAGE_UPLOAD_RETRIES', 3)
+MENU_IMAGE_RETRY_DELAY = getattr(settings, 'MENU_IMAGE_RETRY_DELAY', 2)
+# Fotos más grandes que esto (ancho x alto) se rechazan sin decodificarlas
+MENU_IMAGE_MAX_PIXELS = getattr(settings, 'MENU_IMAGE_MAX_PIXELS', 50_000_000)
+
+# Extensión -> (formato de Pillow, opciones de guardado). Sin exif=: los metadatos no se copian
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+CLOUDINARY_FOLDER = 'restaurant/menu_items'
+LOCAL_MEDIA_DIR = 'menu_images'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def configure_cloudinary(module=None):
+    """Apply the CLOUDINARY_STORAGE credentials (runs when cloudinary is first imported)."""
+    import cloudinary
+
+    storage = getattr(settings, 'CLOUDINARY_STORAGE', {})
+    cloudinary.config(
+        cloud_name=storage.get('CLOUD_NAME'),
+        api_key=storage.get('API_KEY'),
+        api_secret=storage.get('API_SECRET'),
+    )
+
+
+# cloudinary solo se importa (y configura) al publicar o borrar la primera foto
+cloudinary_uploader = lazy_import('cloudinary.uploader', on_import=configure_cloudinary)
+cloudinary_api = lazy_import('cloudinary.api', on_import=configure_cloudinary)
+
+
+class ImageSuperseded(Exception):
+    """A newer upload (or a deletion) replaced the version being published."""
+
+
+def version_dir(item_id, version):
+    """Relative directory of one image version, shared by spool and backends."""
+    return f'item_{item_id}/v{version}'
+
+
+def spool_path(item_id, version):
+    return os.path.join(MENU_IMAGE_SPOOL, version_dir(item_id, version))
+
+
+def load_upload(fileobj):
+    """
+    Decode an uploaded photo with bounded memory, upright and in RGB.
+
+    Raises:
+        ValueError: If the file is not an image or is too large
+    """
+    try:
+        image = Image.open(fileobj)  # solo lee la cabecera
+    except UnidentifiedImageError:
+        raise ValueError('El archivo no es una imagen válida')
+    if image.width * image.height > MENU_IMAGE_MAX_PIXELS:
+        raise ValueError(f'Imagen demasiado grande ({image.width}x{image.height})')
+
+    # JPEG: decodificar directamente a 1/2, 1/4 u 1/8 de la resolución si alcanza
+    # para el derivado más grande (cuadrado: la orientación aún no se aplicó)
+    largest = max(max(width, height) for width, height, _ in IMAGE_SIZES.values())
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        # JPEG no tiene transparencia: componer sobre fondo blanco
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def write_derivatives(fileobj, target_dir):
+    """
+    Write every size/format derivative of an upload into target_dir.
+
+    Returns:
+        list: Written file names ('thumb.webp', 'thumb.jpg', ...)
+    """
+    image = load_upload(fileobj)
+    os.makedirs(target_dir, exist_ok=True)
+    written = []
+    for size, (width, height, crop) in IMAGE_SIZES.items():
+        if crop:
+            derivative = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            derivative = image.copy()
+            derivative.thumbnail((width, height), Image.LANCZOS)  # nunca amplía
+        for ext, (pil_format, options) in IMAGE_FORMATS.items():
+            file_name = f'{size}.{ext}'
+            derivative.save(os.path.join(target_dir, file_name), pil_format, **options)
+            written.append(file_name)
+    return written
+
+
+class LocalImageBackend:
+    """Stores derivatives under MEDIA_ROOT (served by serve_media_file)."""
+
+    def save(self, name, path):
+        """
+        Returns:
+            tuple: (url, image reference for MenuItem.image)
+        """
+        relative = f'{LOCAL_MEDIA_DIR}/{name}'
+        destination = os.path.join(settings.MEDIA_ROOT, relative)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(path, destination)
+        return f"{settings.MEDIA_URL.rstrip('/')}/{relative}", relative
+
+    def delete_version(self, item_id, version):
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, LOCAL_MEDIA_DIR, version_dir(item_id, version)), ignore_errors=True)
+
+
+class CloudinaryImageBackend:
+    """Uploads derivatives to Cloudinary, one asset per size and format."""
+
+    def save(self, name, path):
+        base, ext = os.path.splitext(name)
+        # Un public_id por formato: el mismo id para webp y jpg se sobrescribiría
+        result = cloudinary_uploader.upload(
+            path,
+            public_id=f'{CLOUDINARY_FOLDER}/{base}_{ext.lstrip(".")}',
+            overwrite=True,
+            resource_type='image',
+        )
+        return result.get('secure_url'), f'cloudinary:{result.get("public_id")}'
+
+    def delete_version(self, item_id, version):
+        cloudinary_api.delete_resources_by_prefix(f'{CLOUDINARY_FOLDER}/{version_dir(item_id, version)}/')
+
+
+IMAGE_BACKENDS = {
+    'local': LocalImageBackend,
+    'cloudinary': CloudinaryImageBackend,
+}
+
+
+def get_image_backend():
+    return IMAGE_BACKENDS[MENU_IMAGE_BACKEND]()
+
+
+def _get_executor():
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MENU_IMAGE_WORKERS, thread_name_prefix='menu-image')
+            # Retomar publicaciones que quedaron pendientes antes de un reinicio
+            for item_id, version in MenuItem.objects.filter(image_status='processing').values_list('id', 'image_version'):
+                _executor.submit(_run_in_thread, item_id, version)
+    return _executor
+
+
+def _run_in_thread(item_id, version):
+    try:
+        publish_menu_image(item_id, version)
+    finally:
+        # Cada hilo abre su propia conexión: cerrarla al terminar
+        connection.close()
+
+
+def submit_menu_image(item_id, version):
+    """Hand a spooled image version to the background pool."""
+    _get_executor().submit(_run_in_thread, item_id, version)
+
+
+def stage_menu_image(item, upload):
+    """
+    Process an upload into the spool and mark the item as 'processing'.
+
+    The caller saves the item; publishing starts once the transaction commits.
+
+    Raises:
+        ValueError: If the upload is not a usable image
+    """
+    version = item.image_version + 1
+    target_dir = spool_path(item.id, version)
+    try:
+        write_derivatives(upload, target_dir)
+    except Exception:
+        shutil.rmtree(target_dir, ignore_errors=True)
+        raise
+    item.image_version = version
+    item.image_status = 'processing'
+    item_id = item.id
+    transaction.on_commit(lambda: submit_menu_image(item_id, version))
+
+
+def clear_menu_image(item):
+    """Drop the item's image and derivatives; the caller saves the item."""
+    old_version = item.image_version
+    item.image = None
+    item.image_variants = {}
+    item.image_status = ''
+    # Una publicación en curso de la versión anterior queda descartada
+    item.image_version = old_version + 1
+    item_id = item.id
+    transaction.on_commit(lambda: _delete_version(item_id, old_version))
+
+
+def _delete_version(item_id, version):
+    try:
+        get_image_backend().delete_version(item_id, version)
+    except Exception as e:
+        print(f"[IMAGES] Could not delete image v{version} of item {item_id}: {str(e)}")
+
+
+def _save_with_retries(backend, name, path):
+    for attempt in range(MENU_IMAGE_UPLOAD_RETRIES + 1):
+        try:
+            return backend.save(name, path)
+        except Exception as e:
+            if attempt == MENU_IMAGE_UPLOAD_RETRIES:
+                raise
+            delay = MENU_IMAGE_RETRY_DELAY * 2 ** attempt
+            print(f"[IMAGES] Upload of {name} failed ({str(e)}), retrying in {delay}s")
+            time.sleep(delay)
+
+
+def publish_menu_image(item_id, version):
+    """
+    Push a spooled image version to the backend and store its URLs.
+
+    Returns:
+        bool: False if the version was superseded, missing or failed
+    """
+    source_dir = spool_path(item_id, version)
+    if not os.path.isdir(source_dir):
+        return False
+
+    backend = get_image_backend()
+    variants = {}
+    reference = None
+    try:
+        for size in IMAGE_SIZES:
+            for ext in IMAGE_FORMATS:
+                if not MenuItem.objects.filter(pk=item_id, image_version=version).exists():
+                    raise ImageSuperseded()
+                name = f'{version_dir(item_id, version)}/{size}.{ext}'
+                url, ref = _save_with_retries(backend, name, os.path.join(source_dir, f'{size}.{ext}'))
+                variants.setdefault(size, {})[ext] = url
+                if (size, ext) == ('full', 'jpg'):
+                    reference = ref
+    except ImageSuperseded:
+        shutil.rmtree(source_dir, ignore_errors=True)
+        _delete_version(item_id, version)
+        return False
+    except Exception as e:
+        print(f"[IMAGES] Error publishing image v{version} of item {item_id}: {str(e)}")
+        with transaction.atomic():
+            item = MenuItem.objects.select_for_update().filter(pk=item_id, image_version=version).first()
+            if item is not None:
+                item.image_status = 'failed'
+                # save() como al publicar: las señales suben la versión del menú (ETags) e invalidan el catálogo
+                item.save(update_fields=['image_status'])
+        return False
+
+    with transaction.atomic():
+        item = MenuItem.objects.select_for_update().filter(pk=item_id, image_version=version).first()
+        if item is None:
+            published = False
+        else:
+            previous = re.search(r'/v(\d+)/full', str(item.image or ''))
+            item.image = reference
+            item.image_variants = variants
+            item.image_status = 'ready'
+            # save() (no update()): las señales invalidan el catálogo y avisan por Pusher
+            item.save(update_fields=['image', 'image_variants', 'image_status'])
+            published = True
+
+    shutil.rmtree(source_dir, ignore_errors=True)
+    if not published:
+        _delete_version(item_id, version)
+    elif previous:
+        # La foto publicada anteriormente ya no se referencia
+        _delete_version(item_id, int(previous.group(1)))
+    return published
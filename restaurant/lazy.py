@@ -0,0 +1,63 @@
+"""
+Deferred imports of heavy optional modules.
+
+openpyxl, cloudinary and pusher together add a few hundred milliseconds to
+every worker start, although only exports, image uploads and notifications
+use them. Modules that need them bind a LazyModule at import time and use
+it like the real module; the import happens on first attribute access:
+
+    openpyxl_styles = lazy_import('openpyxl.styles')
+    ...
+    font = openpyxl_styles.Font(bold=True)   # openpyxl se importa aquí
+
+`python manage.py importtime` checks that none of LAZY_MODULES is imported
+while starting the app.
+"""
+import importlib
+import threading
+
+# Módulos que no deben importarse al arrancar un worker
+LAZY_MODULES = ('openpyxl', 'cloudinary', 'pusher', 'PIL', 'brotli')
+
+
+class LazyModule:
+    """
+    Stand-in for a module, imported on first attribute access.
+
+    Args:
+        name (str): Dotted module name
+        on_import (callable): Optional hook called once with the module
+            right after it is imported (e.g. to apply configuration)
+    """
+
+    def __init__(self, name, on_import=None):
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    if self._on_import is not None:
+                        self._on_import(module)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.is_loaded else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
+
+
+def lazy_import(name, on_import=None):
+    """Return a LazyModule for `name` (see LazyModule)."""
+    return LazyModule(name, on_import)
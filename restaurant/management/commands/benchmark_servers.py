@@ -0,0 +1,287 @@
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+# Servidor -> comando de gunicorn (el mismo de render.yaml antes y después de ASGI)
+SERVERS = {
+    'wsgi': ['AbbaRestaurante.wsgi:application', '--worker-class', 'gthread', '--threads', '16'],
+    'asgi': ['AbbaRestaurante.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+}
+
+# Endpoints de lectura de alta frecuencia (los que son vistas async)
+ENDPOINTS = [
+    '/restaurant/api/orders/',
+    '/restaurant/api/kitchen-orders/',
+    '/restaurant/api/roombills/unpaid-orders/',
+    '/restaurant/api/menu-items/',
+    '/restaurant/menu/',
+]
+
+# Conexión inactiva de un dashboard: el stream de eventos de cocina
+IDLE_PATH = '/restaurant/api/events/?channels=cocina'
+
+BENCHMARK_USERNAME = 'benchmark_user'
+
+
+def process_tree_rss(pid):
+    """RSS in bytes of a process and its children (Linux /proc), or None."""
+    def rss(p):
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            return 0
+        return 0
+
+    if not os.path.exists(f'/proc/{pid}'):
+        return None
+    pids = [pid]
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # El nombre (campo 2) va entre paréntesis y puede tener espacios
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return sum(rss(p) for p in pids)
+
+
+class Command(BaseCommand):
+    help = ('Compara el despliegue WSGI (gunicorn gthread) con el ASGI (gunicorn + uvicorn): '
+            'requests/segundo y latencias (p50/p95/p99) de los endpoints de lectura, métricas del pool de '
+            'conexiones a la BD y memoria por conexión inactiva (stream SSE). '
+            'Levanta cada servidor en un puerto local contra la base de datos configurada.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', default='wsgi,asgi', help='Servidores a medir (wsgi, asgi)')
+        parser.add_argument('--workers', type=int, default=1, help='Workers de gunicorn')
+        parser.add_argument('--port', type=int, default=8765, help='Puerto local')
+        parser.add_argument('--duration', type=float, default=5.0, help='Segundos de carga por endpoint')
+        parser.add_argument('--concurrency', type=int, default=16, help='Clientes simultáneos')
+        parser.add_argument('--idle', type=int, default=200, help='Conexiones inactivas (SSE) a abrir (0 = omitir)')
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = [name for name in servers if name not in SERVERS]
+        if unknown:
+            raise CommandError(f"Servidor desconocido: {', '.join(unknown)} (opciones: {', '.join(SERVERS)})")
+
+        self.host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*' and not h.startswith('.')), 'localhost')
+        user, self.cookie = self.create_session()
+        results = {}
+        try:
+            for name in servers:
+                self.stdout.write(f"\n== {name.upper()} ==")
+                results[name] = self.run_server(name, options)
+        finally:
+            user.delete()
+
+        self.stdout.write("\n== Resumen ==")
+        self.stdout.write(f"{'endpoint':45}" + ''.join(f"{name + ' req/s':>14}{name + ' p99 ms':>14}" for name in results))
+        for path in ENDPOINTS:
+            self.stdout.write(f"{path:45}" + ''.join(
+                f"{results[name]['rps'][path]:14.0f}{self.format_ms(results[name]['p99'][path]):>14}" for name in results))
+        if not options['idle']:
+            return
+        self.stdout.write(f"{'conexiones inactivas atendidas':45}" + ''.join(
+            f"{results[name]['idle_served']:>8}/{options['idle']:<5}" for name in results))
+        self.stdout.write(f"{'KB por conexión inactiva':45}" + ''.join(
+            f"{self.format_kb(results[name]['bytes_per_idle']):>14}" for name in results))
+
+    def create_session(self):
+        """Usuario temporal con acceso a todos los endpoints y la cookie de su sesión."""
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USERNAME, defaults={'is_superuser': True})
+        user.set_unusable_password()
+        user.save()
+        for role in ('Administrador', 'Cocinero', 'Recepcionista'):
+            user.groups.add(Group.objects.get_or_create(name=role)[0])
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        return user, cookie
+
+    def headers(self):
+        return {'Host': self.host, 'Cookie': self.cookie, 'Accept-Encoding': 'gzip'}
+
+    def run_server(self, name, options):
+        # Un servidor nuevo para cada medición: los streams inactivos de WSGI
+        # ocupan sus hilos hasta el siguiente keepalive y afectarían la carga
+        with self.server(name, options) as (server, port):
+            baseline_rss = process_tree_rss(server.pid)
+            self.stdout.write(f"Memoria en reposo: {self.format_kb(baseline_rss)} KB")
+            idle_served, bytes_per_idle = (self.idle_connections(server, port, options['idle'])
+                                           if options['idle'] else (0, None))
+
+        with self.server(name, options) as (server, port):
+            rps, p99 = {}, {}
+            for path in ENDPOINTS:
+                rps[path], p99[path] = self.load(port, path, options['duration'], options['concurrency'])
+            self.report_pool(port, options['workers'])
+        return {'rps': rps, 'p99': p99, 'idle_served': idle_served, 'bytes_per_idle': bytes_per_idle}
+
+    @contextmanager
+    def server(self, name, options):
+        """Levanta gunicorn con la app `name`, lo calienta y lo detiene al salir."""
+        port = options['port']
+        command = [sys.executable, '-m', 'gunicorn', *SERVERS[name], '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(options['workers']), '--log-level', 'warning']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=os.environ.copy())
+        try:
+            self.wait_ready(server, port)
+            # Calentar: catálogo en memoria, página pública, conexiones a la BD
+            for path in ENDPOINTS:
+                self.request(port, path)
+            yield server, port
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+    def wait_ready(self, server, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"❌ El servidor terminó al iniciar (código {server.returncode})")
+            try:
+                if self.request(port, '/restaurant/ready/') == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError("❌ El servidor no respondió /restaurant/ready/ a tiempo")
+
+    def report_pool(self, port, workers):
+        """Métricas del pool de conexiones (de /restaurant/ready/, del worker que responda)."""
+        status, body = self.request(port, '/restaurant/ready/', body=True)
+        stats = json.loads(body).get('database_pool') if status == 200 else None
+        if stats is None:
+            self.stdout.write("Pool de conexiones: desactivado")
+            return
+        note = f" (1 de {workers} workers)" if workers > 1 else ''
+        self.stdout.write(f"Pool de conexiones{note}: {stats['size']}/{stats['max_size']} abiertas, "
+                          f"{stats['requests']} préstamos, {stats['waits']} esperas ({stats['wait_ms']} ms), "
+                          f"{stats['timeouts']} timeouts, {stats['connections_lost']} perdidas")
+
+    def request(self, port, path, connection=None, body=False):
+        conn = connection or http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        try:
+            conn.request('GET', path, headers=self.headers())
+            response = conn.getresponse()
+            content = response.read()
+            return (response.status, content) if body else response.status
+        finally:
+            if connection is None:
+                conn.close()
+
+    def load(self, port, path, duration, concurrency):
+        """
+        `concurrency` clientes keep-alive (dashboards) durante `duration` segundos.
+        Retorna (requests/segundo, p99 en ms o None).
+        """
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            own = []
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = self.request(port, path, conn)
+                except (OSError, http.client.HTTPException) as e:
+                    errors.append(str(e))
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                    continue
+                if status >= 400:
+                    errors.append(f'HTTP {status}')
+                    continue
+                own.append(time.perf_counter() - start)
+            conn.close()
+            with lock:
+                latencies.extend(own)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        rps = len(latencies) / elapsed
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f"{path:45} sin respuestas exitosas ({errors[:1]})"))
+            return rps, None
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)] * 1000
+        p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000
+        self.stdout.write(f"{path:45} {rps:8.0f} req/s  p50 {p50:6.1f} ms  p95 {p95:6.1f} ms  "
+                          f"p99 {p99:6.1f} ms  errores {len(errors)}")
+        return rps, p99
+
+    def idle_connections(self, server, port, count, settle=3.0):
+        """
+        Abre `count` streams SSE a la vez y los deja inactivos.
+        Retorna (streams atendidos, bytes de RSS por stream atendido).
+        """
+        before = process_tree_rss(server.pid)
+        request = (f"GET {IDLE_PATH} HTTP/1.1\r\nHost: {self.host}\r\nCookie: {self.cookie}\r\n"
+                   f"Accept: text/event-stream\r\n\r\n").encode()
+        sockets = []
+        try:
+            for _ in range(count):
+                sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+                sock.sendall(request)
+                sockets.append(sock)
+            # Un servidor saturado acepta la conexión (backlog del kernel) pero no responde
+            time.sleep(settle)
+            served = 0
+            for sock in sockets:
+                sock.setblocking(False)
+                try:
+                    if sock.recv(12, socket.MSG_PEEK).startswith(b'HTTP/1.1 200'):
+                        served += 1
+                except BlockingIOError:
+                    pass
+            after = process_tree_rss(server.pid)
+        finally:
+            for sock in sockets:
+                sock.close()
+
+        bytes_per_idle = (after - before) / served if served and before is not None and after is not None else None
+        self.stdout.write(f"Conexiones inactivas: {served}/{count} atendidas, "
+                          f"{self.format_kb(bytes_per_idle)} KB de memoria por conexión")
+        return served, bytes_per_idle
+
+    @staticmethod
+    def format_kb(value):
+        return 'n/d' if value is None else f'{value / 1024:.0f}'
+
+    @staticmethod
+    def format_ms(value):
+        return 'n/d' if value is None else f'{value:.1f}'
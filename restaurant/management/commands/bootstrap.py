@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from restaurant.startup import bootstrap
+
+class Command(BaseCommand):
+    help = ('Prepara la base de datos antes de iniciar los workers: aplica migraciones pendientes '
+            'y crea los datos por defecto, bajo un lock para que dos instancias no lo hagan a la vez')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-migrate', action='store_true', help='No aplicar migraciones')
+        parser.add_argument('--skip-seed', action='store_true', help='No crear usuarios ni platos por defecto')
+
+    def handle(self, *args, **options):
+        result = bootstrap(
+            migrate=not options['skip_migrate'],
+            seed=not options['skip_seed'],
+            stdout=self.stdout,
+        )
+        if result['migrations']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Migraciones aplicadas: {result['migrations']}"))
+        else:
+            self.stdout.write("ℹ️  Sin migraciones pendientes")
+        if result['seeded'] is not None:
+            seeded = result['seeded']
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Datos por defecto creados: {seeded['groups']} roles, "
+                f"{seeded['users']} usuarios, {seeded['menu_items']} platos"
+            ))
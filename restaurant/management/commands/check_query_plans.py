@@ -0,0 +1,118 @@
+import random
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from restaurant.models import Order, RoomBill
+from restaurant.utils import local_day_range
+
+# Textos que indican uso de índice en el EXPLAIN de cada motor
+# (PostgreSQL, SQLite); en MySQL se busca el nombre del índice en la columna 'key'
+INDEX_MARKERS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan', 'USING INDEX', 'USING COVERING INDEX', '_idx')
+
+# Recorrido completo de la tabla: PostgreSQL, SQLite ("SCAN tabla" sin índice) y MySQL (type=ALL)
+FULL_SCAN_PATTERN = re.compile(r'Seq Scan|\bSCAN \w+\s*$|\bALL\b', re.MULTILINE)
+
+
+class SeedRollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Verifica con EXPLAIN que las consultas críticas de Order/RoomBill usan índices. '
+            'Carga datos de prueba en una transacción que se revierte al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50000, help='Cantidad de pedidos de prueba a generar')
+        parser.add_argument('--verbose-plans', action='store_true', help='Mostrar el plan completo de cada consulta')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                self.seed(options['orders'])
+                failures = self.check_plans(options['verbose_plans'])
+                raise SeedRollback()
+        except SeedRollback:
+            pass
+
+        if failures:
+            raise CommandError(f"❌ Consultas sin índice: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("✅ Todas las consultas críticas usan índices"))
+
+    def seed(self, total):
+        self.stdout.write(f"Generando {total} pedidos de prueba...")
+        user = User.objects.create(username='__query_plan_check__')
+        now = timezone.now()
+        rng = random.Random(42)
+        # Historial: casi todo pagado; solo una pequeña fracción sigue activa
+        statuses = ['paid'] * 90 + ['charged_to_room'] * 5 + ['cancelled'] * 3 + ['pending', 'preparing']
+
+        created_at_field = Order._meta.get_field('created_at')
+        created_at_field.auto_now_add = False
+        try:
+            orders = [
+                Order(
+                    user=user,
+                    room_number=str(100 + rng.randint(0, 80)),
+                    client_identifier=f'Cliente {i}',
+                    status=rng.choice(statuses),
+                    payment_method='cash',
+                    total_amount=Decimal(rng.randint(1000, 50000)),
+                    created_at=now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+                )
+                for i in range(total)
+            ]
+            Order.objects.bulk_create(orders, batch_size=1000)
+        finally:
+            created_at_field.auto_now_add = True
+
+        RoomBill.objects.bulk_create([
+            RoomBill(room_number=str(100 + i % 80), status='paid', created_by=user)
+            for i in range(total // 10)
+        ], batch_size=1000)
+
+        # Estadísticas actualizadas para que el planificador conozca la distribución
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('ANALYZE TABLE restaurant_order, restaurant_roombill')
+            else:
+                cursor.execute('ANALYZE')
+
+    def hot_queries(self):
+        day_start, day_end = local_day_range(timezone.localdate() - timedelta(days=30))
+        return [
+            ('cocina: status IN activos ORDER BY created_at',
+             Order.objects.filter(status__in=['pending', 'preparing']).order_by('created_at')),
+            ('monitor garzón: status IN activos ORDER BY created_at',
+             Order.objects.filter(status__in=['pending', 'preparing', 'ready', 'served']).order_by('created_at')),
+            ('recepción: servidos/cargados ORDER BY -created_at',
+             Order.objects.filter(status__in=['served', 'charged_to_room']).order_by('-created_at')),
+            ('cargos de una habitación: room_number + status',
+             Order.objects.filter(room_number='101', status='charged_to_room')),
+            ('reportes: status=paid en un rango de fechas',
+             Order.objects.filter(status='paid', created_at__gte=day_start, created_at__lt=day_end)),
+            ('reporte paginado: primera página por (created_at, id)',
+             Order.objects.order_by('-created_at', '-id')[:50]),
+            ('facturas de una habitación: room_number + status',
+             RoomBill.objects.filter(room_number='101', status='paid')),
+        ]
+
+    def check_plans(self, verbose):
+        failures = []
+        for name, queryset in self.hot_queries():
+            plan = queryset.explain()
+            uses_index = any(marker in plan for marker in INDEX_MARKERS) and not FULL_SCAN_PATTERN.search(plan)
+            if uses_index:
+                self.stdout.write(f"✓ {name}")
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ {name}"))
+                failures.append(name)
+            if verbose or not uses_index:
+                self.stdout.write(f"    {plan}")
+        return failures
@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Se ejecuta en un proceso nuevo: importa la app WSGI y atiende un primer request
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+from AbbaRestaurante.wsgi import application
+imported = time.perf_counter()
+
+from django.conf import settings
+from django.db import connections
+db_on_import = any(conn.connection is not None for conn in connections.all(initialized_only=True))
+
+host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*' and not h.startswith('.')), 'localhost')
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': host, 'SERVER_PORT': '443', 'HTTP_HOST': host, 'wsgi.url_scheme': 'https',
+    'wsgi.input': __import__('io').BytesIO(), 'wsgi.errors': sys.stderr,
+}
+status = []
+body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (done - imported) * 1000,
+    'status': status[0] if status else '',
+    'db_on_import': db_on_import,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Mide el arranque en frío de un worker: importar AbbaRestaurante.wsgi y atender el primer '
+            'request, en procesos nuevos. Falla si el import toca la base de datos o supera el presupuesto.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Procesos a medir')
+        parser.add_argument('--path', default='/restaurant/ready/', help='URL del primer request')
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help='Tiempo máximo (mediana) hasta la primera respuesta, en ms')
+
+    def handle(self, *args, **options):
+        samples = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE, options['path']],
+                capture_output=True, text=True, env=os.environ.copy(), cwd=settings.BASE_DIR,
+            )
+            lines = result.stdout.strip().splitlines()
+            if result.returncode != 0 or not lines:
+                raise CommandError(f"❌ El proceso de prueba falló:\n{result.stderr[-2000:]}")
+            samples.append(json.loads(lines[-1]))
+
+        import_ms = statistics.median(sample['import_ms'] for sample in samples)
+        request_ms = statistics.median(sample['first_request_ms'] for sample in samples)
+        total_ms = statistics.median(sample['import_ms'] + sample['first_request_ms'] for sample in samples)
+        self.stdout.write(f"Procesos medidos: {len(samples)} (mediana)")
+        self.stdout.write(f"  import wsgi:     {import_ms:8.1f} ms")
+        self.stdout.write(f"  primer request:  {request_ms:8.1f} ms  ({options['path']} -> {samples[-1]['status']})")
+        self.stdout.write(f"  total:           {total_ms:8.1f} ms")
+
+        if any(sample['db_on_import'] for sample in samples):
+            raise CommandError("❌ Importar AbbaRestaurante.wsgi abrió una conexión a la base de datos")
+        if options['budget_ms'] is not None and total_ms > options['budget_ms']:
+            raise CommandError(f"❌ Arranque en frío de {total_ms:.0f} ms supera el presupuesto de {options['budget_ms']:.0f} ms")
+        self.stdout.write(self.style.SUCCESS("✅ El import de la app WSGI no toca la base de datos"))
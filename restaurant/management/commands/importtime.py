@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.lazy import LAZY_MODULES
+
+# Presupuesto de importación al arrancar un worker (suma de tiempos propios, en ms)
+STARTUP_IMPORT_BUDGET_MS = getattr(settings, 'STARTUP_IMPORT_BUDGET_MS', 1500)
+
+
+class Command(BaseCommand):
+    help = ('Mide con python -X importtime lo que cuesta importar AbbaRestaurante.wsgi en un proceso nuevo. '
+            'Falla si supera el presupuesto o si se importa algún módulo que debería cargarse de forma diferida.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-ms', type=float, default=STARTUP_IMPORT_BUDGET_MS,
+                            help='Tiempo máximo de importación permitido (ms)')
+        parser.add_argument('--top', type=int, default=15, help='Paquetes más costosos a mostrar')
+        parser.add_argument('--module', default='AbbaRestaurante.wsgi', help='Módulo de arranque a importar')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {options['module']}"],
+            capture_output=True, text=True, env=os.environ.copy(), cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"❌ No se pudo importar {options['module']}:\n{result.stderr[-2000:]}")
+
+        # Líneas: "import time: <propio us> | <acumulado us> | <módulo indentado>"
+        self_us = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:'):
+                continue
+            parts = line[len('import time:'):].split('|')
+            if len(parts) != 3 or not parts[0].strip().isdigit():
+                continue
+            self_us[parts[2].strip()] = int(parts[0])
+
+        by_package = defaultdict(int)
+        for module, micros in self_us.items():
+            by_package[module.split('.')[0]] += micros
+        total_ms = sum(self_us.values()) / 1000
+
+        self.stdout.write(f"Módulos importados: {len(self_us)}, tiempo total: {total_ms:.0f} ms")
+        for package, micros in sorted(by_package.items(), key=lambda entry: -entry[1])[:options['top']]:
+            self.stdout.write(f"  {micros / 1000:8.1f} ms  {package}")
+
+        eager = sorted(
+            module for module in self_us
+            if any(module == lazy or module.startswith(lazy + '.') for lazy in LAZY_MODULES)
+        )
+        errors = []
+        if eager:
+            errors.append(f"módulos que deberían ser diferidos: {', '.join(eager[:10])}")
+        if total_ms > options['budget_ms']:
+            errors.append(f"{total_ms:.0f} ms supera el presupuesto de {options['budget_ms']:.0f} ms")
+        if errors:
+            raise CommandError(f"❌ Arranque lento: {'; '.join(errors)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Importación dentro del presupuesto ({total_ms:.0f} / {options['budget_ms']:.0f} ms)"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from restaurant.export_jobs import purge_export_jobs, run_export_job
+from restaurant.models import ExportJob
+
+class Command(BaseCommand):
+    help = 'Genera las exportaciones pendientes y elimina los archivos de exportación vencidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--purge-only', action='store_true', help='Solo eliminar jobs vencidos, sin procesar pendientes')
+
+    def handle(self, *args, **options):
+        stale, deleted = purge_export_jobs()
+        self.stdout.write(f"Jobs atascados marcados como fallidos: {stale}, jobs vencidos eliminados: {deleted}")
+
+        if options['purge_only']:
+            return
+
+        processed = 0
+        for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+            if run_export_job(job_id):
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f"✅ Exportaciones generadas: {processed}"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from restaurant.images import publish_menu_image
+from restaurant.models import MenuItem
+
+class Command(BaseCommand):
+    help = 'Publica las fotos del menú pendientes (y reintenta las fallidas) en el backend de imágenes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-failed', action='store_true', help='No reintentar las publicaciones fallidas')
+
+    def handle(self, *args, **options):
+        statuses = ['processing'] if options['skip_failed'] else ['processing', 'failed']
+        published = 0
+        for item_id, version in MenuItem.objects.filter(image_status__in=statuses).values_list('id', 'image_version'):
+            if publish_menu_image(item_id, version):
+                published += 1
+            else:
+                self.stdout.write(self.style.WARNING(f"⚠️ No se pudo publicar la imagen v{version} del item {item_id}"))
+        self.stdout.write(self.style.SUCCESS(f"✅ Imágenes publicadas: {published}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from restaurant.search import rebuild_order_search, uses_trigram_index
+
+class Command(BaseCommand):
+    help = 'Recalcula el texto de búsqueda de los pedidos y la tabla de trigramas (SQLite/MySQL)'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconstruyendo índice de búsqueda de pedidos...")
+        total = rebuild_order_search()
+        backend = 'índice pg_trgm' if uses_trigram_index() else 'tabla de trigramas'
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} pedidos indexados ({backend})"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from restaurant.rollups import rebuild_sales_rollups
+
+class Command(BaseCommand):
+    help = 'Reconstruye los rollups de ventas (HourlySalesRollup y DailySalesRollup) desde el historial de pedidos'
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconstruyendo rollups de ventas...")
+        hourly_rows, daily_rows = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rollups reconstruidos: {hourly_rows} filas por hora, {daily_rows} filas por item"
+        ))
@@ -0,0 +1,408 @@
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from restaurant.models import MenuItem, Order, RoomBill
+from restaurant.query_budget import query_stats, reset_query_stats
+
+SIM_USER_PREFIX = 'sim_rush_'
+
+# Habitaciones ficticias de la simulación (room_number admite 10 caracteres)
+SIM_ROOMS = [f'S{n:03d}' for n in range(1, 13)]
+
+# Como el dashboard de cocina: deltas ?since= y un snapshot completo cada FULL_SYNC_EVERY polls
+FULL_SYNC_EVERY = 15
+
+# Avance de estados que hacen los cocineros
+NEXT_STATUS = {'pending': 'preparing', 'preparing': 'ready', 'ready': 'served'}
+
+PAYMENT_METHODS = [method for method, _ in Order.PAYMENT_METHOD_CHOICES if method != 'mixed']
+
+
+def percentile(sorted_values, pct):
+    """Percentil `pct` (0-100) de una lista ya ordenada (rango más cercano)."""
+    if not sorted_values:
+        return None
+    index = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Latencia, consultas y errores de cada request, agrupados por endpoint."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(segundos, consultas)]
+        self.errors = defaultdict(list)   # endpoint -> ['HTTP 500', ...]
+        self.lock = threading.Lock()
+
+    def request(self, client, endpoint, method, path, data=None, **extra):
+        """Ejecuta el request contando sus consultas; retorna la respuesta o None si falló."""
+        send = getattr(client, method)
+        kwargs = {'content_type': 'application/json', 'data': json.dumps(data)} if data is not None else {}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = send(path, **kwargs, **extra)
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            if response.status_code >= 400:
+                self.errors[endpoint].append(f'HTTP {response.status_code}')
+                return None
+            self.samples[endpoint].append((elapsed, len(queries)))
+        return response
+
+    def summary(self):
+        """{endpoint: {requests, errors, p50_ms, p95_ms, p99_ms, queries_avg, queries_max}}"""
+        result = {}
+        for endpoint in sorted(set(self.samples) | set(self.errors)):
+            samples = self.samples.get(endpoint, [])
+            latencies = sorted(seconds * 1000 for seconds, _ in samples)
+            queries = [count for _, count in samples]
+            result[endpoint] = {
+                'requests': len(samples),
+                'errors': len(self.errors.get(endpoint, [])),
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'queries_avg': sum(queries) / len(queries) if queries else None,
+                'queries_max': max(queries) if queries else None,
+            }
+        return result
+
+
+class Service:
+    """
+    Estado compartido de la simulación: los pedidos creados por los garzones,
+    su último estado conocido y los que ya se pagaron o se cargaron a una cuenta.
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.orders = {}      # id -> {'status', 'room'}
+        self.bill_ids = []
+        self.lock = threading.Lock()
+
+    def add(self, order_id, room):
+        with self.lock:
+            self.orders[order_id] = {'status': 'pending', 'room': room}
+
+    def claim(self, statuses, next_status):
+        """Toma el pedido más antiguo en `statuses` y lo marca con `next_status` (None si no hay)."""
+        with self.lock:
+            candidates = sorted(oid for oid, o in self.orders.items() if o['status'] in statuses)
+            if not candidates:
+                return None, None
+            # Entre los más antiguos, como una cocina real que no sigue un orden estricto
+            order_id = self.rng.choice(candidates[:3])
+            previous = self.orders[order_id]['status']
+            self.orders[order_id]['status'] = next_status(previous) if callable(next_status) else next_status
+            return order_id, previous
+
+    def claim_room(self):
+        """Pedidos servidos de una habitación, marcados como cargados a la cuenta."""
+        with self.lock:
+            by_room = defaultdict(list)
+            for order_id, order in self.orders.items():
+                if order['status'] == 'served':
+                    by_room[order['room']].append(order_id)
+            if not by_room:
+                return None, []
+            room = self.rng.choice(sorted(by_room))
+            for order_id in by_room[room]:
+                self.orders[order_id]['status'] = 'billed'
+            return room, sorted(by_room[room])
+
+
+class Actor:
+    role = None
+
+    def __init__(self, name, client, service, recorder, rng):
+        self.name = name
+        self.client = client
+        self.service = service
+        self.recorder = recorder
+        self.rng = rng
+
+    def step(self):
+        """Una acción del actor. Retorna False si no tenía nada que hacer (sin request)."""
+        raise NotImplementedError
+
+
+class Waiter(Actor):
+    """Envía pedidos nuevos por save_order."""
+    role = 'Garzón'
+
+    def __init__(self, *args, menu_item_ids, max_lines, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.menu_item_ids = menu_item_ids
+        self.max_lines = max_lines
+
+    def step(self):
+        lines = self.rng.randint(1, self.max_lines)
+        if lines <= len(self.menu_item_ids):
+            picks = self.rng.sample(self.menu_item_ids, lines)
+        else:
+            # Mesa grande con un menú corto: el mismo item en varias líneas (otra nota, otro comensal)
+            picks = self.rng.choices(self.menu_item_ids, k=lines)
+        room = self.rng.choice(SIM_ROOMS)
+        data = {
+            'items': [{'id': pk, 'quantity': self.rng.randint(1, 3), 'note': ''} for pk in picks],
+            'client_identifier': f'Mesa {self.rng.randint(1, 20)}',
+            'room_number': room,
+            'tip_amount': '0.00',
+        }
+        response = self.recorder.request(self.client, 'save_order', 'post', '/restaurant/save_order/', data,
+                                         HTTP_IDEMPOTENCY_KEY=str(uuid.UUID(int=self.rng.getrandbits(128))))
+        if response is not None:
+            self.service.add(response.json()['order_id'], room)
+
+
+class KitchenTablet(Actor):
+    """Polling de api_orders igual que el dashboard de cocina."""
+    role = 'Cocinero'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.revision = None
+        self.polls = 0
+
+    def step(self):
+        full_sync = self.revision is None or self.polls % FULL_SYNC_EVERY == 0
+        self.polls += 1
+        if full_sync:
+            response = self.recorder.request(self.client, 'api_orders (snapshot)', 'get', '/restaurant/api/orders/')
+            if response is not None and response.has_header('X-Orders-Revision'):
+                self.revision = int(response['X-Orders-Revision'])
+        else:
+            response = self.recorder.request(self.client, 'api_orders ?since', 'get',
+                                             f'/restaurant/api/orders/?since={self.revision}')
+            if response is not None:
+                delta = response.json()
+                # resync: la revisión salió de la ventana del registro, el próximo poll es un snapshot
+                self.revision = None if delta.get('resync') else delta['revision']
+
+
+class Cook(Actor):
+    """Avanza pedidos: pendiente -> en preparación -> listo -> servido."""
+    role = 'Cocinero'
+
+    def step(self):
+        order_id, previous = self.service.claim(set(NEXT_STATUS), NEXT_STATUS.get)
+        if order_id is None:
+            return False
+        self.recorder.request(self.client, 'api_order_status', 'put', f'/restaurant/api/orders/{order_id}/status/',
+                              {'status': NEXT_STATUS[previous]})
+
+
+class Receptionist(Actor):
+    """Revisa las cuentas abiertas, cobra pedidos servidos y arma cuentas de habitación."""
+    role = 'Recepcionista'
+
+    def step(self):
+        self.recorder.request(self.client, 'api_get_unpaid_orders_by_room', 'get', '/restaurant/api/roombills/unpaid-orders/')
+        if self.rng.random() < 0.5:
+            order_id, _ = self.service.claim({'served'}, 'paid')
+            if order_id is not None:
+                self.recorder.request(self.client, 'api_process_payment', 'put', f'/restaurant/api/orders/{order_id}/payment/', {
+                    'payment_method': self.rng.choice(PAYMENT_METHODS),
+                    'tip_amount': str(Decimal(self.rng.randint(0, 5) * 500)),
+                })
+        else:
+            room, order_ids = self.service.claim_room()
+            if order_ids:
+                response = self.recorder.request(self.client, 'api_create_roombill', 'post', '/restaurant/api/roombills/create/', {
+                    'room_number': room,
+                    'guest_name': f'Huésped {room}',
+                    'order_ids': order_ids,
+                    'tip_amount': '0.00',
+                })
+                if response is not None:
+                    with self.service.lock:
+                        self.service.bill_ids.append(response.json()['bill_id'])
+
+
+class Command(BaseCommand):
+    help = ('Simula el servicio de una hora punta contra las vistas reales (Django test client): '
+            'garzones enviando pedidos por save_order, tablets de cocina haciendo polling de api_orders, '
+            'cocineros cambiando estados y recepción cobrando y armando cuentas de habitación. '
+            'Reporta latencia p50/p95/p99 y consultas por request de cada endpoint, y falla si alguna vista '
+            'excede su @query_budget. '
+            'Usa usuarios temporales y borra los pedidos y cuentas creados al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--waiters', type=int, default=4, help='Garzones')
+        parser.add_argument('--tablets', type=int, default=2, help='Tablets de cocina haciendo polling')
+        parser.add_argument('--cooks', type=int, default=2, help='Cocineros cambiando estados')
+        parser.add_argument('--receptionists', type=int, default=1, help='Recepcionistas')
+        parser.add_argument('--rounds', type=int, default=50, help='Acciones de cada actor')
+        parser.add_argument('--max-lines', type=int, default=4,
+                            help='Líneas máximas por pedido (p. ej. 30 para medir @query_budget con mesas grandes)')
+        parser.add_argument('--seed', type=int, default=1, help='Semilla (misma semilla = misma secuencia de acciones)')
+        parser.add_argument('--concurrent', action='store_true',
+                            help='Un hilo por actor (contención real; con SQLite puede haber bloqueos de escritura)')
+        parser.add_argument('--think', type=float, default=0.0, help='Milisegundos entre acciones de un actor (--concurrent)')
+        parser.add_argument('--json', dest='json_path', help='Guardar los resultados en este archivo JSON')
+        parser.add_argument('--baseline', help='JSON de una corrida anterior para comparar')
+        parser.add_argument('--keep', action='store_true', help='No borrar los pedidos, cuentas ni usuarios creados')
+
+    def handle(self, *args, **options):
+        menu_item_ids = list(MenuItem.objects.filter(available=True).values_list('id', flat=True))
+        if not menu_item_ids:
+            raise CommandError("❌ No hay items disponibles en el menú (python manage.py bootstrap)")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)['endpoints']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"❌ No se pudo leer la línea base {options['baseline']}: {e}")
+
+        rng = random.Random(options['seed'])
+        service = Service(rng)
+        recorder = Recorder()
+        users = []
+        actors = []
+        roles = [(Waiter, options['waiters']), (KitchenTablet, options['tablets']),
+                 (Cook, options['cooks']), (Receptionist, options['receptionists'])]
+        try:
+            for actor_class, count in roles:
+                for n in range(count):
+                    name = f'{actor_class.__name__.lower()}{n + 1}'
+                    user, client = self.login(name, actor_class.role)
+                    users.append(user)
+                    extra = {'menu_item_ids': menu_item_ids, 'max_lines': options['max_lines']} if actor_class is Waiter else {}
+                    actors.append(actor_class(name, client, service, recorder,
+                                              random.Random(rng.getrandbits(32)), **extra))
+
+            self.stdout.write(f"Simulando {len(actors)} actores × {options['rounds']} acciones "
+                              f"({'concurrente' if options['concurrent'] else 'secuencial'}, semilla {options['seed']})...")
+            # Los prints de las vistas ensuciarían el reporte; con --verbosity 2 se muestran
+            quiet = contextlib.redirect_stdout(io.StringIO()) if options['verbosity'] < 2 else contextlib.nullcontext()
+            reset_query_stats()
+            started = time.monotonic()
+            # Todos los requests pasan por los presupuestos de consultas (@query_budget)
+            with quiet, override_settings(QUERY_BUDGET_SAMPLE_RATE=1.0, QUERY_BUDGET_STRICT=False):
+                if options['concurrent']:
+                    self.run_concurrent(actors, options['rounds'], options['think'] / 1000)
+                else:
+                    self.run_sequential(actors, options['rounds'], rng)
+            elapsed = time.monotonic() - started
+        finally:
+            # Los pedidos se borran en cascada con sus garzones: --keep conserva ambos
+            if not options['keep']:
+                RoomBill.objects.filter(id__in=service.bill_ids).delete()
+                Order.objects.filter(id__in=list(service.orders)).delete()
+                for user in users:
+                    user.delete()
+
+        results = recorder.summary()
+        budget_violations = {view: stats['violations'] for view, stats in query_stats().items() if stats['violations']}
+        self.report(results, baseline, elapsed, len(service.orders))
+        for view, count in budget_violations.items():
+            self.stdout.write(self.style.ERROR(f"❌ {view}: {count} requests excedieron su @query_budget"))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in
+                                       ('waiters', 'tablets', 'cooks', 'receptionists', 'rounds', 'seed', 'concurrent')},
+                           'database': connection.vendor, 'elapsed_s': elapsed, 'endpoints': results,
+                           'budget_violations': budget_violations}, f, indent=2)
+            self.stdout.write(f"Resultados guardados en {options['json_path']}")
+
+        failed = sum(r['errors'] for r in results.values())
+        if failed:
+            raise CommandError(f"❌ {failed} requests fallaron")
+        if budget_violations:
+            raise CommandError("❌ Hubo vistas sobre su presupuesto de consultas (ver arriba)")
+        self.stdout.write(self.style.SUCCESS("✅ Simulación completada sin errores"))
+
+    def login(self, name, role):
+        """Usuario temporal con el rol del actor y un test client con su sesión."""
+        user, _ = User.objects.get_or_create(username=f'{SIM_USER_PREFIX}{name}')
+        user.set_unusable_password()
+        user.save()
+        user.groups.add(Group.objects.get_or_create(name=role)[0])
+        host = next((h for h in settings.ALLOWED_HOSTS if h and h != '*' and not h.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host, raise_request_exception=False)
+        client.force_login(user)
+        return user, client
+
+    def run_sequential(self, actors, rounds, rng):
+        """Cada ronda, todos los actores actúan una vez en orden aleatorio (reproducible con la semilla)."""
+        for _ in range(rounds):
+            order = actors[:]
+            rng.shuffle(order)
+            for actor in order:
+                actor.step()
+
+    def run_concurrent(self, actors, rounds, think):
+        """
+        Un hilo por actor. Un cocinero sin pedidos que avanzar espera sin gastar
+        sus acciones, hasta que los garzones terminan y no queda nada pendiente.
+        """
+        errors = []
+        waiters = [actor for actor in actors if isinstance(actor, Waiter)]
+        waiters_done = []
+
+        def run(actor):
+            try:
+                done = 0
+                while done < rounds:
+                    if actor.step() is False:
+                        if len(waiters_done) >= len(waiters):
+                            break
+                        time.sleep(0.01)
+                        continue
+                    done += 1
+                    if think:
+                        time.sleep(think)
+            except Exception as e:
+                errors.append(f'{actor.name}: {e}')
+            finally:
+                if actor in waiters:
+                    waiters_done.append(actor)
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(actor,)) for actor in actors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise CommandError(f"❌ Falló un actor: {errors[0]}")
+
+    def report(self, results, baseline, elapsed, order_count):
+        total = sum(r['requests'] for r in results.values())
+        self.stdout.write(f"\n{total} requests en {elapsed:.1f} s ({total / elapsed:.0f} req/s), {order_count} pedidos creados\n")
+        self.stdout.write(f"{'endpoint':34}{'req':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'consultas':>11}{'máx':>5}")
+        for endpoint, r in results.items():
+            if not r['requests']:
+                self.stdout.write(self.style.ERROR(f"{endpoint:34}{0:>6}{r['errors']:>5}  sin respuestas exitosas"))
+                continue
+            self.stdout.write(f"{endpoint:34}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:9.1f}{r['p95_ms']:9.1f}"
+                              f"{r['p99_ms']:9.1f}{r['queries_avg']:11.1f}{r['queries_max']:>5}")
+
+        if baseline is None:
+            return
+        self.stdout.write("\nComparación con la línea base (p95 y consultas promedio):")
+        for endpoint, r in results.items():
+            before = baseline.get(endpoint)
+            if not before or not r['requests'] or not before.get('requests'):
+                continue
+            p95_change = (r['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            queries_change = r['queries_avg'] - before['queries_avg']
+            line = (f"{endpoint:34} p95 {before['p95_ms']:7.1f} -> {r['p95_ms']:7.1f} ms ({p95_change:+.0f}%)  "
+                    f"consultas {before['queries_avg']:.1f} -> {r['queries_avg']:.1f}")
+            style = self.style.ERROR if queries_change > 0 or p95_change > 20 else self.style.SUCCESS
+            self.stdout.write(style(line))
@@ -0,0 +1,156 @@
+"""
+Prometheus metrics, served in text format at /metrics.
+
+- Requests: latency histogram and responses per URL name, requests in
+  flight, and database time and queries per request (MetricsMiddleware).
+- Pusher: duration of each batch call and failed batches / dropped events.
+- Exports: generation time per kind, format and result.
+- Open orders by status: counted when /metrics is scraped.
+
+Under gunicorn, counters are shared by the workers through
+prometheus_client's multiprocess mode: gunicorn.conf.py sets
+PROMETHEUS_MULTIPROC_DIR, each worker writes its values to mmap'd files
+there and /metrics adds up the files of all workers. gunicorn.conf.py also
+empties the directory when gunicorn starts and drops the in-flight gauge of
+workers that exit. Other processes (runserver, manage.py commands) leave
+PROMETHEUS_MULTIPROC_DIR empty and keep their counters in memory, so they
+write no files.
+"""
+import contextvars
+import os
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+
+# prometheus_client elige el modo multiproceso al importarse, según la variable de entorno
+MULTIPROCESS = bool(settings.PROMETHEUS_MULTIPROC_DIR)
+if MULTIPROCESS:
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily  # noqa: E402
+from prometheus_client.multiprocess import MultiProcessCollector  # noqa: E402
+
+# Pedidos abiertos: todavía no pagados ni cancelados
+OPEN_ORDER_STATUSES = ('pending', 'preparing', 'ready', 'served', 'charged_to_room')
+
+# Requests que no coinciden con ninguna URL (404): una sola etiqueta para no multiplicar series
+UNMATCHED_VIEW = '<unmatched>'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EXPORT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+REQUEST_LATENCY = Histogram(
+    'abba_request_duration_seconds', 'Latencia de los requests por vista (nombre de URL)',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+RESPONSES = Counter(
+    'abba_responses_total', 'Respuestas por vista y código HTTP', ['view', 'method', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'abba_requests_in_flight', 'Requests en curso (todos los workers)', multiprocess_mode='livesum',
+)
+REQUEST_DB_TIME = Histogram(
+    'abba_request_db_seconds', 'Tiempo en la base de datos por request', ['view'], buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Counter(
+    'abba_db_queries_total', 'Consultas SQL ejecutadas por vista', ['view'],
+)
+PUSHER_DISPATCH = Histogram(
+    'abba_pusher_dispatch_seconds', 'Duración de cada llamada trigger_batch a Pusher', ['result'],
+    buckets=LATENCY_BUCKETS,
+)
+PUSHER_FAILED_BATCHES = Counter(
+    'abba_pusher_failed_batches_total', 'Llamadas a Pusher que fallaron (cada reintento cuenta)',
+)
+PUSHER_DROPPED_EVENTS = Counter(
+    'abba_pusher_dropped_events_total', 'Eventos descartados (cola llena o reintentos agotados)',
+)
+EXPORT_DURATION = Histogram(
+    'abba_export_duration_seconds', 'Tiempo de generación de las exportaciones',
+    ['kind', 'format', 'status'], buckets=EXPORT_BUCKETS,
+)
+
+# [consultas, segundos] del request en curso; el wrapper de consultas lo completa.
+# Las vistas async consultan desde hilos de sync_to_async, que copian el contexto
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    totals = _request_db.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - start
+
+
+def _install_query_timer(sender, connection, **kwargs):
+    # connection_created se emite en cada reconexión del mismo wrapper
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(_install_query_timer)
+
+
+def start_request():
+    """Begin measuring a request. Returns the state to pass to finish_request()."""
+    IN_FLIGHT.inc()
+    totals = [0, 0.0]
+    return time.perf_counter(), totals, _request_db.set(totals)
+
+
+def finish_request(request, response, state):
+    started, totals, token = state
+    elapsed = time.perf_counter() - started
+    _request_db.reset(token)
+    IN_FLIGHT.dec()
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None else UNMATCHED_VIEW
+    REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+    RESPONSES.labels(view, request.method, str(response.status_code if response is not None else 500)).inc()
+    REQUEST_DB_TIME.labels(view).observe(totals[1])
+    if totals[0]:
+        DB_QUERIES.labels(view).inc(totals[0])
+
+
+class OpenOrdersCollector:
+    """Open orders by status, counted in the database on each scrape."""
+
+    def collect(self):
+        from .models import Order
+
+        counts = dict.fromkeys(OPEN_ORDER_STATUSES, 0)
+        counts.update(
+            Order.objects.filter(status__in=OPEN_ORDER_STATUSES)
+            .values_list('status').annotate(n=Count('id')).order_by()
+        )
+        gauge = GaugeMetricFamily('abba_open_orders', 'Pedidos abiertos por estado', labels=['status'])
+        for status, count in counts.items():
+            gauge.add_metric([status], count)
+        yield gauge
+
+
+def render_metrics():
+    """
+    Metrics of all workers (or of this process, outside gunicorn) in
+    Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    registry = CollectorRegistry()
+    if MULTIPROCESS:
+        MultiProcessCollector(registry)
+    else:
+        registry.register(REGISTRY)
+    registry.register(OpenOrdersCollector())
+    return generate_latest(registry), CONTENT_TYPE_LATEST
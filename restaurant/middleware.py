@@ -0,0 +1,117 @@
+"""
+Middleware for the restaurant app.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+from .query_budget import QueryRecorder, check_budget, should_sample
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs natively under ASGI.
+
+    WhiteNoise is sync-only, and one sync-only middleware makes Django run
+    the rest of the chain of every request through a thread under ASGI,
+    async views included. Looking up a static file is a dict lookup
+    (autorefresh, which scans the disk, is only on with DEBUG), so it can
+    run on the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the queries of each (sampled) request and enforces the view's
+    @query_budget. See restaurant/query_budget.py.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not should_sample():
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        request.query_recorder = recorder
+        check_budget(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not should_sample():
+            return await self.get_response(request)
+        # Las consultas de una vista async corren en el hilo de sync_to_async del request
+        # (thread_sensitive), con la conexión de ese hilo: el recorder se instala ahí
+        recorder = QueryRecorder()
+        await sync_to_async(lambda: connection.execute_wrappers.append(recorder))()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(lambda: connection.execute_wrappers.remove(recorder))()
+        request.query_recorder = recorder
+        check_budget(request, recorder)
+        return response
+
+
+class MetricsMiddleware:
+    """
+    Records latency, status, in-flight count and database time of each
+    request for /metrics. See restaurant/metrics.py.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = metrics.start_request()
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.finish_request(request, response, state)
+        return response
+
+    async def __acall__(self, request):
+        state = metrics.start_request()
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.finish_request(request, response, state)
+        return response
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0013_alter_order_payment_method_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderChange',
+            fields=[
+                ('revision', models.BigAutoField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Order Change',
+                'verbose_name_plural': 'Order Changes',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0015_resourceversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Key used to detect duplicate submissions of the same order', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0016_order_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('category', models.CharField(max_length=50)),
+                ('quantity', models.IntegerField(default=0)),
+                ('sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant.menuitem')),
+                ('waiter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status', 'waiter', 'category', 'menu_item'), name='unique_daily_sales_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tip_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('waiter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Hourly Sales Rollup',
+                'verbose_name_plural': 'Hourly Sales Rollups',
+                'constraints': [models.UniqueConstraint(fields=('date', 'hour', 'status', 'payment_method', 'waiter'), name='unique_hourly_sales_rollup')],
+            },
+        ),
+    ]
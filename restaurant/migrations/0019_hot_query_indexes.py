@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0018_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'preparing', 'ready', 'served'])), fields=['created_at'], name='order_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['room_number', 'status'], name='order_room_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roombill',
+            index=models.Index(fields=['room_number', 'status'], name='roombill_room_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roombill',
+            index=models.Index(fields=['created_at'], name='roombill_created_idx'),
+        ),
+    ]
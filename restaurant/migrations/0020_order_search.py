@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_order_search(apps, schema_editor):
+    # Order.save() mantiene search_text: los pedidos existentes se completan antes de indexar
+    from restaurant.search import rebuild_order_search
+
+    rebuild_order_search(apps=apps)
+
+
+def create_trigram_index(apps, schema_editor):
+    # Solo PostgreSQL: en SQLite/MySQL la búsqueda usa la tabla OrderSearchGram
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS order_search_trgm_idx '
+        'ON restaurant_order USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS order_search_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0019_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='search_text',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Normalized room number and client identifier, kept by save() for search', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='OrderSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurant.order')),
+            ],
+            options={
+                'verbose_name': 'Order Search Gram',
+                'verbose_name_plural': 'Order Search Grams',
+                'indexes': [models.Index(fields=['gram', 'order'], name='order_search_gram_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_order_search, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0020_order_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_status',
+            field=models.CharField(blank=True, choices=[('', 'Sin procesar'), ('processing', 'Publicando'), ('ready', 'Lista'), ('failed', 'Fallida')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='image_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_sales_rollups(apps, schema_editor):
+    # Rollups y aportes por pedido de los pedidos existentes, calculados igual que las señales
+    from restaurant.rollups import rebuild_sales_rollups
+
+    rebuild_sales_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0022_realtime_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupContribution',
+            fields=[
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='restaurant.order')),
+                ('amounts', models.JSONField()),
+            ],
+            options={
+                'verbose_name': 'Sales Rollup Contribution',
+                'verbose_name_plural': 'Sales Rollup Contributions',
+            },
+        ),
+        migrations.RunPython(backfill_sales_rollups, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User, Group
 from django.conf import settings
-import cloudinary.api
-from .utils import get_cloudinary_url
+from .utils import get_cloudinary_url, order_search_text
 
 class Category(models.Model):
     """
@@ -32,7 +31,18 @@ class MenuItem(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=50, default='General')
     available = models.BooleanField(default=True)
+    IMAGE_STATUS_CHOICES = [
+        ('', 'Sin procesar'),
+        ('processing', 'Publicando'),
+        ('ready', 'Lista'),
+        ('failed', 'Fallida'),
+    ]
+
     image = models.ImageField(upload_to='menu_items/', blank=True, null=True)
+    # Derivados generados por images.py: {'thumb': {'webp': url, 'jpg': url}, 'card': ..., 'full': ...}
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_version = models.PositiveIntegerField(default=0)
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, blank=True, default='')
 
     class Meta:
         verbose_name = 'Menu Item'
@@ -67,6 +77,11 @@ class MenuItem(models.Model):
         Get the image URL, handling both Cloudinary and local storage.
         Uses dynamic Cloudinary configuration from settings.
         """
+        # Derivado publicado por el pipeline de imágenes (JPEG: compatible con todo navegador)
+        full_url = self.image_variants.get('full', {}).get('jpg') if self.image_variants else None
+        if full_url:
+            return full_url
+
         if not self.image:
             return None
         
@@ -98,6 +113,17 @@ class Order(models.Model):
         ('check', 'Cheque'),
         ('mixed', 'Mixto'),
     ]
+
+    # CSS classes for the status badges
+    STATUS_CLASSES = {
+        'pending': 'bg-gray-100 text-gray-800',
+        'preparing': 'bg-yellow-100 text-yellow-800',
+        'ready': 'bg-green-100 text-green-800',
+        'served': 'bg-blue-100 text-blue-800',
+        'paid': 'bg-indigo-100 text-indigo-800',
+        'charged_to_room': 'bg-purple-100 text-purple-800',
+        'cancelled': 'bg-red-100 text-red-800',
+    }
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     room_number = models.CharField(max_length=10, blank=True, null=True, help_text="Guest room number")
@@ -110,10 +136,26 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     paid_at = models.DateTimeField(null=True, blank=True, help_text="When the order was paid")
     payment_reference = models.CharField(max_length=100, blank=True, null=True, help_text="Reference for checks or transfers")
+    idempotency_key = models.CharField(max_length=64, unique=True, blank=True, null=True, help_text="Key used to detect duplicate submissions of the same order")
+    search_text = models.CharField(max_length=255, blank=True, default='', editable=False, help_text="Normalized room number and client identifier, kept by save() for search")
 
     class Meta:
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # status IN (...) ORDER BY created_at (tableros) y status='paid' + rango de fechas (reportes)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Índice parcial: solo pedidos activos (ignorado en MySQL, que no soporta índices parciales)
+            models.Index(
+                fields=['created_at'],
+                name='order_active_created_idx',
+                condition=models.Q(status__in=['pending', 'preparing', 'ready', 'served']),
+            ),
+            # Reporte paginado por (created_at, id) y filtros de rango de fechas sin estado
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Cargos a habitación pendientes de una habitación
+            models.Index(fields=['room_number', 'status'], name='order_room_status_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
@@ -137,20 +179,20 @@ class Order(models.Model):
         # Validar que al menos uno de room_number o client_identifier esté presente
         if not self.room_number and not self.client_identifier:
             raise ValueError("Debe proporcionar al menos una habitación o un cliente.")
+
+        # Texto de búsqueda normalizado (ver search.py)
+        search_text = order_search_text(self.room_number, self.client_identifier)
+        self._search_text_changed = self._state.adding or search_text != self.search_text
+        self.search_text = search_text
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self._search_text_changed:
+            kwargs['update_fields'] = set(update_fields) | {'search_text'}
         
         super().save(*args, **kwargs)
 
     @property
     def status_class(self):
-        return {
-            'pending': 'bg-gray-100 text-gray-800',
-            'preparing': 'bg-yellow-100 text-yellow-800',
-            'ready': 'bg-green-100 text-green-800',
-            'served': 'bg-blue-100 text-blue-800',
-            'paid': 'bg-indigo-100 text-indigo-800',
-            'charged_to_room': 'bg-purple-100 text-purple-800',
-            'cancelled': 'bg-red-100 text-red-800',
-        }.get(self.status, 'bg-gray-100 text-gray-800')
+        return self.STATUS_CLASSES.get(self.status, 'bg-gray-100 text-gray-800')
 
 
 class OrderItem(models.Model):
@@ -167,6 +209,331 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.menu_item.name}"
 
+class OrderSearchGram(models.Model):
+    """
+    Trigram side table for order search on databases without pg_trgm
+    (SQLite, MySQL). One row per distinct 3-character substring of
+    Order.search_text; see search.py.
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='+')
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = 'Order Search Gram'
+        verbose_name_plural = 'Order Search Grams'
+        indexes = [
+            models.Index(fields=['gram', 'order'], name='order_search_gram_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.gram!r} -> Order {self.order_id}"
+
+# Ventana del registro de cambios de pedidos: segundos y cantidad máxima de filas
+ORDER_CHANGE_RETENTION = getattr(settings, 'ORDER_CHANGE_RETENTION', 6 * 60 * 60)
+ORDER_CHANGE_MAX_ROWS = getattr(settings, 'ORDER_CHANGE_MAX_ROWS', 5000)
+# Podar el registro cada tantas revisiones
+ORDER_CHANGE_PRUNE_EVERY = 200
+# Una revisión se asigna al insertar pero se ve al confirmar la transacción: un hueco
+# más reciente que esto puede ser una transacción en curso (más antiguo, una revertida)
+ORDER_CHANGE_SETTLE_SECONDS = 10
+# Revisiones recientes revisadas para fijar la revisión de un snapshot
+ORDER_CHANGE_SNAPSHOT_SCAN = 200
+
+
+def settled_high_water_mark(revision, changes, cutoff):
+    """
+    Avanza `revision` por los cambios (revision, order_id, created_at) en orden,
+    sin pasar un hueco que aún puede ser una transacción sin confirmar.
+
+    Returns:
+        tuple: (revisión alcanzada, ids de pedidos cambiados)
+    """
+    high_water_mark = revision
+    settled = True
+    order_ids = set()
+    for change_revision, order_id, created_at in changes:
+        order_ids.add(order_id)
+        if settled and (change_revision == high_water_mark + 1 or created_at < cutoff):
+            high_water_mark = change_revision
+        else:
+            # Los cambios siguientes se envían igual y se vuelven a enviar en el próximo poll
+            settled = False
+    return high_water_mark, order_ids
+
+
+class OrderChange(models.Model):
+    """
+    Registro de cambios de pedidos para el feed incremental de cocina.
+    Cada inserción, actualización o eliminación de un Order (o de sus OrderItem)
+    agrega una fila; su clave primaria es la revisión, monótonamente creciente.
+    order_id no es ForeignKey para que el registro sobreviva al borrado del pedido.
+    Solo se guardan los cambios de la ventana de retención (prune()); un cliente
+    con una revisión anterior a esa ventana debe pedir un snapshot completo.
+    """
+    revision = models.BigAutoField(primary_key=True)
+    order_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Order Change'
+        verbose_name_plural = 'Order Changes'
+
+    def __str__(self):
+        return f"Rev {self.revision} - Order {self.order_id}"
+
+    @classmethod
+    def record(cls, order_id):
+        """Registra un cambio para el pedido y retorna la nueva revisión"""
+        revision = cls.objects.create(order_id=order_id).revision
+        if revision % ORDER_CHANGE_PRUNE_EVERY == 0:
+            cls.prune(revision)
+        return revision
+
+    @classmethod
+    def prune(cls, latest_revision=None):
+        """
+        Borra los cambios fuera de la ventana de retención. La revisión más
+        reciente se conserva siempre. Retorna la cantidad de filas borradas.
+        """
+        from datetime import timedelta
+        from django.db.models import Q
+        from django.utils import timezone
+
+        if latest_revision is None:
+            latest_revision = cls.latest_revision()
+        cutoff = timezone.now() - timedelta(seconds=ORDER_CHANGE_RETENTION)
+        deleted, _ = cls.objects.filter(
+            Q(revision__lte=latest_revision - ORDER_CHANGE_MAX_ROWS) | Q(created_at__lt=cutoff, revision__lt=latest_revision)
+        ).delete()
+        return deleted
+
+    @classmethod
+    def latest_revision(cls):
+        """Retorna la revisión más alta registrada (0 si no hay cambios)"""
+        latest = cls.objects.order_by('-revision').values_list('revision', flat=True).first()
+        return latest or 0
+
+    @classmethod
+    def _settle_cutoff(cls):
+        from datetime import timedelta
+        from django.utils import timezone
+        return timezone.now() - timedelta(seconds=ORDER_CHANGE_SETTLE_SECONDS)
+
+    @classmethod
+    def _snapshot_changes(cls):
+        return cls.objects.order_by('-revision').values_list('revision', 'order_id', 'created_at')[:ORDER_CHANGE_SNAPSHOT_SCAN]
+
+    @classmethod
+    def _snapshot_revision(cls, recent, cutoff):
+        recent = sorted(recent)
+        if not recent:
+            return 0
+        return settled_high_water_mark(recent[0][0] - 1, recent, cutoff)[0]
+
+    @classmethod
+    def snapshot_revision(cls):
+        """
+        Revisión para un snapshot completo: la más alta sin revisiones menores
+        que puedan estar aún sin confirmar (0 si no hay cambios).
+        """
+        cutoff = cls._settle_cutoff()
+        return cls._snapshot_revision(list(cls._snapshot_changes()), cutoff)
+
+    @classmethod
+    def _needs_resync(cls, revision, oldest, latest):
+        # Los cambios entre `revision` y el más antiguo guardado pueden haberse podado;
+        # una revisión mayor que la última no salió de este registro (base restaurada)
+        if latest is None:
+            return revision != 0
+        return revision < oldest - 1 or revision > latest
+
+    @classmethod
+    def changed_since(cls, revision):
+        """
+        Retorna (nueva_revision, ids_de_pedidos_cambiados, resync) desde la revisión dada.
+        resync es True si la revisión es anterior a la ventana de retención (o desconocida):
+        el cliente debe pedir un snapshot completo. Cuando no hay cambios es un solo rango sobre la clave primaria.
+        """
+        if cls._needs_resync(revision, **cls.objects.aggregate(oldest=models.Min('revision'), latest=models.Max('revision'))):
+            return revision, set(), True
+        cutoff = cls._settle_cutoff()
+        changes = cls.objects.filter(revision__gt=revision).order_by('revision').values_list('revision', 'order_id', 'created_at')
+        return (*settled_high_water_mark(revision, changes, cutoff), False)
+
+    @classmethod
+    async def asnapshot_revision(cls):
+        """Versión async de snapshot_revision()"""
+        cutoff = cls._settle_cutoff()
+        return cls._snapshot_revision([change async for change in cls._snapshot_changes()], cutoff)
+
+    @classmethod
+    async def achanged_since(cls, revision):
+        """Versión async de changed_since()"""
+        if cls._needs_resync(revision, **await cls.objects.aaggregate(oldest=models.Min('revision'), latest=models.Max('revision'))):
+            return revision, set(), True
+        cutoff = cls._settle_cutoff()
+        changes = [change async for change in cls.objects.filter(revision__gt=revision).order_by('revision').values_list(
+            'revision', 'order_id', 'created_at')]
+        return (*settled_high_water_mark(revision, changes, cutoff), False)
+
+
+class RealtimeEvent(models.Model):
+    """
+    Registro de los eventos en tiempo real (los mismos que van por Pusher y SSE).
+    Un cliente que se reconecta pide solo los eventos posteriores a la última
+    secuencia que vio, en vez de recargar todos los pedidos.
+    Su clave primaria es la secuencia; events.py poda lo que sale de la ventana de retención.
+    """
+    seq = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=50)
+    # Canales rodeados de comas (',cocina-channel,admin-channel,') para filtrar con LIKE
+    channels = models.CharField(max_length=255)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Realtime Event'
+        verbose_name_plural = 'Realtime Events'
+
+    def __str__(self):
+        return f"#{self.seq} {self.name}"
+
+    @classmethod
+    def record(cls, channels, name, data):
+        """Registra un evento y retorna su secuencia"""
+        return cls.objects.create(name=name, channels=f",{','.join(channels)},", data=data).seq
+
+    @classmethod
+    def latest_seq(cls):
+        """Retorna la secuencia más alta registrada (0 si no hay eventos)"""
+        latest = cls.objects.order_by('-seq').values_list('seq', flat=True).first()
+        return latest or 0
+
+    @classmethod
+    def after(cls, seq, channels):
+        """Eventos posteriores a la secuencia dada en alguno de los canales, en orden"""
+        from django.db.models import Q
+        channel_filter = Q()
+        for channel in channels:
+            channel_filter |= Q(channels__contains=f',{channel},')
+        return cls.objects.filter(channel_filter, seq__gt=seq).order_by('seq')
+
+    def as_event(self):
+        return {'seq': self.seq, 'name': self.name, 'data': self.data}
+
+
+class ResourceVersion(models.Model):
+    """
+    Contador de versión por recurso ('menu', 'categories', 'roombills', ...).
+    Las señales lo incrementan en cada guardado o eliminación y sirve como sello
+    barato (una sola consulta por clave primaria) para ETags y cachés.
+    Los pedidos no usan este contador: su versión es OrderChange.snapshot_revision().
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Resource Version'
+        verbose_name_plural = 'Resource Versions'
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @classmethod
+    def bump(cls, name):
+        """Incrementa la versión del recurso, creándolo si no existe"""
+        from django.db.models import F
+        if cls.objects.filter(name=name).update(version=F('version') + 1):
+            return
+        _, created = cls.objects.get_or_create(name=name, defaults={'version': 1})
+        if not created:
+            # Otro proceso lo creó entre el update y el get_or_create
+            cls.objects.filter(name=name).update(version=F('version') + 1)
+
+    @classmethod
+    def get_versions(cls, *names):
+        """Retorna {nombre: versión} para los recursos pedidos (0 si nunca cambiaron)"""
+        versions = dict(cls.objects.filter(name__in=names).values_list('name', 'version'))
+        return {name: versions.get(name, 0) for name in names}
+
+
+class HourlySalesRollup(models.Model):
+    """
+    Ventas pre-agregadas a nivel de pedido por (fecha, hora, estado, método de pago, garzón).
+    Solo cuenta pedidos 'paid' y 'charged_to_room'; se mantiene incrementalmente
+    desde las señales de Order (ver rollups.py) y se reconstruye con
+    `python manage.py rebuild_sales_rollups`.
+    Fecha y hora son locales (America/Santiago) de created_at.
+    """
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=20, blank=True, default='')
+    waiter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tip_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Hourly Sales Rollup'
+        verbose_name_plural = 'Hourly Sales Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'hour', 'status', 'payment_method', 'waiter'],
+                name='unique_hourly_sales_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.hour}:00 {self.status} {self.payment_method or '-'}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Ventas pre-agregadas a nivel de item por (fecha, estado, garzón, categoría, item).
+    sales = precio del item * cantidad al momento de registrarse (SalesRollupContribution).
+    Se mantiene junto con HourlySalesRollup.
+    """
+    date = models.DateField()
+    status = models.CharField(max_length=20)
+    waiter = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    category = models.CharField(max_length=50)
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Daily Sales Rollup'
+        verbose_name_plural = 'Daily Sales Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'status', 'waiter', 'category', 'menu_item'],
+                name='unique_daily_sales_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status} {self.menu_item_id} x{self.quantity}"
+
+
+class SalesRollupContribution(models.Model):
+    """
+    Aporte de un pedido a los rollups de ventas, tal como se sumó (ver rollups.py).
+    Al salir de los estados contados, cambiar o borrarse el pedido se resta
+    exactamente este aporte, aunque el precio del menú o los items hayan
+    cambiado desde entonces.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    amounts = models.JSONField()
+
+    class Meta:
+        verbose_name = 'Sales Rollup Contribution'
+        verbose_name_plural = 'Sales Rollup Contributions'
+
+    def __str__(self):
+        return f"Order {self.order_id}"
+
+
 class RoomBill(models.Model):
     """
     Agrupación de múltiples pedidos de una habitación para cobro conjunto.
@@ -207,6 +574,10 @@ class RoomBill(models.Model):
         verbose_name = 'Room Bill'
         verbose_name_plural = 'Room Bills'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['room_number', 'status'], name='roombill_room_status_idx'),
+            models.Index(fields=['created_at'], name='roombill_created_idx'),
+        ]
     
     def __str__(self):
         return f"Bill {self.id} - Habitación {self.room_number}"
@@ -249,3 +620,55 @@ class RegistrationPin(models.Model):
     def __str__(self):
         status = "Used" if self.used_by else "Active"
         return f"PIN for '{self.group.name}' ({status})"
+
+
+class ExportJob(models.Model):
+    """
+    A report export generated in the background (see export_jobs.py).
+
+    Jobs with the same kind, format and filters share a filters_hash so a
+    finished artifact can be reused while it is still fresh.
+    """
+    KIND_CHOICES = [
+        ('orders', 'Pedidos'),
+        ('roombills', 'Facturas de Habitación'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En Proceso'),
+        ('done', 'Completado'),
+        ('failed', 'Fallido'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='xlsx')
+    filters = models.JSONField(default=dict, blank=True)
+    filters_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    file_path = models.CharField(max_length=255, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Export {self.id} ({self.kind}.{self.format}) - {self.status}"
+
+    @property
+    def filename(self):
+        """Download name, e.g. reporte_pedidos_2025-01-31.xlsx"""
+        prefix = 'reporte_pedidos' if self.kind == 'orders' else 'reporte_facturas'
+        return f"{prefix}_{self.created_at.strftime('%Y-%m-%d')}.{self.format}"
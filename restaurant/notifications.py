@@ -0,0 +1,226 @@
+"""
+Asynchronous Pusher notification dispatcher.
+
+Signals call notify(), which only enqueues the event once the surrounding
+transaction commits (transaction.on_commit). A background worker thread
+drains the queue, groups pending events into Pusher batch-trigger calls and
+retries failed calls a bounded number of times. Events are dropped (and
+counted) when the queue is full or retries are exhausted, so a Pusher outage
+never blocks or breaks a request. notify() also records every event in the
+replayable event log and publishes it to the self-hosted SSE broadcaster
+(events.py); Pusher payloads carry the log sequence number as 'seq'.
+
+Tests can swap the client with set_pusher_client(FakeClient()) and call
+dispatcher.flush() to deliver the queue synchronously.
+"""
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from . import metrics
+from .events import broadcaster, record_event
+from .lazy import lazy_import
+
+# Pusher acepta como máximo 10 eventos por llamada a /batch_events
+PUSHER_BATCH_LIMIT = 10
+
+# Marca de "cliente aún no construido"
+_UNSET = object()
+
+# pusher (y sus dependencias HTTP) solo se importa al construir el cliente
+pusher = lazy_import('pusher')
+
+
+def pusher_configured():
+    """True when all Pusher credentials are set (without building the client)."""
+    return all([settings.PUSHER_APP_ID, settings.PUSHER_KEY, settings.PUSHER_SECRET, settings.PUSHER_CLUSTER])
+
+
+def build_pusher_client():
+    """
+    Build the Pusher client from settings.
+
+    Returns:
+        pusher.Pusher or None: None when Pusher is not configured
+    """
+    if not pusher_configured():
+        return None
+    return pusher.Pusher(
+        app_id=settings.PUSHER_APP_ID,
+        key=settings.PUSHER_KEY,
+        secret=settings.PUSHER_SECRET,
+        cluster=settings.PUSHER_CLUSTER,
+        ssl=settings.PUSHER_SSL
+    )
+
+
+class PusherDispatcher:
+    """
+    Queue of outgoing Pusher events flushed by a background worker thread.
+
+    Args:
+        client: Object with a Pusher-compatible trigger_batch(batch) method.
+            By default the shared Pusher client, built by build_pusher_client()
+            the first time it is needed
+        max_queue (int): Events kept in memory before new ones are dropped
+        max_retries (int): Attempts per batch before its events are dropped
+        retry_delay (float): Base delay in seconds, doubled after each failure
+    """
+
+    def __init__(self, client=_UNSET, max_queue=1000, max_retries=3, retry_delay=0.5):
+        self._client = client
+        self._client_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.sent = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    @property
+    def client(self):
+        if self._client is _UNSET:
+            with self._client_lock:
+                if self._client is _UNSET:
+                    self._client = build_pusher_client()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def enabled(self):
+        """True when events can be sent; does not build the default client."""
+        if self._client is _UNSET:
+            return pusher_configured()
+        return self._client is not None
+
+    def enqueue(self, channels, event_name, data):
+        """Queue one event for each channel without blocking the caller."""
+        if self.client is None:
+            return
+        for channel in channels:
+            try:
+                self._queue.put_nowait({'channel': channel, 'name': event_name, 'data': data})
+            except queue.Full:
+                self._count('dropped')
+                metrics.PUSHER_DROPPED_EVENTS.inc()
+        self._ensure_worker()
+
+    def flush(self):
+        """Deliver everything currently queued in the calling thread."""
+        while self._deliver_pending(block=False):
+            pass
+
+    def stats(self):
+        """Return delivery counters for monitoring."""
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'sent': self.sent,
+                'failed_batches': self.failed_batches,
+                'dropped': self.dropped,
+            }
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='pusher-dispatcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._deliver_pending(block=True)
+
+    def _deliver_pending(self, block):
+        """
+        Take up to PUSHER_BATCH_LIMIT queued events and send them in one call.
+
+        Returns:
+            bool: False when there was nothing to send
+        """
+        try:
+            batch = [self._queue.get(block=block)]
+        except queue.Empty:
+            return False
+        while len(batch) < PUSHER_BATCH_LIMIT:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._send(batch)
+        return True
+
+    def _send(self, batch):
+        for attempt in range(self.max_retries):
+            start = time.perf_counter()
+            try:
+                # trigger_batch codifica 'data' en el mismo dict: enviar copias para poder reintentar
+                self.client.trigger_batch([dict(event) for event in batch])
+                metrics.PUSHER_DISPATCH.labels('ok').observe(time.perf_counter() - start)
+                self._count('sent', len(batch))
+                return
+            except Exception as e:
+                metrics.PUSHER_DISPATCH.labels('error').observe(time.perf_counter() - start)
+                metrics.PUSHER_FAILED_BATCHES.inc()
+                self._count('failed_batches')
+                print(f"[PUSHER] Error sending batch of {len(batch)} events (attempt {attempt + 1}): {str(e)}")
+                if attempt + 1 < self.max_retries:
+                    time.sleep(self.retry_delay * (2 ** attempt))
+        self._count('dropped', len(batch))
+        metrics.PUSHER_DROPPED_EVENTS.inc(len(batch))
+
+
+dispatcher = PusherDispatcher()
+
+
+def set_pusher_client(client):
+    """Replace the Pusher client (e.g. with an in-process fake in tests)."""
+    dispatcher.client = client
+
+
+def notify(channels, event_name, data_builder):
+    """
+    Record a real-time event and send it (Pusher and SSE) after the current
+    transaction commits.
+
+    Args:
+        channels (list): Pusher channel names
+        event_name (str): Event name, e.g. 'nuevo-pedido'
+        data_builder (callable): Returns the event payload. It runs at
+            commit time, so it sees the committed rows (e.g. order items
+            created after the order itself).
+    """
+    def _enqueue():
+        try:
+            data = data_builder()
+        except Exception as e:
+            print(f"Error building {event_name} notification: {str(e)}")
+            return
+        try:
+            seq = record_event(channels, event_name, data)
+        except Exception as e:
+            print(f"[EVENTS] Error recording {event_name}: {str(e)}")
+            seq = None
+        if dispatcher.enabled:
+            dispatcher.enqueue(channels, event_name, data if seq is None else {**data, 'seq': seq})
+        if broadcaster.active:
+            try:
+                broadcaster.publish(channels, event_name, data, seq)
+            except Exception as e:
+                print(f"[EVENTS] Error publishing {event_name}: {str(e)}")
+
+    transaction.on_commit(_enqueue)
@@ -0,0 +1,108 @@
+"""
+Full-page cache for the public QR menu.
+
+Pages are rendered once per menu catalog version and stored on the
+MenuCatalog snapshot (see catalog.py), so they are dropped automatically
+when a MenuItem or Category change bumps the version. Each cached page
+keeps its body precompressed with gzip and, when the optional Brotli
+package is installed, brotli. Responses carry a strong ETag per encoding
+and Cache-Control headers, so browsers and proxies can revalidate with a
+304 instead of downloading the menu again.
+"""
+import gzip
+import hashlib
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se sirve gzip
+    brotli = None
+
+PUBLIC_MENU_MAX_AGE = getattr(settings, 'PUBLIC_MENU_MAX_AGE', 60)
+
+# Preferencia de codificación: brotli comprime mejor que gzip
+ENCODING_PREFERENCE = ('br', 'gzip')
+
+
+class CachedPage:
+    """
+    A response body with its precompressed variants.
+
+    Attributes:
+        content_type (str): Response content type
+        bodies (dict): Encoding ('identity', 'gzip', 'br') -> bytes
+        etags (dict): Encoding -> strong ETag of that representation
+    """
+
+    def __init__(self, content, content_type):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.content_type = content_type
+        self.bodies = {'identity': content, 'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(content)
+
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        # Cada codificación es una representación distinta: necesita su propio ETag fuerte
+        self.etags = {
+            encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+            for encoding in self.bodies
+        }
+
+
+def get_cached_page(cache, key, render):
+    """
+    Get a page from a cache dict, rendering it on the first request.
+
+    Args:
+        cache (dict): Per-version storage (MenuCatalog.pages)
+        key: Anything identifying the variant (kind, host, ...)
+        render (callable): Returns (content, content_type)
+    """
+    page = cache.get(key)
+    if page is None:
+        page = CachedPage(*render())
+        cache[key] = page
+    return page
+
+
+def _accepted_encodings(request):
+    """Encodings the client accepts (q=0 means refused)."""
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        match = re.search(r'q=([0-9.]+)', params)
+        if coding and not (match and float(match.group(1)) == 0):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def cached_page_response(request, page):
+    """
+    Serve a CachedPage: 304 when If-None-Match matches, otherwise the best
+    precompressed body the client accepts.
+    """
+    accepted = _accepted_encodings(request)
+    encoding = next(
+        (e for e in ENCODING_PREFERENCE if e in page.bodies and (e in accepted or '*' in accepted)),
+        'identity',
+    )
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if if_none_match and (if_none_match.strip() == '*' or any(
+        etag in if_none_match for etag in page.etags.values()
+    )):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(page.bodies[encoding], content_type=page.content_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = page.etags[encoding]
+    response['Cache-Control'] = f'public, max-age={PUBLIC_MENU_MAX_AGE}'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination over (created_at, id), newest first.
+
+Unlike OFFSET pagination, every page is a range scan that starts right
+after the last row of the previous page, so the cost of a page does not
+grow with the size of the table. The cursor handed to clients is an opaque
+token that encodes the (created_at, id) of that last row.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (created_at, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Parse a 'limit' query parameter, clamped to MAX_PAGE_SIZE.
+
+    Raises:
+        ValueError: If value is not a positive integer
+    """
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit debe ser mayor que 0')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def after_cursor(queryset, cursor):
+    """Rows strictly older than the cursor position, newest first."""
+    queryset = queryset.order_by('-created_at', '-id')
+    if not cursor:
+        return queryset
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def keyset_page(queryset, limit, cursor=None):
+    """
+    Fetch one page of a .values() queryset (must include 'created_at' and 'id').
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    rows = list(after_cursor(queryset, cursor)[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
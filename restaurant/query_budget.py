@@ -0,0 +1,157 @@
+"""
+Per-request SQL query instrumentation and query budgets.
+
+QueryBudgetMiddleware records, for each request, the number of queries,
+the time spent in the database and the queries that ran more than once
+with the same shape (fingerprint) - the signature of an N+1. Totals are
+aggregated per view (query_stats()).
+
+Views declare a budget with @query_budget (restaurant/decorators.py).
+A request over budget is logged; with QUERY_BUDGET_STRICT (on when running
+`manage.py test`) it raises QueryBudgetExceeded instead, so the test fails.
+Only a sample of requests is instrumented (QUERY_BUDGET_SAMPLE_RATE).
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+# Listas IN de largo variable no cambian la forma de la consulta
+IN_LIST_PATTERN = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# Control de transacciones: se cuenta, pero repetirlo no es un N+1
+TRANSACTION_PATTERN = re.compile(r'^\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.IGNORECASE)
+
+# Fingerprints duplicados que se guardan por vista (los más repetidos)
+MAX_DUPLICATES_PER_VIEW = 10
+
+
+class QueryBudgetExceeded(Exception):
+    """A view ran more queries (or duplicates, or DB time) than its budget allows."""
+
+
+class QueryBudget:
+    """
+    Limits for one view. None means no limit.
+
+    Args:
+        queries (int): Maximum queries per request
+        duplicates (int): Maximum executions of any single query fingerprint
+        db_ms (float): Maximum total database time per request, in milliseconds
+    """
+
+    def __init__(self, queries=None, duplicates=None, db_ms=None):
+        self.queries = queries
+        self.duplicates = duplicates
+        self.db_ms = db_ms
+
+    def violations(self, recorder):
+        """List of human-readable violations of this budget by a request."""
+        found = []
+        if self.queries is not None and recorder.count > self.queries:
+            found.append(f"{recorder.count} consultas (máx {self.queries})")
+        if self.duplicates is not None:
+            repeated = [(fp, n) for fp, n in recorder.fingerprints.most_common() if n > self.duplicates]
+            for fingerprint, count in repeated[:3]:
+                found.append(f"{count}× {fingerprint[:160]}")
+        if self.db_ms is not None and recorder.db_ms > self.db_ms:
+            found.append(f"{recorder.db_ms:.1f} ms en BD (máx {self.db_ms:g})")
+        return found
+
+
+def fingerprint(sql):
+    """Shape of a query: parameters are already placeholders, IN lists are collapsed."""
+    return IN_LIST_PATTERN.sub('(...)', ' '.join(sql.split()))
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that counts and times the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - start) * 1000
+            self.count += 1
+            if not TRANSACTION_PATTERN.match(sql):
+                self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """{fingerprint: executions} of the queries that ran more than once."""
+        return {fp: n for fp, n in self.fingerprints.items() if n > 1}
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def record(view_name, recorder, violated):
+    """Add one request to the per-view totals."""
+    with _stats_lock:
+        stats = _stats.setdefault(view_name, {
+            'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+            'violations': 0, 'duplicates': Counter(),
+        })
+        stats['requests'] += 1
+        stats['queries'] += recorder.count
+        stats['max_queries'] = max(stats['max_queries'], recorder.count)
+        stats['db_ms'] += recorder.db_ms
+        stats['violations'] += bool(violated)
+        stats['duplicates'].update(recorder.duplicates())
+        if len(stats['duplicates']) > MAX_DUPLICATES_PER_VIEW:
+            stats['duplicates'] = Counter(dict(stats['duplicates'].most_common(MAX_DUPLICATES_PER_VIEW)))
+
+
+def query_stats():
+    """
+    Query totals per view of this process, over the sampled requests.
+
+    Returns:
+        dict: view name -> {requests, queries, max_queries, avg_queries, db_ms,
+            violations, duplicates ({fingerprint: executions})}
+    """
+    with _stats_lock:
+        return {
+            view: {
+                **{key: value for key, value in stats.items() if key != 'duplicates'},
+                'avg_queries': stats['queries'] / stats['requests'],
+                'duplicates': dict(stats['duplicates'].most_common()),
+            }
+            for view, stats in _stats.items()
+        }
+
+
+def reset_query_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def should_sample():
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        return True
+    rate = getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def check_budget(request, recorder):
+    """Record the request and enforce the budget of its view (if it declares one)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return
+    budget = getattr(match.func, 'query_budget', None)
+    violations = budget.violations(recorder) if budget is not None else []
+    record(match.view_name, recorder, violations)
+    if not violations:
+        return
+    message = f"Presupuesto de consultas excedido en {match.view_name} ({request.method} {request.path}): " + '; '.join(violations)
+    if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+        raise QueryBudgetExceeded(message)
+    print(f"⚠️ {message}")
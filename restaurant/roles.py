@@ -0,0 +1,87 @@
+"""
+Role resolution for the restaurant app.
+
+A user's role is the name of the Django Group(s) they belong to
+('Administrador', 'Recepcionista', 'Cocinero', 'Garzón'). Group names are
+loaded once per user and kept in a process-local TTL cache, so authorization
+checks do not hit the database on every request.
+
+The cache is invalidated in this process when the user's groups change
+(m2m_changed on User.groups, see signals.py). Other workers pick up the
+change when their entry expires after ROLE_CACHE_TTL seconds.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+ROLE_CACHE_TTL = getattr(settings, 'ROLE_CACHE_TTL', 60)
+
+_role_cache = {}
+_role_cache_lock = threading.Lock()
+
+
+def get_user_roles(user):
+    """
+    Get the group names of a user, ordered by group id.
+
+    Args:
+        user: A User instance (anonymous users have no roles)
+
+    Returns:
+        tuple: The user's group names
+    """
+    if not user.is_authenticated:
+        return ()
+
+    now = time.monotonic()
+    with _role_cache_lock:
+        cached = _role_cache.get(user.pk)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    roles = tuple(user.groups.order_by('id').values_list('name', flat=True))
+    with _role_cache_lock:
+        _role_cache[user.pk] = (now + ROLE_CACHE_TTL, roles)
+    return roles
+
+
+def get_primary_role(user):
+    """
+    Get the first role of a user (same as user.groups.first().name).
+
+    Returns:
+        str or None: The role name, or None if the user has no group
+    """
+    roles = get_user_roles(user)
+    return roles[0] if roles else None
+
+
+def has_role(user, *roles, allow_superuser=False):
+    """
+    Check whether the user belongs to any of the given roles.
+
+    Args:
+        user: A User instance
+        *roles: Accepted group names
+        allow_superuser (bool): Superusers pass regardless of their groups
+
+    Returns:
+        bool: True if the user has at least one of the roles
+    """
+    if not user.is_authenticated:
+        return False
+    if allow_superuser and user.is_superuser:
+        return True
+    return any(role in roles for role in get_user_roles(user))
+
+
+def invalidate_user_roles(*user_ids):
+    """
+    Drop cached roles for the given users (or for everybody if none given).
+    """
+    with _role_cache_lock:
+        if not user_ids:
+            _role_cache.clear()
+        for user_id in user_ids:
+            _role_cache.pop(user_id, None)
@@ -0,0 +1,212 @@
+"""
+Incremental maintenance of the sales rollup tables.
+
+HourlySalesRollup (order level) and DailySalesRollup (item level) only count
+orders in ROLLUP_STATUSES. What an order adds to them is stored with it, as
+it was added (SalesRollupContribution). Every time a counted order is saved
+or deleted, the signals in signals.py call update_order_rollups(): the stored
+contribution is subtracted exactly and the one for the order's current state
+(current items at the current menu prices) is added, inside the same
+transaction as the order. A later price change or item edit therefore never
+makes the rollups drift.
+
+The deltas are added up per rollup row first and written with a constant
+number of queries per table, whatever the number of items.
+`python manage.py rebuild_sales_rollups` recomputes everything from scratch.
+"""
+import operator
+from decimal import Decimal
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import DailySalesRollup, HourlySalesRollup, Order, OrderItem, SalesRollupContribution
+
+ROLLUP_STATUSES = ('paid', 'charged_to_room')
+
+# Campos de Order que afectan a los rollups
+ROLLUP_FIELDS = ('status', 'payment_method', 'total_amount', 'tip_amount', 'created_at', 'user_id')
+
+# Campos que identifican una fila de cada rollup
+HOURLY_KEY = ('date', 'hour', 'status', 'payment_method', 'waiter_id')
+DAILY_KEY = ('date', 'status', 'waiter_id', 'category', 'menu_item_id')
+
+
+def order_state(order):
+    """Snapshot of the rollup-relevant fields of an order instance."""
+    return {field: getattr(order, field) for field in ROLLUP_FIELDS}
+
+
+def _order_items(order_id):
+    return list(OrderItem.objects.filter(order_id=order_id).values_list(
+        'menu_item_id', 'menu_item__category', 'quantity', 'menu_item__price'
+    ))
+
+
+def order_contribution(state, items):
+    """
+    What an order adds to the rollups in the given state.
+
+    Args:
+        state (dict): Rollup-relevant fields (order_state()), or None
+        items: (menu_item_id, category, quantity, price) of each line
+
+    Returns:
+        dict or None: JSON-serializable {'hourly': [key, amounts], 'daily': [[key, amounts], ...]},
+            None when the order is not counted
+    """
+    if state is None or state['status'] not in ROLLUP_STATUSES:
+        return None
+
+    local_created_at = timezone.localtime(state['created_at'])
+    local_date = local_created_at.date().isoformat()
+    lines = {}
+    for menu_item_id, category, quantity, price in items:
+        # Un mismo item puede repetirse en varias líneas del pedido
+        line = lines.setdefault((local_date, state['status'], state['user_id'], category, menu_item_id), [0, Decimal(0)])
+        line[0] += quantity
+        line[1] += quantity * price
+    return {
+        'hourly': [
+            [local_date, local_created_at.hour, state['status'], state['payment_method'] or '', state['user_id']],
+            {
+                'order_count': 1,
+                'total_amount': str(state['total_amount'] or 0),
+                'tip_amount': str(state['tip_amount'] or 0),
+            },
+        ],
+        'daily': [
+            [list(key), {'quantity': quantity, 'sales': str(sales)}]
+            for key, (quantity, sales) in lines.items()
+        ],
+    }
+
+
+def _accumulate(totals, contribution, sign):
+    """Add sign * contribution to totals: {'hourly': {key: {field: value}}, 'daily': {...}}."""
+    if contribution is None:
+        return
+    for table, rows in (('hourly', [contribution['hourly']]), ('daily', contribution['daily'])):
+        for key, amounts in rows:
+            row = totals[table].setdefault(tuple(key), {})
+            for field, value in amounts.items():
+                # Montos guardados como texto (JSON): Decimal exacto
+                value = Decimal(value) if isinstance(value, str) else value
+                row[field] = row.get(field, 0) + sign * value
+
+
+def _add_to_rollup(model, key_fields, deltas):
+    """
+    Add {key: {field: delta}} to the rollup rows: one INSERT for the missing
+    rows and one UPDATE for all of them, whatever the number of keys.
+    """
+    deltas = {key: amounts for key, amounts in deltas.items() if any(amounts.values())}
+    if not deltas:
+        return
+    keys = [dict(zip(key_fields, key)) for key in deltas]
+    # Filas en cero para las claves nuevas; si otro proceso la creó antes, se usa esa
+    model.objects.bulk_create([model(**key) for key in keys], ignore_conflicts=True)
+    matches = [(Q(**key), amounts) for key, amounts in zip(keys, deltas.values())]
+    fields = {field for amounts in deltas.values() for field in amounts}
+    # UPDATE atómico (campo = campo + delta): no pierde aportes concurrentes de otros pedidos
+    model.objects.filter(reduce(operator.or_, (condition for condition, _ in matches))).update(**{
+        field: F(field) + Case(
+            *[When(condition, then=Value(amounts.get(field, 0))) for condition, amounts in matches],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field in fields
+    })
+
+
+def update_order_rollups(order_id, state):
+    """
+    Replace the stored contribution of an order with the one for `state`
+    (None when the order is deleted), moving the difference into the rollups.
+    """
+    stored = SalesRollupContribution.objects.filter(order_id=order_id).values_list('amounts', flat=True).first()
+    counted = state is not None and state['status'] in ROLLUP_STATUSES
+    if stored is None and not counted:
+        return
+
+    contribution = order_contribution(state, _order_items(order_id)) if counted else None
+    if contribution == stored:
+        return
+
+    totals = {'hourly': {}, 'daily': {}}
+    _accumulate(totals, stored, -1)
+    _accumulate(totals, contribution, 1)
+    # Rollups y aporte juntos; dentro de la transacción del request no agrega savepoints
+    with transaction.atomic(savepoint=False):
+        _add_to_rollup(HourlySalesRollup, HOURLY_KEY, totals['hourly'])
+        _add_to_rollup(DailySalesRollup, DAILY_KEY, totals['daily'])
+
+        if contribution is None:
+            SalesRollupContribution.objects.filter(order_id=order_id).delete()
+        elif stored is None:
+            SalesRollupContribution.objects.create(order_id=order_id, amounts=contribution)
+        else:
+            SalesRollupContribution.objects.filter(order_id=order_id).update(amounts=contribution)
+
+
+def rebuild_sales_rollups(apps=None, batch_size=1000):
+    """
+    Recompute both rollup tables and the stored contributions from the full
+    order history, at the current menu prices.
+
+    Args:
+        apps: App registry of a migration, to run against its historical models
+        batch_size (int): Orders read per batch
+
+    Returns:
+        tuple: (hourly_rows, daily_rows) created
+    """
+    order_model, item_model, hourly_model, daily_model, contribution_model = (
+        Order, OrderItem, HourlySalesRollup, DailySalesRollup, SalesRollupContribution
+    )
+    if apps is not None:
+        order_model, item_model, hourly_model, daily_model, contribution_model = (
+            apps.get_model('restaurant', name)
+            for name in ('Order', 'OrderItem', 'HourlySalesRollup', 'DailySalesRollup', 'SalesRollupContribution')
+        )
+
+    totals = {'hourly': {}, 'daily': {}}
+    with transaction.atomic():
+        hourly_model.objects.all().delete()
+        daily_model.objects.all().delete()
+        contribution_model.objects.all().delete()
+
+        last_id = 0
+        while True:
+            # Por rangos de id: el aporte de cada pedido se calcula igual que en update_order_rollups()
+            orders = list(order_model.objects.filter(status__in=ROLLUP_STATUSES, id__gt=last_id).order_by('id').values(
+                'id', *ROLLUP_FIELDS
+            )[:batch_size])
+            if not orders:
+                break
+            items = {}
+            for order_id, *item in item_model.objects.filter(order_id__in=[order['id'] for order in orders]).values_list(
+                'order_id', 'menu_item_id', 'menu_item__category', 'quantity', 'menu_item__price'
+            ):
+                items.setdefault(order_id, []).append(item)
+
+            contributions = []
+            for order in orders:
+                contribution = order_contribution(order, items.get(order['id'], []))
+                _accumulate(totals, contribution, 1)
+                contributions.append(contribution_model(order_id=order['id'], amounts=contribution))
+            contribution_model.objects.bulk_create(contributions, batch_size=500)
+            last_id = orders[-1]['id']
+
+        hourly = hourly_model.objects.bulk_create([
+            hourly_model(**dict(zip(HOURLY_KEY, key)), **amounts)
+            for key, amounts in totals['hourly'].items()
+        ], batch_size=500)
+        daily = daily_model.objects.bulk_create([
+            daily_model(**dict(zip(DAILY_KEY, key)), **amounts)
+            for key, amounts in totals['daily'].items()
+        ], batch_size=500)
+
+    return len(hourly), len(daily)
@@ -0,0 +1,166 @@
+"""
+Order search by client, room, order number and dish name.
+
+Order.save() keeps Order.search_text as the normalized (lowercase,
+accent-folded) room number and client identifier. Substring matches on it
+are served by an index instead of a table scan:
+
+- PostgreSQL: a pg_trgm GIN index on search_text (migration 0020), which
+  PostgreSQL uses for `search_text LIKE '%...%'`.
+- SQLite/MySQL: the OrderSearchGram side table, holding every trigram of
+  search_text. Candidates are the orders that contain the query's rarest
+  trigrams; the final LIKE only runs on those rows. Queries shorter than a
+  trigram, or made only of very common trigrams, match plenty of rows and
+  use the plain LIKE, which finds the first page quickly.
+
+Dish names are matched against the (small) menu, and orders containing
+the matching dishes are found through the OrderItem.menu_item index.
+
+Migration 0020 fills search_text and the trigram table for existing
+orders; `python manage.py rebuild_order_search` does the same for orders
+created with bulk_create() or updated with update().
+"""
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import MenuItem, Order, OrderItem, OrderSearchGram
+from .utils import normalize_search_text, order_search_text
+
+GRAM_SIZE = 3
+# Un trigrama presente en más pedidos que esto se considera poco selectivo
+COMMON_GRAM_LIMIT = 1000
+# Trigramas (los menos frecuentes) que se intersectan para obtener candidatos
+SELECTIVE_GRAMS = 3
+
+
+def uses_trigram_index():
+    """True when the database has the pg_trgm index (no side table needed)."""
+    return connection.vendor == 'postgresql'
+
+
+def text_grams(text):
+    """Distinct trigrams of a normalized text."""
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def index_order_search(orders, gram_model=OrderSearchGram):
+    """
+    Rewrite the trigram rows of the given orders from their search_text.
+
+    Args:
+        orders: Iterable of (order_id, search_text) pairs
+        gram_model: OrderSearchGram, or its historical model in a migration
+    """
+    if uses_trigram_index():
+        return
+    orders = list(orders)
+    if not orders:
+        return
+    gram_model.objects.filter(order_id__in=[order_id for order_id, _ in orders]).delete()
+    gram_model.objects.bulk_create([
+        gram_model(order_id=order_id, gram=gram)
+        for order_id, search_text in orders
+        for gram in text_grams(search_text)
+    ], batch_size=1000)
+
+
+def _gram_frequencies(grams):
+    """
+    Number of orders containing each trigram, counted up to COMMON_GRAM_LIMIT.
+    Each count reads at most COMMON_GRAM_LIMIT index entries.
+    """
+    return {
+        gram: OrderSearchGram.objects.filter(gram=gram)[:COMMON_GRAM_LIMIT].count()
+        for gram in grams
+    }
+
+
+def _text_condition(query):
+    """Q matching orders whose search_text contains the normalized query."""
+    contains = Q(search_text__contains=query)
+    if uses_trigram_index() or len(query) < GRAM_SIZE:
+        return contains
+
+    frequencies = _gram_frequencies(text_grams(query))
+    if 0 in frequencies.values():
+        # Algún trigrama no aparece en ningún pedido: no hay coincidencias
+        return Q(pk__in=[])
+
+    # Intersectar solo los trigramas más selectivos; el LIKE final descarta falsos positivos
+    selective = sorted(frequencies, key=frequencies.get)[:SELECTIVE_GRAMS]
+    if frequencies[selective[0]] >= COMMON_GRAM_LIMIT:
+        # Texto muy común: recorrer los pedidos encuentra coincidencias enseguida
+        return contains
+
+    candidates = OrderSearchGram.objects.filter(gram__in=selective).values('order_id').annotate(
+        matched=Count('gram', distinct=True)
+    ).filter(matched=len(selective))
+    return Q(id__in=candidates.values('order_id')) & contains
+
+
+def matching_dish_ids(query):
+    """Ids of menu items whose normalized name contains the normalized query."""
+    return [
+        item_id for item_id, name in MenuItem.objects.values_list('id', 'name')
+        if query in normalize_search_text(name)
+    ]
+
+
+def search_orders(queryset, query, include_dishes=True):
+    """
+    Filter an Order queryset by a free-text query.
+
+    Matches order number (exact, for numeric queries), room number and
+    client identifier (substring, case and accent insensitive) and,
+    with include_dishes, orders containing a dish whose name matches.
+    """
+    query = normalize_search_text(query)
+    if not query:
+        return queryset
+
+    condition = _text_condition(query)
+    if query.isdigit():
+        condition |= Q(id=int(query))
+    if include_dishes:
+        dish_ids = matching_dish_ids(query)
+        if dish_ids:
+            condition |= Q(id__in=OrderItem.objects.filter(menu_item_id__in=dish_ids).values('order_id'))
+    return queryset.filter(condition)
+
+
+def rebuild_order_search(batch_size=2000, apps=None):
+    """
+    Recompute search_text and the trigram table for every order.
+
+    Args:
+        batch_size (int): Orders read and written per batch
+        apps: App registry of a migration, to run against its historical models
+
+    Returns:
+        int: Number of orders processed
+    """
+    order_model, gram_model = Order, OrderSearchGram
+    if apps is not None:
+        order_model = apps.get_model('restaurant', 'Order')
+        gram_model = apps.get_model('restaurant', 'OrderSearchGram')
+    total = 0
+    last_id = 0
+    while True:
+        # Recorrer por rangos de id (no un iterator abierto mientras se escribe en la tabla)
+        rows = list(order_model.objects.filter(id__gt=last_id).order_by('id').values_list(
+            'id', 'room_number', 'client_identifier', 'search_text'
+        )[:batch_size])
+        if not rows:
+            return total
+
+        batch = []
+        changed = []
+        for order_id, room_number, client_identifier, current in rows:
+            search_text = order_search_text(room_number, client_identifier)
+            if search_text != current:
+                changed.append(order_model(id=order_id, search_text=search_text))
+            batch.append((order_id, search_text))
+        order_model.objects.bulk_update(changed, ['search_text'], batch_size=500)
+        index_order_search(batch, gram_model)
+        total += len(batch)
+        last_id = rows[-1][0]
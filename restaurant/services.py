@@ -0,0 +1,121 @@
+"""
+Business services for the restaurant app.
+"""
+import decimal
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MenuItem, Order, OrderItem
+
+# Ventana en la que un reenvío con los mismos items se considera duplicado
+IDEMPOTENCY_WINDOW_SECONDS = getattr(settings, 'IDEMPOTENCY_WINDOW_SECONDS', 5)
+
+
+def order_idempotency_keys(user, items, client_identifier, room_number, header_key=None, now=None):
+    """
+    Compute the idempotency key to store on a new order and the keys to look up.
+
+    If the client sent an Idempotency-Key header, that key (scoped to the
+    user) is used as is. Otherwise the key is derived from the canonical
+    item list plus the current time bucket of IDEMPOTENCY_WINDOW_SECONDS, so
+    the same order placed again later is not treated as a duplicate. The
+    previous bucket is also looked up to catch retries across a bucket edge.
+
+    Returns:
+        tuple: (key_to_store, keys_to_look_up)
+    """
+    if header_key:
+        key = hashlib.sha256(f'{user.pk}:header:{header_key}'.encode()).hexdigest()
+        return key, [key]
+
+    canonical_items = sorted(
+        (int(item['id']), int(item.get('quantity', 1))) for item in items
+    )
+    payload = json.dumps([user.pk, client_identifier, room_number, canonical_items])
+    bucket = int((now or timezone.now()).timestamp() // IDEMPOTENCY_WINDOW_SECONDS)
+    keys = [
+        hashlib.sha256(f'{payload}:{b}'.encode()).hexdigest()
+        for b in (bucket, bucket - 1)
+    ]
+    return keys[0], keys
+
+
+def find_duplicate_order(keys):
+    """Return the order already created with any of the keys (one indexed lookup)."""
+    return Order.objects.filter(idempotency_key__in=keys).first()
+
+
+def create_order_with_items(user, items, client_identifier, room_number, tip_amount, idempotency_key=None):
+    """
+    Create an order and all of its items with a constant number of queries.
+
+    Menu items are resolved with a single in_bulk() query, validated in
+    memory and the OrderItems are inserted with one bulk_create(), so the
+    cost does not grow with the number of lines.
+
+    Args:
+        user: The waiter creating the order
+        items (list): Dicts with 'id', optional 'quantity' and 'note'
+        client_identifier (str): Client or table identifier
+        room_number (str): Guest room number
+        tip_amount (Decimal): Tip added to the total
+        idempotency_key (str): Unique key from order_idempotency_keys()
+
+    Returns:
+        tuple: (order, order_items) with the in-memory instances
+
+    Raises:
+        ValueError: If an item is missing, unknown, unavailable or has an invalid quantity
+        IntegrityError: If another order already uses the idempotency key
+    """
+    try:
+        menu_item_ids = {int(item['id']) for item in items}
+    except KeyError as e:
+        raise ValueError(f"Missing required field in item: {str(e)}")
+    except (TypeError, ValueError):
+        raise ValueError("Item id must be an integer")
+
+    menu_items = MenuItem.objects.in_bulk(menu_item_ids)
+
+    subtotal = decimal.Decimal('0.00')
+    order_items = []
+    for item in items:
+        menu_item = menu_items.get(int(item['id']))
+        if menu_item is None:
+            raise ValueError(f"MenuItem with id {item['id']} not found")
+        if not menu_item.available:
+            raise ValueError(f"MenuItem '{menu_item.name}' is not available")
+        try:
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid quantity for MenuItem {menu_item.id}")
+        if quantity < 1:
+            raise ValueError(f"Invalid quantity for MenuItem {menu_item.id}")
+
+        subtotal += menu_item.price * quantity
+        order_items.append(OrderItem(
+            menu_item=menu_item,
+            quantity=quantity,
+            note=str(item.get('note', ''))
+        ))
+
+    # O todo se crea, o nada se crea si hay un error.
+    with transaction.atomic():
+        order = Order.objects.create(
+            client_identifier=client_identifier,
+            room_number=room_number,
+            user=user,
+            status='pending',
+            tip_amount=tip_amount,
+            total_amount=subtotal + tip_amount,  # Set total_amount on creation
+            idempotency_key=idempotency_key
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+    return order, order_items
@@ -1,33 +1,109 @@
-import pusher
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Order, MenuItem
-
-# --- Configuración del Cliente Pusher ---
-pusher_client = None
-if all([settings.PUSHER_APP_ID, settings.PUSHER_KEY, settings.PUSHER_SECRET, settings.PUSHER_CLUSTER]):
-    pusher_client = pusher.Pusher(
-        app_id=settings.PUSHER_APP_ID,
-        key=settings.PUSHER_KEY,
-        secret=settings.PUSHER_SECRET,
-        cluster=settings.PUSHER_CLUSTER,
-        ssl=True
-    )
+from .catalog import invalidate_menu_catalog
+from .image_urls import responsive_images, thumbnail_fields
+from .models import Order, OrderItem, OrderChange, MenuItem, Category, RoomBill, ResourceVersion
+from .notifications import notify
+from .roles import invalidate_user_roles
+from .rollups import ROLLUP_FIELDS, ROLLUP_STATUSES, order_state, update_order_rollups
+from .search import index_order_search
 
-# --- Señales para Pedidos ---
+# --- Feed incremental de cambios de pedidos ---
 @receiver(post_save, sender=Order)
-def order_status_changed(sender, instance, created, **kwargs):
+@receiver(post_delete, sender=Order)
+def record_order_change(sender, instance, **kwargs):
     """
-    Cuando un pedido se crea o actualiza, envía notificaciones
-    a los canales apropiados según el rol y el estado.
+    Registra una nueva revisión en el feed de cambios cada vez que un pedido
+    se crea, actualiza o elimina. Se ejecuta dentro de la misma transacción.
+    """
+    OrderChange.record(instance.id)
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def record_order_item_change(sender, instance, origin=None, **kwargs):
+    """Un cambio en los items de un pedido también es un cambio del pedido."""
+    origin_model = getattr(origin, 'model', type(origin))
+    if origin_model in (Order, User):
+        # Items borrados en cascada con su pedido: el post_delete del pedido registra el cambio una vez
+        return
+    OrderChange.record(instance.order_id)
+
+# --- Rollups de ventas ---
+@receiver(post_save, sender=Order)
+def update_sales_rollups(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Reemplaza el aporte guardado del pedido (SalesRollupContribution) por el de
+    su estado actual. Lo que se resta es lo que se sumó, así que no importa que
+    los items ya se hayan editado antes de este save().
     """
-    if not pusher_client:
+    if update_fields is not None and not set(update_fields) & set(ROLLUP_FIELDS):
+        # Solo cambian campos que no afectan a los rollups
         return
+    if created and instance.status not in ROLLUP_STATUSES:
+        # Pedido nuevo: todavía no tiene aporte guardado
+        return
+    update_order_rollups(instance.pk, order_state(instance))
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    # pre_delete: el aporte guardado se borra en cascada con el pedido
+    update_order_rollups(instance.pk, None)
 
-    # Get order items
+# --- Índice de búsqueda de pedidos ---
+@receiver(post_save, sender=Order)
+def update_order_search_index(sender, instance, **kwargs):
+    """Actualiza los trigramas del pedido cuando cambia su texto de búsqueda (Order.save)."""
+    if getattr(instance, '_search_text_changed', False):
+        index_order_search([(instance.pk, instance.search_text)])
+        instance._search_text_changed = False
+
+# --- Caché de roles ---
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalida los roles cacheados cuando cambian los grupos de un usuario
+    (por ejemplo, al cambiar el rol desde api_users).
+    """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_user_roles(instance.pk)
+    elif pk_set:
+        invalidate_user_roles(*pk_set)
+    else:
+        # group.user_set.clear(): no sabemos qué usuarios estaban en el grupo
+        invalidate_user_roles()
+
+# --- Versiones de recursos (ETags de los endpoints de lectura) ---
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def bump_menu_version(sender, **kwargs):
+    ResourceVersion.bump('menu')
+    invalidate_menu_catalog()
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_categories_version(sender, **kwargs):
+    ResourceVersion.bump('categories')
+    invalidate_menu_catalog()
+
+@receiver(post_save, sender=RoomBill)
+@receiver(post_delete, sender=RoomBill)
+@receiver(m2m_changed, sender=RoomBill.orders.through)
+def bump_roombills_version(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        ResourceVersion.bump('roombills')
+
+# --- Señales para Pedidos ---
+def build_order_data(order):
+    """
+    Construye el payload de un pedido para las notificaciones en tiempo real.
+    Se llama al confirmar la transacción, cuando los items ya existen.
+    """
     items = []
-    for item in instance.orderitem_set.all():
+    for item in order.orderitem_set.select_related('menu_item'):
         items.append({
             'name': item.menu_item.name,
             'quantity': item.quantity,
@@ -35,88 +111,88 @@ def order_status_changed(sender, instance, created, **kwargs):
             'is_prepared': item.is_prepared,
         })
 
-    order_data = {
-        'id': instance.id,
-        'client_identifier': instance.client_identifier,
-        'identifier': instance.room_number or instance.client_identifier,
-        'status': instance.status,
-        'status_display': instance.get_status_display(),
-        'status_class': instance.status_class,
-        'created_at': instance.created_at.isoformat(),
-        'user_id': instance.user.id,
-        'room_number': instance.room_number,
-        'total': float(instance.total_amount) if instance.total_amount else 0,
+    return {
+        'id': order.id,
+        'client_identifier': order.client_identifier,
+        'identifier': order.room_number or order.client_identifier,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'status_class': order.status_class,
+        'created_at': order.created_at.isoformat(),
+        'user_id': order.user_id,
+        'room_number': order.room_number,
+        'total': float(order.total_amount) if order.total_amount else 0,
         'items': items,  # AGREGADO: Items del pedido para cocina
     }
 
+@receiver(post_save, sender=Order)
+def order_status_changed(sender, instance, created, **kwargs):
+    """
+    Cuando un pedido se crea o actualiza, envía notificaciones
+    a los canales apropiados según el rol y el estado.
+    Las notificaciones se registran en el log de eventos al confirmar la
+    transacción y las envía el dispatcher en segundo plano (ver notifications.py).
+    """
     if created:
         # 1. Notificar a COCINA, ADMIN y GARZON sobre un NUEVO pedido
-        try:
-            print(f"[PUSHER] Enviando nuevo-pedido #{instance.id} a cocina-channel, admin-channel y garzon-channel")
-            pusher_client.trigger(['cocina-channel', 'admin-channel', 'garzon-channel'], 'nuevo-pedido', {
+        def nuevo_pedido():
+            order_data = build_order_data(instance)
+            return {
                 'message': f"Nuevo pedido de: {order_data['client_identifier']}",
                 'order': order_data
-            })
-        except Exception as e:
-            print(f"Error sending nuevo-pedido notification: {str(e)}")
-    else:
-        # Para órdenes existentes, SOLO notificar si update_fields está vacío o contiene 'status'
-        # Esto evita notificaciones cuando solo se actualiza total_amount
-        update_fields = kwargs.get('update_fields')
-        
-        # Si update_fields es None (guardado completo) o contiene 'status', enviar notificación
-        if update_fields is None or 'status' in update_fields:
-            try:
-                # 3. Notificaciones ESPECÍFICAS por estado (tienen prioridad):
-                if instance.status == 'ready':
-                    # Solo enviar pedido-listo, sin actualizacion-estado redundante
-                    pusher_client.trigger(['garzon-channel'], 'pedido-listo', {
-                        'message': f"¡El pedido para '{instance.client_identifier}' está listo!",
-                        'order': order_data
-                    })
-
-                elif instance.status == 'charged_to_room':
-                    # Notificar a recepción que se cargó a habitación
-                    pusher_client.trigger(['recepcion-channel'], 'cargo-habitacion', {
-                        'message': f"Se cargó un pedido a la habitación {instance.room_number}",
-                        'order': order_data
-                    })
-
-                elif instance.status == 'paid':
-                    # Notificar a recepción y admin que se pagó
-                    pusher_client.trigger(['recepcion-channel', 'admin-channel'], 'pedido-pagado', {
-                        'message': f"Pedido pagado: {order_data['client_identifier']}",
-                        'order': order_data
-                    })
-                
-                else:
-                    # Para otros estados (pending, preparing, cancelled), enviar actualizacion-estado
-                    pusher_client.trigger(['cocina-channel', 'garzon-channel'], 'actualizacion-estado', {
-                        'order': order_data
-                    })
-            except Exception as e:
-                print(f"Error sending status update notification: {str(e)}")
+            }
+        notify(['cocina-channel', 'admin-channel', 'garzon-channel'], 'nuevo-pedido', nuevo_pedido)
+        return
 
-# --- Señales para Items del Menú ---
-@receiver(post_save, sender=MenuItem)
-def menu_item_changed(sender, instance, **kwargs):
-    """
-    Cuando la disponibilidad de un item del menú cambia, notifica a todos.
-    """
-    if not pusher_client:
+    # Para órdenes existentes, SOLO notificar si update_fields está vacío o contiene 'status'
+    # Esto evita notificaciones cuando solo se actualiza total_amount
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'status' not in update_fields:
         return
 
-    # Notifica a los garzones y al admin sobre el cambio de disponibilidad.
-    # Construir URL completa de la imagen
-    image_url = None
-    if instance.image:
-        image_url = instance.image.url
+    # 3. Notificaciones ESPECÍFICAS por estado (tienen prioridad):
+    status = instance.status
+    if status == 'ready':
+        # Solo enviar pedido-listo, sin actualizacion-estado redundante
+        notify(['garzon-channel'], 'pedido-listo', lambda: {
+            'message': f"¡El pedido para '{instance.client_identifier}' está listo!",
+            'order': build_order_data(instance)
+        })
+
+    elif status == 'charged_to_room':
+        # Notificar a recepción que se cargó a habitación
+        notify(['recepcion-channel'], 'cargo-habitacion', lambda: {
+            'message': f"Se cargó un pedido a la habitación {instance.room_number}",
+            'order': build_order_data(instance)
+        })
+
+    elif status == 'paid':
+        # Notificar a recepción y admin que se pagó
+        def pedido_pagado():
+            order_data = build_order_data(instance)
+            return {
+                'message': f"Pedido pagado: {order_data['client_identifier']}",
+                'order': order_data
+            }
+        notify(['recepcion-channel', 'admin-channel'], 'pedido-pagado', pedido_pagado)
+
+    else:
+        # Para otros estados (pending, preparing, cancelled), enviar actualizacion-estado
+        notify(['cocina-channel', 'garzon-channel'], 'actualizacion-estado', lambda: {
+            'order': build_order_data(instance)
+        })
+
+# --- Señales para Items del Menú ---
+def build_menu_item_data(instance):
+    """Payload de item-disponibilidad con la URL completa de la imagen."""
+    # image_url resuelve derivados publicados, referencias 'cloudinary:' y archivos locales
+    image_url = instance.image_url
+    if image_url:
         # Si es una URL relativa (empieza con /), hacerla absoluta
         if image_url.startswith('/'):
-            from django.conf import settings
             image_url = f"{settings.SITE_URL.rstrip('/')}{image_url}" if hasattr(settings, 'SITE_URL') else image_url
-    
-    pusher_client.trigger(['garzon-channel', 'admin-channel'], 'item-disponibilidad', {
+
+    return {
         'id': instance.id,
         'item_id': instance.id,
         'name': instance.name,
@@ -124,5 +200,15 @@ def menu_item_changed(sender, instance, **kwargs):
         'price': float(instance.price),
         'category': instance.category,
         'available': instance.available,
-        'image_url': image_url
-    })
\ No newline at end of file
+        'image_url': image_url,
+        **thumbnail_fields(responsive_images(instance)),
+        'image_status': instance.image_status,
+    }
+
+@receiver(post_save, sender=MenuItem)
+def menu_item_changed(sender, instance, **kwargs):
+    """
+    Cuando la disponibilidad de un item del menú cambia, notifica a todos.
+    """
+    # Notifica a los garzones y al admin sobre el cambio de disponibilidad.
+    notify(['garzon-channel', 'admin-channel'], 'item-disponibilidad', lambda: build_menu_item_data(instance))
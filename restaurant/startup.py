@@ -0,0 +1,201 @@
+"""
+One-shot application bootstrap and readiness checks.
+
+Importing the WSGI module does no database work. Migrations and default
+data are applied once per deploy by `python manage.py bootstrap`, which
+runs before gunicorn starts its workers:
+
+- A database advisory lock (pg_advisory_lock on PostgreSQL, GET_LOCK on
+  MySQL) serializes concurrent bootstraps, e.g. two instances starting at
+  the same time. SQLite is single-host and serializes writes by itself.
+- `migrate` only runs when the migration recorder shows unapplied
+  migrations; otherwise the check costs one query.
+- Default groups, users and menu items are created with a handful of bulk
+  queries, hashing each distinct password once.
+
+readiness() backs the /restaurant/ready/ endpoint: the instance is ready
+when the database answers and no migrations are pending.
+"""
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+# Identificador del lock de bootstrap (pg_advisory_lock usa un bigint; GET_LOCK un nombre)
+BOOTSTRAP_LOCK_ID = 728_315_001
+BOOTSTRAP_LOCK_NAME = 'abbarestaurante-bootstrap'
+BOOTSTRAP_LOCK_TIMEOUT = 300
+
+# Usuarios por defecto: rol -> datos. La contraseña 'password123' es solo para desarrollo
+DEFAULT_USERS = {
+    'Administrador': {'username': 'admin_user', 'password': 'password123', 'is_superuser': True},
+    'Recepcionista': {'username': 'recepcion_user', 'password': 'password123'},
+    'Garzón': {'username': 'garzon_user', 'password': 'password123'},
+    'Cocinero': {'username': 'cocinero_user', 'password': 'password123'},
+}
+
+DEFAULT_MENU_ITEMS = [
+    # Entradas
+    {'name': 'Ceviche Clásico', 'description': 'Pescado fresco marinado en jugo de limón, con cebolla roja, cilantro y ají limo.', 'price': 9800, 'category': 'Entradas'},
+    {'name': 'Causa Limeña de Pollo', 'description': 'Suave puré de papa amarilla sazonado con ají y limón, relleno de pollo y mayonesa.', 'price': 7500, 'category': 'Entradas'},
+    {'name': 'Tequeños de Queso', 'description': 'Crujientes bastones de masa frita rellenos de queso, acompañados de salsa de palta.', 'price': 6900, 'category': 'Entradas'},
+    # Platos de Fondo
+    {'name': 'Lomo Saltado', 'description': 'Trozos de lomo de res salteados con cebolla, tomate y ají amarillo, servido con papas fritas y arroz.', 'price': 12500, 'category': 'Platos de Fondo'},
+    {'name': 'Aji de Gallina', 'description': 'Pechuga de gallina deshilachada en una cremosa salsa de ají amarillo, nueces y queso.', 'price': 10500, 'category': 'Platos de Fondo'},
+    {'name': 'Seco de Cordero', 'description': 'Tierno cordero cocido a fuego lento en salsa de cilantro, acompañado de frijoles y arroz.', 'price': 13500, 'category': 'Platos de Fondo'},
+    {'name': 'Arroz con Mariscos', 'description': 'Sabrosa mezcla de arroz con mariscos frescos, aderezo de ajíes y un toque de vino blanco.', 'price': 14200, 'category': 'Platos de Fondo'},
+    # Postres
+    {'name': 'Suspiro a la Limeña', 'description': 'Dulce de manjar blanco cubierto con merengue al oporto.', 'price': 4500, 'category': 'Postres'},
+    {'name': 'Torta Tres Leches', 'description': 'Bizcocho esponjoso bañado en una mezcla de tres tipos de leche, cubierto con crema batida.', 'price': 5200, 'category': 'Postres'},
+    # Bebestibles
+    {'name': 'Jugo Natural de Frutilla', 'description': 'Jugo fresco preparado con frutillas de temporada.', 'price': 3500, 'category': 'Bebestibles'},
+    {'name': 'Limonada Menta Jengibre', 'description': 'Refrescante limonada con toques de menta fresca y jengibre.', 'price': 3800, 'category': 'Bebestibles'},
+    # Cócteles
+    {'name': 'Pisco Sour', 'description': 'El clásico cóctel peruano con pisco, jugo de limón, jarabe de goma y clara de huevo.', 'price': 5500, 'category': 'Cócteles'},
+    {'name': 'Mojito Clásico', 'description': 'Refrescante mezcla de ron, menta, limón, azúcar y agua con gas.', 'price': 6200, 'category': 'Cócteles'},
+    # Vinos y Cervezas
+    {'name': 'Copa de Vino Tinto (Carmenere)', 'description': 'Copa de vino tinto reserva, variedad Carmenere.', 'price': 4800, 'category': 'Vinos y Cervezas'},
+    {'name': 'Cerveza Nacional', 'description': 'Botella de cerveza lager nacional.', 'price': 3500, 'category': 'Vinos y Cervezas'},
+]
+
+# Una vez aplicadas, las migraciones no se revierten solas: no volver a revisarlas
+_migrations_applied = False
+
+
+@contextmanager
+def bootstrap_lock():
+    """Hold the database-wide bootstrap advisory lock."""
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute('SELECT pg_advisory_lock(%s)', [BOOTSTRAP_LOCK_ID])
+        elif vendor == 'mysql':
+            cursor.execute('SELECT GET_LOCK(%s, %s)', [BOOTSTRAP_LOCK_NAME, BOOTSTRAP_LOCK_TIMEOUT])
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError('No se pudo obtener el lock de bootstrap')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            if vendor == 'postgresql':
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [BOOTSTRAP_LOCK_ID])
+            elif vendor == 'mysql':
+                cursor.execute('SELECT RELEASE_LOCK(%s)', [BOOTSTRAP_LOCK_NAME])
+
+
+def pending_migrations():
+    """Unapplied migrations as (app_label, name) pairs, in apply order."""
+    executor = MigrationExecutor(connection)
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [(migration.app_label, migration.name) for migration, backwards in plan if not backwards]
+
+
+def seed_default_data():
+    """
+    Create the default groups, users and menu items that do not exist yet.
+
+    Returns:
+        dict: Number of groups, users and menu items created
+    """
+    from .catalog import invalidate_menu_catalog
+    from .models import MenuItem, ResourceVersion
+
+    with transaction.atomic():
+        role_names = list(DEFAULT_USERS)
+        existing_groups = set(Group.objects.filter(name__in=role_names).values_list('name', flat=True))
+        new_groups = [Group(name=name) for name in role_names if name not in existing_groups]
+        Group.objects.bulk_create(new_groups)
+        groups = {group.name: group for group in Group.objects.filter(name__in=role_names)}
+
+        usernames = [data['username'] for data in DEFAULT_USERS.values()]
+        existing_users = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # Hashear cada contraseña distinta una sola vez (el hasher es deliberadamente lento)
+        hashes = {}
+        new_users = {}
+        for role_name, data in DEFAULT_USERS.items():
+            if data['username'] in existing_users:
+                continue
+            if data['password'] not in hashes:
+                hashes[data['password']] = make_password(data['password'])
+            is_superuser = data.get('is_superuser', False)
+            new_users[data['username']] = (role_name, User(
+                username=data['username'],
+                password=hashes[data['password']],
+                is_superuser=is_superuser,
+                is_staff=is_superuser,
+            ))
+        if new_users:
+            User.objects.bulk_create([user for _, user in new_users.values()])
+            # MySQL no devuelve los ids de bulk_create: releerlos
+            user_ids = dict(User.objects.filter(username__in=list(new_users)).values_list('username', 'id'))
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=user_ids[username], group_id=groups[role_name].id)
+                for username, (role_name, _) in new_users.items()
+            ])
+
+        existing_items = set(MenuItem.objects.filter(
+            name__in=[data['name'] for data in DEFAULT_MENU_ITEMS]
+        ).values_list('name', flat=True))
+        new_items = [MenuItem(**data) for data in DEFAULT_MENU_ITEMS if data['name'] not in existing_items]
+        if new_items:
+            # bulk_create no dispara señales: invalidar el catálogo a mano
+            MenuItem.objects.bulk_create(new_items)
+            ResourceVersion.bump('menu')
+            invalidate_menu_catalog()
+
+    return {'groups': len(new_groups), 'users': len(new_users), 'menu_items': len(new_items)}
+
+
+def bootstrap(migrate=True, seed=True, stdout=None):
+    """
+    Apply pending migrations and seed default data under the advisory lock.
+
+    Returns:
+        dict: {'migrations': applied migration count, 'seeded': seed_default_data() result}
+    """
+    from django.core.management import call_command
+
+    global _migrations_applied
+    result = {'migrations': 0, 'seeded': None}
+    with bootstrap_lock():
+        if migrate:
+            # Revisar dentro del lock: otra instancia pudo migrar mientras esperábamos
+            pending = pending_migrations()
+            if pending:
+                call_command('migrate', interactive=False, verbosity=1, stdout=stdout)
+                result['migrations'] = len(pending)
+            _migrations_applied = True
+        if seed:
+            result['seeded'] = seed_default_data()
+    return result
+
+
+def readiness():
+    """
+    Check whether this instance can serve requests.
+
+    Returns:
+        tuple: (ready, checks) where checks maps 'database' and
+            'migrations' to 'ok' or a short error description
+    """
+    global _migrations_applied
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        checks['database'] = 'ok'
+    except Exception as e:
+        checks['database'] = f'error: {str(e)}'
+        checks['migrations'] = 'unknown'
+        return False, checks
+
+    if not _migrations_applied:
+        pending = pending_migrations()
+        if pending:
+            checks['migrations'] = f'{len(pending)} pendientes'
+            return False, checks
+        _migrations_applied = True
+    checks['migrations'] = 'ok'
+    return True, checks
@@ -0,0 +1,39 @@
+"""
+File downloads that stream under both WSGI and ASGI.
+
+Django serves a streaming response with a sync iterator under ASGI by
+reading it whole into memory first (sync_to_async(list)), and one with an
+async iterator under WSGI through async_to_sync on every chunk. Like
+api_events, these helpers choose the iterator from the request: under ASGI
+the file is read in blocks from a worker thread, one block at a time.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse
+
+
+async def aiter_file(filelike, block_size=FileResponse.block_size):
+    """Async generator of the blocks of a binary file; closes it at the end."""
+    # Solo lectura de archivo (sin ORM): no necesita el hilo de la request
+    read = sync_to_async(filelike.read, thread_sensitive=False)
+    try:
+        while True:
+            block = await read(block_size)
+            if not block:
+                break
+            yield block
+    finally:
+        filelike.close()
+
+
+def file_response(request, filelike, **kwargs):
+    """
+    FileResponse for `filelike` that streams in blocks under WSGI and ASGI.
+    Takes the same keyword arguments as FileResponse.
+    """
+    if not isinstance(request, ASGIRequest):
+        return FileResponse(filelike, **kwargs)
+    response = FileResponse(aiter_file(filelike), **kwargs)
+    # Con un iterador FileResponse no ve el archivo: Content-Length y Content-Disposition
+    response.set_headers(filelike)
+    return response
@@ -0,0 +1,306 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import Group, User
+from django.db import connection
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    ORDER_CHANGE_SETTLE_SECONDS, DailySalesRollup, HourlySalesRollup, MenuItem, Order, OrderChange, OrderItem, RoomBill,
+)
+from .rollups import rebuild_sales_rollups
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username, password='x')
+    user.groups.add(Group.objects.get_or_create(name=role)[0])
+    return user
+
+
+def logged_client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def reserve_revision():
+    """
+    Simulate a transaction still in flight: consume a revision without
+    making its row (or its order) visible. Returns the revision.
+    """
+    change = OrderChange.objects.create(order_id=0)
+    revision = change.revision
+    change.delete()
+    return revision
+
+
+def commit_reserved(revision, **order_fields):
+    """The in-flight transaction of reserve_revision() commits: its order and its revision appear."""
+    # bulk_create: sin señales, la única revisión del pedido es la reservada
+    order = Order.objects.bulk_create([Order(**order_fields)])[0]
+    OrderChange.objects.create(revision=revision, order_id=order.id)
+    return order
+
+
+class OrdersETagTests(TestCase):
+    """The 'orders' ETag follows the revision the kitchen feed returns."""
+
+    def setUp(self):
+        self.waiter = make_user('garzon', 'Garzón')
+        self.cook = logged_client(make_user('cocinero', 'Cocinero'))
+        self.url = reverse('restaurant:api_orders')
+
+    def test_etag_changes_when_in_flight_revision_commits(self):
+        Order.objects.create(client_identifier='Mesa 1', user=self.waiter)
+        since = OrderChange.snapshot_revision()
+        gap = reserve_revision()
+        later = Order.objects.create(client_identifier='Mesa 3', user=self.waiter)
+
+        response = self.cook.get(self.url, {'since': since})
+        self.assertEqual(response.json()['revision'], since)
+        self.assertEqual([o['id'] for o in response.json()['orders']], [later.id])
+        etag = response['ETag']
+
+        committed = commit_reserved(gap, client_identifier='Mesa 2', user=self.waiter)
+
+        response = self.cook.get(self.url, {'since': since}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['revision'], OrderChange.latest_revision())
+        self.assertIn(committed.id, [o['id'] for o in response.json()['orders']])
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class OrderChangeFeedTests(TestCase):
+    """Revisions held at in-flight gaps, pruning and resync of the kitchen feed."""
+
+    def setUp(self):
+        self.waiter = make_user('garzon', 'Garzón')
+        self.cook = logged_client(make_user('cocinero', 'Cocinero'))
+        self.url = reverse('restaurant:api_orders')
+        Order.objects.create(client_identifier='Mesa 1', user=self.waiter)
+        self.since = OrderChange.latest_revision()
+
+    def test_gap_is_held_then_released_on_commit(self):
+        gap = reserve_revision()
+        later = Order.objects.create(client_identifier='Mesa 3', user=self.waiter)
+
+        revision, order_ids, resync = OrderChange.changed_since(self.since)
+        self.assertEqual((revision, order_ids, resync), (self.since, {later.id}, False))
+
+        committed = commit_reserved(gap, client_identifier='Mesa 2', user=self.waiter)
+        revision, order_ids, resync = OrderChange.changed_since(self.since)
+        self.assertEqual((revision, order_ids, resync), (OrderChange.latest_revision(), {committed.id, later.id}, False))
+
+    def test_gap_is_released_after_settle_window(self):
+        reserve_revision()
+        Order.objects.create(client_identifier='Mesa 3', user=self.waiter)
+        self.assertEqual(OrderChange.changed_since(self.since)[0], self.since)
+
+        # Transacción revertida: pasado el plazo el hueco ya no retiene la revisión
+        settled = timezone.now() - timedelta(seconds=ORDER_CHANGE_SETTLE_SECONDS + 1)
+        OrderChange.objects.update(created_at=settled)
+        self.assertEqual(OrderChange.changed_since(self.since)[0], OrderChange.latest_revision())
+        self.assertEqual(OrderChange.snapshot_revision(), OrderChange.latest_revision())
+
+    def test_resync_after_pruning(self):
+        # Dos cambios: el primero se poda y se pierde para un cliente en self.since
+        Order.objects.create(client_identifier='Mesa 2', user=self.waiter)
+        Order.objects.create(client_identifier='Mesa 3', user=self.waiter)
+        latest = OrderChange.latest_revision()
+        OrderChange.objects.update(created_at=timezone.now() - timedelta(days=1))
+        OrderChange.prune()
+        self.assertEqual(list(OrderChange.objects.values_list('revision', flat=True)), [latest])
+
+        self.assertTrue(OrderChange.changed_since(self.since)[2])
+        response = self.cook.get(self.url, {'since': self.since})
+        self.assertEqual(response.json(), {'revision': self.since, 'orders': [], 'removed': [], 'resync': True})
+        # Al día: sin resync
+        self.assertNotIn('resync', self.cook.get(self.url, {'since': latest}).json())
+
+    def test_deleted_order_records_one_change(self):
+        order = Order.objects.create(client_identifier='Mesa 2', user=self.waiter)
+        menu_item = MenuItem.objects.create(name='Plato', description='', price=1000)
+        OrderItem.objects.bulk_create([OrderItem(order=order, menu_item=menu_item, quantity=1) for _ in range(5)])
+        before = OrderChange.latest_revision()
+        order_id = order.id
+
+        order.delete()
+        self.assertEqual(OrderChange.latest_revision(), before + 1)
+        self.assertEqual(OrderChange.changed_since(before)[1], {order_id})
+
+    def test_resync_for_unknown_revision(self):
+        response = self.cook.get(self.url, {'since': OrderChange.latest_revision() + 100})
+        self.assertTrue(response.json()['resync'])
+
+    def test_snapshot_revision_matches_header(self):
+        response = self.cook.get(self.url)
+        self.assertEqual(int(response['X-Orders-Revision']), OrderChange.latest_revision())
+
+        gap = reserve_revision()
+        Order.objects.create(client_identifier='Mesa 3', user=self.waiter)
+        response = self.cook.get(self.url)
+        self.assertEqual(int(response['X-Orders-Revision']), OrderChange.snapshot_revision())
+        self.assertEqual(int(response['X-Orders-Revision']), gap - 1)
+        self.assertEqual(response['ETag'], f'"orders{gap - 1}"')
+
+        # El delta desde la revisión del snapshot trae el pedido de la revisión pendiente
+        committed = commit_reserved(gap, client_identifier='Mesa 2', user=self.waiter)
+        delta = self.cook.get(self.url, {'since': response['X-Orders-Revision']}).json()
+        self.assertIn(committed.id, [o['id'] for o in delta['orders']])
+
+
+def rollup_rows():
+    """Contents of both rollup tables, without ids and empty rows."""
+    hourly = HourlySalesRollup.objects.exclude(order_count=0).values_list(
+        'date', 'hour', 'status', 'payment_method', 'waiter_id', 'order_count', 'total_amount', 'tip_amount'
+    )
+    daily = DailySalesRollup.objects.exclude(quantity=0).values_list(
+        'date', 'status', 'waiter_id', 'category', 'menu_item_id', 'quantity', 'sales'
+    )
+    return sorted(hourly), sorted(daily)
+
+
+class SalesRollupTests(TestCase):
+    """Rollups kept by the signals: exact contributions and constant queries."""
+
+    def setUp(self):
+        self.waiter = make_user('garzon', 'Garzón')
+        self.receptionist = logged_client(make_user('recepcion', 'Recepcionista'))
+        self.menu = [
+            MenuItem.objects.create(name=f'Plato {i}', description='', price=Decimal('1000') + i, category=f'Cat {i % 3}')
+            for i in range(25)
+        ]
+
+    def make_order(self, lines, status='served'):
+        order = Order.objects.create(client_identifier='Mesa 1', user=self.waiter, status=status)
+        OrderItem.objects.bulk_create([OrderItem(order=order, menu_item=item, quantity=2) for item in self.menu[:lines]])
+        return order
+
+    def pay(self, order):
+        url = reverse('restaurant:api_order_status', args=[order.pk])
+        return self.receptionist.put(url, json.dumps({'status': 'paid', 'payment_method': 'cash', 'tip_amount': 500}),
+                                     content_type='application/json')
+
+    def assertMatchesRebuild(self):
+        incremental = rollup_rows()
+        rebuild_sales_rollups()
+        self.assertEqual(incremental, rollup_rows())
+
+    def test_paid_transition_queries_do_not_grow_with_items(self):
+        # La primera request también lee los roles del usuario
+        self.pay(self.make_order(1))
+        counts = []
+        for lines in (1, 5, 25):
+            order = self.make_order(lines)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.pay(order).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+        self.assertEqual(DailySalesRollup.objects.get(menu_item=self.menu[0]).quantity, 8)
+        self.assertMatchesRebuild()
+
+    def test_price_change_does_not_drift(self):
+        order = self.make_order(3)
+        self.pay(order)
+        MenuItem.objects.filter(pk=self.menu[0].pk).update(price=Decimal('9999'))
+
+        order.status = 'served'
+        order.save(update_fields=['status'])
+        self.assertEqual(rollup_rows(), ([], []))
+
+    def test_items_edited_before_save(self):
+        order = self.make_order(2)
+        self.pay(order)
+        # Como api_waiter_order_detail: se editan los items y después se guarda el pedido
+        OrderItem.objects.filter(order=order, menu_item=self.menu[0]).update(quantity=5)
+        OrderItem.objects.create(order=order, menu_item=self.menu[2], quantity=1)
+        order.refresh_from_db()
+        order.total_amount += 1
+        order.save(update_fields=['total_amount'])
+        self.assertEqual(DailySalesRollup.objects.get(menu_item=self.menu[0]).quantity, 5)
+        self.assertMatchesRebuild()
+
+    def test_deleted_order_leaves_rollups(self):
+        kept = self.make_order(2)
+        self.pay(kept)
+        deleted = self.make_order(3)
+        self.pay(deleted)
+        deleted.delete()
+        self.assertEqual(HourlySalesRollup.objects.get(order_count__gt=0).order_count, 1)
+        self.assertMatchesRebuild()
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Write views within their @query_budget under strict mode (an excess raises
+    QueryBudgetExceeded), with orders of a full table and a cold cache.
+    TransactionTestCase: each request opens its own transactions, as in production.
+    """
+    LINES = 30
+
+    def setUp(self):
+        cache.clear()
+        self.waiter_user = make_user('garzon', 'Garzón')
+        self.waiter = logged_client(self.waiter_user)
+        self.cook = logged_client(make_user('cocinero', 'Cocinero'))
+        self.receptionist = logged_client(make_user('recepcion', 'Recepcionista'))
+        self.admin = logged_client(make_user('admin', 'Administrador'))
+        self.menu = [
+            MenuItem.objects.create(name=f'Plato {i}', description='', price=Decimal('1000') + i, category=f'Cat {i % 4}')
+            for i in range(self.LINES)
+        ]
+
+    def make_order(self, status='served', room='101', user=None):
+        order = Order.objects.create(client_identifier='Mesa 1', room_number=room, user=user or self.waiter_user, status=status)
+        OrderItem.objects.bulk_create([OrderItem(order=order, menu_item=item, quantity=2) for item in self.menu])
+        return order
+
+    def send(self, client, method, url, data=None):
+        response = getattr(client, method)(url, json.dumps(data) if data is not None else None, content_type='application/json')
+        self.assertLess(response.status_code, 400, response.content)
+        return response
+
+    def test_save_order(self):
+        self.send(self.waiter, 'post', reverse('restaurant:save_order'), {
+            'items': [{'id': item.id, 'quantity': 1, 'note': ''} for item in self.menu],
+            'client_identifier': 'Mesa 4',
+            'room_number': '101',
+            'tip_amount': '0.00',
+        })
+        self.assertEqual(OrderItem.objects.count(), self.LINES)
+
+    def test_order_status(self):
+        order = self.make_order('pending')
+        url = reverse('restaurant:api_order_status', args=[order.pk])
+        for status in ('preparing', 'ready', 'served'):
+            self.send(self.cook, 'put', url, {'status': status})
+        self.send(self.receptionist, 'put', url, {'status': 'paid', 'payment_method': 'cash', 'tip_amount': 500})
+        self.send(self.receptionist, 'put', url, {'status': 'served'})
+        self.send(self.receptionist, 'put', url, {'status': 'charged_to_room', 'tip_amount': 0})
+
+    def test_process_payment(self):
+        order = self.make_order()
+        url = reverse('restaurant:api_process_payment', args=[order.pk])
+        self.send(self.receptionist, 'put', url, {'payment_method': 'card', 'tip_amount': '500'})
+        self.send(self.receptionist, 'put', url, {'payment_method': 'cash', 'tip_amount': '100'})
+        self.assertEqual(DailySalesRollup.objects.get(menu_item=self.menu[0]).quantity, 2)
+
+    def test_create_roombill(self):
+        order_ids = [self.make_order(room='202').id for _ in range(5)]
+        self.send(self.receptionist, 'post', reverse('restaurant:api_create_roombill'), {
+            'room_number': '202', 'guest_name': 'Huésped', 'order_ids': order_ids, 'tip_amount': '0.00',
+        })
+        self.assertEqual(RoomBill.objects.get().orders.count(), 5)
+
+    def test_update_and_delete_user(self):
+        user = make_user('nuevo', 'Garzón')
+        url = reverse('restaurant:api_user_detail', args=[user.pk])
+        self.send(self.admin, 'put', url, {'group_id': Group.objects.get(name='Cocinero').id})
+        self.send(self.admin, 'delete', url)
+        self.assertFalse(User.objects.filter(pk=user.pk).exists())
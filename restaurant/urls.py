@@ -14,6 +14,8 @@ urlpatterns = [
     path('cook-dashboard/', views.cook_dashboard, name='cook_dashboard'),
     path('waiter-dashboard/', views.waiter_dashboard, name='waiter_dashboard'),
     path('menu/', restaurant_views.public_menu_view, name='public_menu'),
+    path('menu.json', views.public_menu_json, name='public_menu_json'),
+    path('ready/', views.readiness, name='readiness'),
     path('logout/', views.logout_view, name='logout'),
     path('save_order/', views.save_order, name='save_order'),
     path('update_order_status/<int:order_id>/', views.update_order_status, name='update_order_status'),
@@ -21,6 +23,9 @@ urlpatterns = [
     path('api/users/<int:pk>/', views.api_users, name='api_user_detail'),
     # --- API URLs for Admin Dashboard ---
     path('api/orders/', views.api_orders, name='api_orders'),
+    path('api/events/', views.api_events, name='api_events'),
+    path('api/events/log/', views.api_event_log, name='api_event_log'),
+    path('api/orders/search/', views.api_orders_search, name='api_orders_search'),
     path('api/orders/<int:pk>/', views.api_order_detail, name='api_order_detail'),
     path('api/kitchen-orders/', views.api_kitchen_orders, name='api_kitchen_orders'),
     path('api/orders/<int:pk>/status/', views.api_order_status, name='api_order_status'),
@@ -51,4 +56,9 @@ urlpatterns = [
     path('api/roombills/<int:bill_id>/', views.api_roombill_detail, name='api_roombill_detail'),
     
     path('export/roombills-excel/', views.export_roombills_excel, name='export_roombills_excel'),
+
+    # Exportaciones en segundo plano
+    path('api/exports/', views.api_export_jobs, name='api_export_jobs'),
+    path('api/exports/<int:pk>/', views.api_export_job_detail, name='api_export_job_detail'),
+    path('api/exports/<int:pk>/download/', views.api_export_job_download, name='api_export_job_download'),
 ]
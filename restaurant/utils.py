@@ -1,21 +1,28 @@
 """
 Utility functions for the restaurant app.
 """
+import unicodedata
+from datetime import datetime, time, timedelta
+
 from django.conf import settings
+from django.utils import timezone
 
 
-def get_cloudinary_url(public_id):
+def get_cloudinary_url(public_id, transformation=None):
     """
     Get the full Cloudinary URL for a given public ID.
     Uses dynamic configuration from settings.
     
     Args:
         public_id (str): The Cloudinary public ID
+        transformation (str): Optional delivery transformation, e.g. 'w_160,q_auto,f_auto'
         
     Returns:
         str: The full Cloudinary URL
     """
     cloud_name = getattr(settings, 'CLOUDINARY_STORAGE', {}).get('CLOUD_NAME', 'dvjcrc3ei')
+    if transformation:
+        return f'https://res.cloudinary.com/{cloud_name}/image/upload/{transformation}/{public_id}'
     return f'https://res.cloudinary.com/{cloud_name}/image/upload/{public_id}'
 
 
@@ -27,3 +34,68 @@ def get_cloudinary_cloud_name():
         str: The Cloudinary cloud name
     """
     return getattr(settings, 'CLOUDINARY_STORAGE', {}).get('CLOUD_NAME', 'dvjcrc3ei')
+
+
+def format_order_identifier(room_number, client_identifier):
+    """
+    Order identifier from its room number and client name.
+    If both exist, shows: "Habitación X - Cliente Y"
+    """
+    if room_number and client_identifier:
+        return f"Habitación {room_number} - {client_identifier}"
+    elif room_number:
+        return f"Habitación {room_number}"
+    else:
+        return client_identifier
+
+
+def local_day_start(day):
+    """Aware datetime for 00:00 of `day` in the current timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_day_range(day):
+    """
+    Half-open [start, end) datetime range covering a local calendar day.
+
+    Filtering with created_at__gte/__lt on these bounds keeps the column bare,
+    so the database can use an index on it (created_at__date=day cannot).
+    """
+    return local_day_start(day), local_day_start(day + timedelta(days=1))
+
+
+def filter_local_dates(queryset, date_from='', date_to='', field='created_at'):
+    """
+    Filter a queryset by 'YYYY-MM-DD' local dates (both inclusive) using a
+    half-open datetime range on `field`. Invalid dates are ignored.
+    """
+    if date_from:
+        try:
+            day = datetime.strptime(date_from, '%Y-%m-%d').date()
+            queryset = queryset.filter(**{f'{field}__gte': local_day_start(day)})
+        except ValueError:
+            pass
+    if date_to:
+        try:
+            day = datetime.strptime(date_to, '%Y-%m-%d').date()
+            queryset = queryset.filter(**{f'{field}__lt': local_day_start(day + timedelta(days=1))})
+        except ValueError:
+            pass
+    return queryset
+
+
+def normalize_search_text(value):
+    """
+    Lowercase, accent-folded, whitespace-collapsed text for searching.
+    'Habitación  12 - José' -> 'habitacion 12 - jose'
+    """
+    if not value:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    folded = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(folded.lower().split())
+
+
+def order_search_text(room_number, client_identifier):
+    """Value of Order.search_text for the given room number and client."""
+    return normalize_search_text(f"{room_number or ''} {client_identifier or ''}")[:255]
@@ -1,8 +1,8 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout, login, authenticate
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Sum, Count, F, Q, Prefetch, ExpressionWrapper, fields
@@ -10,14 +10,23 @@ from django.core.exceptions import ValidationError
 from django.db import IntegrityError, transaction
 from django.contrib.auth.models import User
 from django.conf import settings
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
 from .forms import CustomUserCreationForm, CustomAuthenticationForm
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Order, OrderItem, MenuItem, Group, RegistrationPin, Category, RoomBill
+from .catalog import aget_menu_catalog, get_menu_catalog, serialize_menu_item
+from .image_urls import responsive_images, thumbnail_fields
+from .decorators import etag_versioned, query_budget, require_role
+from .page_cache import cached_page_response, get_cached_page
+from .roles import get_primary_role, has_role
+from .services import create_order_with_items, find_duplicate_order, order_idempotency_keys
+from .models import Order, OrderItem, OrderChange, MenuItem, Group, RegistrationPin, Category, RoomBill, HourlySalesRollup, DailySalesRollup, RealtimeEvent
+from .utils import filter_local_dates, format_order_identifier, local_day_range
+from asgiref.sync import sync_to_async
 import json
 import decimal
+import os
+
+# Estados que la cocina debe ver en su tablero
+KITCHEN_STATUSES = ['pending', 'preparing']
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -27,6 +36,26 @@ class DecimalEncoder(json.JSONEncoder):
             return float(obj)
         return super().default(obj)
 
+# Columnas y formato de las filas de api_orders_report (se leen con .values())
+ORDER_REPORT_FIELDS = ('id', 'room_number', 'client_identifier', 'status', 'payment_method', 'created_at', 'total_amount')
+ORDER_STATUS_DISPLAY = dict(Order.STATUS_CHOICES)
+ORDER_PAYMENT_METHOD_DISPLAY = dict(Order.PAYMENT_METHOD_CHOICES)
+
+
+def serialize_order_report_row(row):
+    """Serialize an ORDER_REPORT_FIELDS values() row for the order reports."""
+    return {
+        'id': row['id'],
+        'identifier': format_order_identifier(row['room_number'], row['client_identifier']),
+        'status': row['status'],
+        'status_display': ORDER_STATUS_DISPLAY.get(row['status'], row['status']),
+        'status_class': Order.STATUS_CLASSES.get(row['status'], 'bg-gray-100 text-gray-800'),
+        'payment_method': row['payment_method'],
+        'payment_method_display': ORDER_PAYMENT_METHOD_DISPLAY.get(row['payment_method'], row['payment_method']),
+        'created_at': row['created_at'].isoformat(),
+        'total': float(row['total_amount'] or 0),
+    }
+
 def get_order_identifier(order):
     """
     Returns the order identifier combining room number and client name if available.
@@ -34,22 +63,35 @@ def get_order_identifier(order):
     If only client_identifier exists, shows that.
     If both exist, shows: "Habitación X - Cliente Y"
     """
-    if order.room_number and order.client_identifier:
-        return f"Habitación {order.room_number} - {order.client_identifier}"
-    elif order.room_number:
-        return f"Habitación {order.room_number}"
-    else:
-        return order.client_identifier
+    return format_order_identifier(order.room_number, order.client_identifier)
+
+def serialize_kitchen_order(order):
+    """
+    Serializa un pedido con sus items para el tablero de cocina.
+    Espera que orderitem_set__menu_item venga precargado.
+    """
+    return {
+        'id': order.id,
+        'identifier': get_order_identifier(order),
+        'status': order.status,
+        'created_at': order.created_at.isoformat(),
+        'items': [{
+            'name': item.menu_item.name,
+            'quantity': item.quantity,
+            'note': item.note or '',
+            'is_prepared': item.is_prepared,
+        } for item in order.orderitem_set.all()]
+    }
 
 def home(request):
     if request.user.is_authenticated:
-        if request.user.is_superuser or request.user.groups.filter(name='Administrador').exists():
+        if has_role(request.user, 'Administrador', allow_superuser=True):
             return redirect('restaurant:admin_dashboard')
-        elif request.user.groups.filter(name='Recepcionista').exists():
+        elif has_role(request.user, 'Recepcionista'):
             return redirect('restaurant:receptionist_dashboard')
-        elif request.user.groups.filter(name='Cocinero').exists():
+        elif has_role(request.user, 'Cocinero'):
             return redirect('restaurant:cook_dashboard')
-        elif request.user.groups.filter(name='Garzón').exists():
+        elif has_role(request.user, 'Garzón'):
             return redirect('restaurant:waiter_dashboard')
         else:
             # No role assigned, render home
@@ -91,7 +133,7 @@ def login_view(request):
     return render(request, 'registration/login.html', {'form': form})
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
 def admin_dashboard(request):
     # ... (el resto de la vista se mantiene igual)
     import json
@@ -100,12 +142,13 @@ def admin_dashboard(request):
     # --- Optimización de Consultas ---
     # 1. Usar aggregate para obtener todos los contadores en una sola consulta
     today = timezone.localtime().date()
-    stats = Order.objects.aggregate(
-        total_today=Count('id', filter=Q(created_at__date=today)),
-        preparing=Count('id', filter=Q(status='preparing', created_at__date=today)),
-        ready=Count('id', filter=Q(status='ready', created_at__date=today)),
-        completed=Count('id', filter=Q(status__in=['served', 'paid'], created_at__date=today)),
-        total_sales_today=Sum('total_amount', filter=Q(status='paid', created_at__date=today))
+    day_start, day_end = local_day_range(today)
+    stats = Order.objects.filter(created_at__gte=day_start, created_at__lt=day_end).aggregate(
+        total_today=Count('id'),
+        preparing=Count('id', filter=Q(status='preparing')),
+        ready=Count('id', filter=Q(status='ready')),
+        completed=Count('id', filter=Q(status__in=['served', 'paid'])),
+        total_sales_today=Sum('total_amount', filter=Q(status='paid'))
     )
 
     # 2. Usar annotate para calcular el total de cada pedido en la DB (evita N+1)
@@ -117,9 +160,9 @@ def admin_dashboard(request):
     # El resto de los objetos se cargan para el renderizado inicial o como fallback.
     # Optimización: select_related para evitar queries adicionales
     orders = Order.objects.select_related('user').all()
-    menu_items = MenuItem.objects.all()
+    catalog = get_menu_catalog()
     groups = Group.objects.all()  # Obtener todos los grupos/roles
-    user_role = request.user.groups.first().name if request.user.groups.exists() else None
+    user_role = get_primary_role(request.user)
 
     # JSON data for JavaScript
     orders_json = json.dumps([{
@@ -130,18 +173,9 @@ def admin_dashboard(request):
         'created_at': o.created_at.isoformat(),
         'total': float(o.total_amount), # Usar el nuevo campo total_amount
     } for o in orders], cls=DecimalEncoder)
-    menu_items_json = json.dumps([{
-        'id': m.id,
-        'name': m.name,
-        'description': m.description,
-        'price': float(m.price),
-        'category': m.category,
-        'available': m.available,
-        'image_url': m.image_url
-    } for m in menu_items], cls=DecimalEncoder)
     return render(request, 'restaurant/admin_dashboard.html', {
         'orders': orders,
-        'menu_items': menu_items,
+        'menu_items': catalog.items,
         'groups': groups,  # Pasar los grupos a la plantilla
         'total_orders_today': stats.get('total_today', 0),
         'preparing_count': stats.get('preparing', 0),
@@ -151,11 +185,11 @@ def admin_dashboard(request):
         'recent_orders': recent_orders,
         'user_role': user_role,
         'orders_json': orders_json,
-        'menu_items_json': menu_items_json,
+        'menu_items_json': catalog.items_json,
     })
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 def receptionist_dashboard(request):
     from django.utils import timezone
     from django.db.models import Sum, F, Q
@@ -172,13 +206,14 @@ def receptionist_dashboard(request):
 
 
 
-    today = timezone.now().date()
+    day_start, day_end = local_day_range(timezone.localdate())
     total_sales_today = Order.objects.filter(
         status='paid',
-        created_at__date=today
+        created_at__gte=day_start,
+        created_at__lt=day_end
     ).aggregate(total=Sum('total_amount'))['total'] or 0 # Usar el nuevo campo total_amount
 
-    user_role = request.user.groups.first().name if request.user.groups.exists() else None
+    user_role = get_primary_role(request.user)
 
     return render(request, 'restaurant/receptionist_dashboard.html', {
         'user_role': user_role,
@@ -188,12 +223,15 @@ def receptionist_dashboard(request):
     })
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Cocinero').exists())
+@require_role('Cocinero')
 def cook_dashboard(request):
     import json
     from django.utils import timezone
 
     try:
+        # Antes de leer los pedidos: el dashboard pide los eventos posteriores a esta secuencia
+        last_event_seq = RealtimeEvent.latest_seq()
+
         # Consulta optimizada para obtener pedidos y sus items
         # Ahora que total_amount se almacena directamente, no necesitamos annotate aquí.
         orders = Order.objects.filter(
@@ -227,6 +265,7 @@ def cook_dashboard(request):
         return render(request, 'restaurant/cook_dashboard.html', {
             'orders': orders,
             'orders_json': json.dumps(orders_data, cls=DecimalEncoder),
+            'last_event_seq': last_event_seq,
             'PUSHER_KEY': settings.PUSHER_KEY,
             'PUSHER_CLUSTER': settings.PUSHER_CLUSTER,
         })
@@ -237,7 +276,7 @@ def cook_dashboard(request):
         raise
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Garzón').exists())
+@require_role('Garzón')
 def waiter_dashboard(request):
     import json
     from django.utils import timezone
@@ -245,19 +284,9 @@ def waiter_dashboard(request):
 
     try:
         # --- Datos para la toma de pedidos ---
-        menu_items = MenuItem.objects.filter(available=True)
-        # Obtenemos todas las categorías, las normalizamos en Python y eliminamos duplicados.
-        # Esto asegura que 'Pizzas' y 'pizzas' se traten como una sola categoría en los filtros.
-        all_categories = menu_items.values_list('category', flat=True)
-        normalized_categories = {cat.capitalize() for cat in all_categories}
-        categories = sorted(list(normalized_categories))
-        menu_items_json = json.dumps([{
-            'id': item.id, 
-            'name': item.name, 
-            'price': float(item.price),
-            'image_url': item.image_url,
-            'description': item.description
-        } for item in menu_items], cls=DecimalEncoder)
+        # Items disponibles, categorías normalizadas ('Pizzas' y 'pizzas' son una sola)
+        # y JSON ya serializado, desde el catálogo en caché (ver catalog.py)
+        catalog = get_menu_catalog()
 
         # --- Datos para el monitor de pedidos (carga inicial) ---
         # Usar only() para evitar campos que pueden no existir en la BD (como is_prepared)
@@ -290,12 +319,12 @@ def waiter_dashboard(request):
 
         initial_orders_json = json.dumps(initial_orders_data, cls=DecimalEncoder)
 
-        user_role = request.user.groups.first().name if request.user.groups.exists() else None
+        user_role = get_primary_role(request.user)
 
         return render(request, 'restaurant/waiter_dashboard.html', {
-            'menu_items': menu_items,
-            'categories': categories,
-            'menu_items_json': menu_items_json,
+            'menu_items': catalog.waiter_items,
+            'categories': catalog.waiter_categories,
+            'menu_items_json': catalog.waiter_items_json,
             'initial_orders_json': initial_orders_json,
             'user_role': user_role,
             'pusher_key': settings.PUSHER_KEY,
@@ -307,40 +336,125 @@ def waiter_dashboard(request):
         print(traceback.format_exc())
         raise
 
-def public_menu_view(request):
+async def public_menu_view(request):
     """
     Vista pública para mostrar el menú del restaurante, ideal para un código QR.
     No requiere autenticación.
+
+    La página se renderiza una vez por versión del catálogo y se sirve desde
+    memoria, precomprimida y con ETag (ver page_cache.py). Solo el render
+    (una vez por versión) sale del event loop.
     """
-    # Obtener TODOS los items (disponibles e indisponibles) y ordenarlos por categoría
-    menu_url = request.build_absolute_uri()
-    menu_items = MenuItem.objects.all().order_by('category', 'name')
-
-    # Agrupar items por categoría en un diccionario
-    grouped_menu = {}
-    for item in menu_items:
-        category = item.category
-        if not category: # Agrupar items sin categoría en 'Otros'
-            category = 'Otros'
-        if category not in grouped_menu:
-            grouped_menu[category] = []
-        grouped_menu[category].append(item)
-
-    return render(request, 'restaurant/public_menu.html', {
-        'grouped_menu': grouped_menu,
-        # Puedes añadir más contexto si lo necesitas, como el nombre del restaurante
-        'restaurant_name': 'Restaurante AbbaHotel',
-        'menu_url': menu_url
-    })
+    from django.template.loader import render_to_string
+    from django.utils import timezone
+
+    # TODOS los items (disponibles e indisponibles) agrupados por categoría,
+    # desde el catálogo en caché (items sin categoría van en 'Otros').
+    # La URL del QR usa el host canónico (SITE_URL), no el header Host: la página
+    # cacheada es la misma para cualquier host y un Host arbitrario no crea otra entrada
+    menu_url = f"{settings.SITE_URL.rstrip('/')}{request.path}"
+    catalog = await aget_menu_catalog()
+    # El pie de página muestra el año actual: forma parte de la clave
+    year = timezone.localdate().year
+
+    def render_page():
+        return render_to_string('restaurant/public_menu.html', {
+            'grouped_menu': catalog.grouped_menu,
+            # Puedes añadir más contexto si lo necesitas, como el nombre del restaurante
+            'restaurant_name': 'Restaurante AbbaHotel',
+            'menu_url': menu_url
+        }), 'text/html; charset=utf-8'
+
+    key = ('html', year)
+    page = catalog.pages.get(key) or await sync_to_async(get_cached_page)(catalog.pages, key, render_page)
+    return cached_page_response(request, page)
+
+
+def public_menu_json(request):
+    """
+    Variante JSON del menú público, agrupada por categoría como la página.
+    No requiere autenticación.
+    """
+    catalog = get_menu_catalog()
+
+    def render_json():
+        return json.dumps({
+            'restaurant_name': 'Restaurante AbbaHotel',
+            'version': catalog.version,
+            'categories': [
+                {'name': category, 'items': [serialize_menu_item(item) for item in items]}
+                for category, items in catalog.grouped_menu.items()
+            ],
+        }), 'application/json'
+
+    page = get_cached_page(catalog.pages, ('json',), render_json)
+    return cached_page_response(request, page)
+
+def readiness(request):
+    """
+    Readiness check para el balanceador: 200 si la base responde y no hay
+    migraciones pendientes, 503 si no. No requiere autenticación.
+    Incluye las métricas del pool de conexiones de este proceso (db_pool.py).
+    """
+    from .db_pool import pool_stats
+    from .startup import readiness as check_readiness
+
+    ready, checks = check_readiness()
+    response = JsonResponse({
+        'status': 'ready' if ready else 'not_ready',
+        'checks': checks,
+        'database_pool': pool_stats(),
+    }, status=200 if ready else 503)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def metrics_view(request):
+    """
+    Métricas Prometheus de todos los workers (formato texto), ver metrics.py.
+    Con METRICS_TOKEN definido exige "Authorization: Bearer <token>". Sin token
+    son públicas solo con DEBUG; en producción solo las ve un usuario staff.
+    """
+    from django.utils.crypto import constant_time_compare
+    from .metrics import render_metrics
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    elif not settings.DEBUG and not request.user.is_staff:
+        return HttpResponse('Forbidden: define METRICS_TOKEN para el scraper', status=403, content_type='text/plain')
+    body, content_type = render_metrics()
+    response = HttpResponse(body, content_type=content_type)
+    response['Cache-Control'] = 'no-store'
+    return response
 
 # Helper function to calculate subtotal for an order instance
 def calculate_order_subtotal(order_instance):
     return order_instance.orderitem_set.aggregate(
         subtotal=Sum(F('menu_item__price') * F('quantity'), output_field=fields.DecimalField())
     )['subtotal'] or decimal.Decimal('0.00')
+def duplicate_order_response(dup_order):
+    """Respuesta de save_order cuando la orden ya fue creada por un envío anterior."""
+    print(f"⚠️ Orden duplicada detectada. Retornando orden existente: {dup_order.id}")
+    return JsonResponse({
+        'success': True,
+        'order_id': dup_order.id,
+        'message': 'Order already exists',
+        'is_duplicate': True,
+        'order': {
+            'id': dup_order.id,
+            'status': dup_order.status,
+            'client_identifier': dup_order.client_identifier,
+            'room_number': dup_order.room_number,
+            'total_amount': float(dup_order.total_amount),
+            'created_at': dup_order.created_at.isoformat(),
+        }
+    }, status=200)
+
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Garzón').exists())
+@require_role('Garzón')
+@query_budget(queries=20, duplicates=2)  # máx. medido: 16
 def save_order(request):
     if request.method == 'POST':
         try:
@@ -362,118 +476,51 @@ def save_order(request):
             if not items:
                 return JsonResponse({'success': False, 'error': 'Order must have at least one item'}, status=400)
 
-            # Protección contra doble envío: generar un hash basado en los items
-            # para detectar si es un duplicado
-            import hashlib
-            items_hash = hashlib.md5(
-                json.dumps(items, sort_keys=True).encode()
-            ).hexdigest()
-            
-            # Verificar si existe una orden reciente con los mismos items
-            # (creada en los últimos 5 segundos por el mismo usuario)
-            from django.utils import timezone
-            recent_time = timezone.now() - timezone.timedelta(seconds=5)
-            
-            # Buscar órdenes duplicadas recientes
-            duplicate_orders = Order.objects.filter(
-                user=request.user,
-                created_at__gte=recent_time,
-                client_identifier=data.get('client_identifier', 'Sin identificar'),
-                room_number=data.get('room_number', '')
-            )
-            
-            if duplicate_orders.exists():
-                # Verificar si los items coinciden exactamente
-                for dup_order in duplicate_orders:
-                    dup_items = dup_order.orderitem_set.all()
-                    if len(items) == dup_items.count():
-                        # Verificar que los items coincidan
-                        all_match = True
-                        for item_data in items:
-                            matching_item = dup_items.filter(
-                                menu_item_id=item_data['id'],
-                                quantity=int(item_data.get('quantity', 1))
-                            ).exists()
-                            if not matching_item:
-                                all_match = False
-                                break
-                        
-                        if all_match:
-                            print(f"⚠️ Orden duplicada detectada. Retornando orden existente: {dup_order.id}")
-                            # Retornar la orden existente para evitar duplicado
-                            return JsonResponse({
-                                'success': True,
-                                'order_id': dup_order.id,
-                                'message': 'Order already exists',
-                                'is_duplicate': True,
-                                'order': {
-                                    'id': dup_order.id,
-                                    'status': dup_order.status,
-                                    'client_identifier': dup_order.client_identifier,
-                                    'room_number': dup_order.room_number,
-                                    'total_amount': float(dup_order.total_amount),
-                                    'created_at': dup_order.created_at.isoformat(),
-                                }
-                            }, status=200)
-
-            order = None
-            # Usar una transacción atómica para asegurar la integridad de los datos.
-            # O todo se crea, o nada se crea si hay un error.
-            with transaction.atomic():
-                subtotal = decimal.Decimal('0.00')
-                
-                # Pre-calculate subtotal before creating the order
-                for item in items:
-                    try:
-                        menu_item = MenuItem.objects.get(id=item['id'])
-                        subtotal += menu_item.price * int(item.get('quantity', 1))
-                    except MenuItem.DoesNotExist as e:
-                        print(f"❌ MenuItem not found: {item['id']}")
-                        raise ValueError(f"MenuItem with id {item['id']} not found")
-                    except KeyError as e:
-                        print(f"❌ Missing key in item: {str(e)}")
-                        raise ValueError(f"Missing required field in item: {str(e)}")
-                
-                # Create order with final total amount in one go
-                try:
-                    order = Order.objects.create(
-                        client_identifier=data.get('client_identifier', 'Sin identificar'),
-                        room_number=data.get('room_number', ''),
-                        user=request.user, 
-                        status='pending',
-                        tip_amount=tip_amount,
-                        total_amount=subtotal + tip_amount  # Set total_amount on creation
-                    )
-                    print(f"✅ Order created: {order.id}")
-                except Exception as e:
-                    print(f"❌ Error creating order: {str(e)}")
+            client_identifier = data.get('client_identifier', 'Sin identificar')
+            room_number = data.get('room_number', '')
+
+            # Protección contra doble envío: clave de idempotencia enviada por el cliente
+            # (header Idempotency-Key) o derivada de los items. Un reintento retorna
+            # la orden original con una sola consulta indexada.
+            try:
+                idempotency_key, lookup_keys = order_idempotency_keys(
+                    request.user, items, client_identifier, room_number,
+                    header_key=request.headers.get('Idempotency-Key'),
+                )
+            except (KeyError, TypeError, ValueError):
+                return JsonResponse({'success': False, 'error': 'Validation error: invalid items'}, status=400)
+
+            dup_order = find_duplicate_order(lookup_keys)
+            if dup_order:
+                return duplicate_order_response(dup_order)
+
+            # Resolver items, validar y crear el pedido con sus items en un número fijo de consultas
+            try:
+                order, order_items = create_order_with_items(
+                    user=request.user,
+                    items=items,
+                    client_identifier=client_identifier,
+                    room_number=room_number,
+                    tip_amount=tip_amount,
+                    idempotency_key=idempotency_key,
+                )
+            except IntegrityError:
+                # Un reintento concurrente creó la orden primero
+                dup_order = find_duplicate_order([idempotency_key])
+                if not dup_order:
                     raise
+                return duplicate_order_response(dup_order)
+            print(f"✅ Order created: {order.id}")
 
-                # Create order items
-                for item in items:
-                    try:
-                        menu_item = MenuItem.objects.get(id=item['id'])
-                        OrderItem.objects.create(
-                            order=order,
-                            menu_item=menu_item,
-                            quantity=int(item.get('quantity', 1)),
-                            note=str(item.get('note', ''))
-                        )
-                    except Exception as e:
-                        print(f"❌ Error creating order item: {str(e)}")
-                        raise
-            
             if order:
-                # Optimización: prefetch_related para cargar los items y sus menu_items de una vez
-                order = Order.objects.prefetch_related('orderitem_set__menu_item').get(pk=order.id)
-                items_list = order.orderitem_set.all()
+                # La respuesta se arma con los objetos en memoria, sin volver a consultar la BD
                 items_data = [{
                     'id': item.menu_item.id,
                     'name': item.menu_item.name,
                     'price': float(item.menu_item.price),
                     'quantity': item.quantity,
                     'note': item.note,
-                } for item in items_list]
+                } for item in order_items]
                 
                 # Mapeo de estados para mostrar en UI
                 status_display_map = {
@@ -536,7 +583,8 @@ def save_order(request):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Garzón').exists())
+@require_role('Garzón')
+@etag_versioned('orders', 'menu')
 def api_waiter_order_detail(request, pk):
     """
     API endpoint for waiters to get and update a specific order.
@@ -637,9 +685,9 @@ def api_waiter_order_detail(request, pk):
             return JsonResponse({'success': True, 'order_id': order.id})
 
 @csrf_exempt
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Cocinero').exists())
+@require_role('Cocinero')
 def update_order_status(request, order_id):
     if request.method == 'POST':
         status = request.POST.get('status')
@@ -651,37 +699,128 @@ def update_order_status(request, order_id):
 
 # --- API Views for Admin Dashboard ---
 
-@csrf_exempt
+def parse_event_channels(request):
+    """
+    Canales de ?channels=cocina,garzon que el usuario puede escuchar.
+    Retorna (canales de Pusher/broadcaster, None) o (None, respuesta de error).
+    """
+    from .events import SSE_CHANNEL_ROLES, pusher_channel
+
+    channels = [name.strip() for name in request.GET.get('channels', '').split(',') if name.strip()]
+    if not channels:
+        return None, JsonResponse({'error': 'Indique al menos un canal (?channels=cocina,garzon)'}, status=400)
+    unknown = [name for name in channels if name not in SSE_CHANNEL_ROLES]
+    if unknown:
+        return None, JsonResponse({'error': f"Canal desconocido: {', '.join(unknown)}"}, status=400)
+    for name in channels:
+        if not has_role(request.user, 'Administrador', *SSE_CHANNEL_ROLES[name], allow_superuser=True):
+            return None, JsonResponse({'error': f'Sin acceso al canal {name}'}, status=403)
+    return [pusher_channel(name) for name in channels], None
+
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name__in=['Administrador', 'Cocinero']).exists())
+def api_events(request):
+    """
+    Stream de eventos en tiempo real (Server-Sent Events).
+    ?channels=cocina,garzon: canales a escuchar, según el rol del usuario.
+    Mismos nombres de evento que Pusher ('nuevo-pedido', 'pedido-listo', ...).
+    Al reconectar, EventSource envía Last-Event-ID y se reenvían los eventos perdidos.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+    from .events import asse_stream, broadcaster, sse_stream
+
+    channels, error = parse_event_channels(request)
+    if error:
+        return error
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        return JsonResponse({'error': 'Last-Event-ID inválido'}, status=400)
+
+    if isinstance(request, ASGIRequest):
+        # Bajo ASGI un iterador síncrono se consumiría entero antes de enviarse
+        stream = asse_stream(channels, after=after)
+    else:
+        stream = sse_stream(broadcaster.subscribe(channels), after=after)
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evitar que un proxy (nginx) acumule el stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
-def api_orders(request):
+def api_event_log(request):
+    """
+    Eventos perdidos desde una secuencia: ?after=<seq>&channels=cocina.
+    Retorna {'events': [...], 'last_seq': N, 'resync': bool}; con resync=true
+    los eventos ya no están en el registro y el cliente debe recargar su estado.
+    """
+    from .events import replay_events
+
+    channels, error = parse_event_channels(request)
+    if error:
+        return error
+    try:
+        after = int(request.GET['after'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Parámetro after inválido'}, status=400)
+    return JsonResponse(replay_events(channels, after))
+
+@csrf_exempt
+@login_required
+@require_role('Administrador', 'Cocinero')
+@etag_versioned('orders')
+@query_budget(queries=10, duplicates=2)  # máx. medido: 8
+async def api_orders(request):
     """
     GET: Returns a list of all orders with items (para cook dashboard y polling).
+         The current feed revision is sent in the X-Orders-Revision header.
+    GET ?since=<rev>: Returns only the orders changed after that revision:
+         {'revision': <new rev>, 'orders': [...], 'removed': [ids]}
+         With 'resync': true the revision is older than the change log: fetch the snapshot again.
     POST: Creates a new order.
+    Async (ORM async): el polling de cocina no ocupa uno de los hilos del servidor;
+    las consultas corren en el hilo de sync_to_async del request.
     """
     if request.method == 'GET':
         try:
             # Para cocina: solo órdenes pendientes y en preparación
             orders = Order.objects.filter(
-                status__in=['pending', 'preparing']
+                status__in=KITCHEN_STATUSES
             ).select_related('user').prefetch_related('orderitem_set__menu_item').order_by('created_at')
-            
-            data = []
-            for o in orders:
-                data.append({
-                    'id': o.id,
-                    'identifier': get_order_identifier(o),
-                    'status': o.status,
-                    'created_at': o.created_at.isoformat(),
-                    'items': [{
-                        'name': item.menu_item.name,
-                        'quantity': item.quantity,
-                        'note': item.note or '',
-                        'is_prepared': item.is_prepared,
-                    } for item in o.orderitem_set.all()]
+
+            since = request.GET.get('since')
+            if since is not None:
+                # Feed incremental: solo pedidos insertados, actualizados o eliminados desde `since`
+                try:
+                    since = int(since)
+                except ValueError:
+                    return JsonResponse({'error': 'since must be an integer revision'}, status=400)
+
+                revision, changed_ids, resync = await OrderChange.achanged_since(since)
+                if resync:
+                    # Cambios ya podados del registro: el cliente debe pedir un snapshot completo
+                    return JsonResponse({'revision': revision, 'orders': [], 'removed': [], 'resync': True})
+                if not changed_ids:
+                    return JsonResponse({'revision': revision, 'orders': [], 'removed': []})
+
+                changed_orders = [o async for o in orders.filter(id__in=changed_ids)]
+                active_ids = {o.id for o in changed_orders}
+                return JsonResponse({
+                    'revision': revision,
+                    'orders': [serialize_kitchen_order(o) for o in changed_orders],
+                    'removed': sorted(changed_ids - active_ids),
                 })
-            return JsonResponse(data, safe=False)
+
+            # Snapshot completo. La revisión se lee antes que los pedidos y se detiene
+            # antes de cualquier transacción en curso, para que los cambios concurrentes
+            # vuelvan a aparecer en el siguiente ?since=
+            revision = await OrderChange.asnapshot_revision()
+            data = [serialize_kitchen_order(o) async for o in orders]
+            response = JsonResponse(data, safe=False)
+            response['X-Orders-Revision'] = str(revision)
+            return response
         except Exception as e:
             print(f"[ERROR] api_orders GET: {str(e)}")
             return JsonResponse({'error': str(e)}, status=500)
@@ -689,10 +828,10 @@ def api_orders(request):
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            order = Order.objects.create(
+            order = await Order.objects.acreate(
                 client_identifier=data['client_identifier'],
                 room_number=data.get('room_number'),
-                user=request.user,
+                user=await request.auser(),
                 status=data.get('status', 'pending')
             )
             
@@ -709,20 +848,23 @@ def api_orders(request):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
-def api_kitchen_orders(request):
+@require_role('Administrador', allow_superuser=True)
+@etag_versioned('orders')
+@query_budget(queries=7, duplicates=2)  # máx. medido: 5
+async def api_kitchen_orders(request):
     if request.method == 'GET':
         orders = Order.objects.filter(status__in=['pending', 'preparing'])
         data = [{
             'id': o.id,
             'identifier': get_order_identifier(o),
             'status': o.get_status_display(),
-        } for o in orders]
+        } async for o in orders]
         return JsonResponse(data, safe=False)
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name__in=['Administrador', 'Recepcionista']).exists())
+@require_role('Administrador', 'Recepcionista', allow_superuser=True)
+@etag_versioned('orders', 'menu')
 def api_order_detail(request, pk):
     """
     API endpoint for admin to get and update a specific order.
@@ -779,7 +921,8 @@ def api_order_detail(request, pk):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name__in=['Administrador', 'Garzón', 'Cocinero', 'Recepcionista']).exists())
+@require_role('Administrador', 'Garzón', 'Cocinero', 'Recepcionista', allow_superuser=True)
+@query_budget(queries=23)  # máx. medido: 18 (pago con propina, caché fría)
 def api_order_status(request, pk):
     if request.method == 'PUT':
         try:
@@ -834,20 +977,18 @@ def api_order_status(request, pk):
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
-def api_menu_items(request):
+@require_role('Administrador', allow_superuser=True)
+@etag_versioned('menu')
+@query_budget(queries=7, duplicates=1)  # máx. medido: 5
+async def api_menu_items(request):
     """
     GET: Returns a list of all menu items.
     POST: Creates a new menu item.
     """
     if request.method == 'GET':
-        menu_items = MenuItem.objects.all().order_by('category', 'name')
-        data = [{
-            'id': m.id, 'name': m.name, 'description': m.description,
-            'price': float(m.price), 'category': m.category, 'available': m.available,
-            'image_url': m.image_url
-        } for m in menu_items]
-        return JsonResponse(data, safe=False)
+        # JSON pre-serializado del catálogo en caché
+        catalog = await aget_menu_catalog()
+        return HttpResponse(catalog.items_json, content_type='application/json')
 
     if request.method == 'POST':
         try:
@@ -873,7 +1014,7 @@ def api_menu_items(request):
             except (ValueError, decimal.InvalidOperation):
                 return JsonResponse({'error': 'Invalid data: price must be a valid number'}, status=400)
             
-            item = MenuItem.objects.create(
+            item = await MenuItem.objects.acreate(
                 name=data['name'].strip(),
                 description=data.get('description', ''),
                 price=price,
@@ -884,7 +1025,7 @@ def api_menu_items(request):
             return JsonResponse({
                 'id': item.id, 'name': item.name, 'description': item.description,
                 'price': float(item.price), 'category': item.category, 'available': item.available,
-                'image_url': item.image_url
+                'image_url': item.image_url, **thumbnail_fields(responsive_images(item))
             }, status=201)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid data: malformed JSON'}, status=400)
@@ -898,7 +1039,8 @@ def api_menu_items(request):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
+@etag_versioned('menu')
 def api_menu_item_detail(request, pk):
     """
     GET: Returns a single menu item.
@@ -915,7 +1057,7 @@ def api_menu_item_detail(request, pk):
         return JsonResponse({
             'id': item.id, 'name': item.name, 'description': item.description,
             'price': float(item.price), 'category': item.category, 'available': item.available,
-            'image_url': item.image_url
+            'image_url': item.image_url, **thumbnail_fields(responsive_images(item))
         })
 
     if request.method in ['PUT', 'PATCH']:
@@ -970,16 +1112,21 @@ def api_menu_item_detail(request, pk):
             if 'available' in data:
                 item.available = parse_available(data['available'])
         
-        # Handle image upload
-        if 'image' in request.FILES:
-            item.image = request.FILES['image']
-        
-        item.save()
+        with transaction.atomic():
+            # Handle image upload (procesada y publicada en segundo plano, ver images.py)
+            if 'image' in request.FILES:
+                from .images import stage_menu_image
+                try:
+                    stage_menu_image(item, request.FILES['image'])
+                except ValueError as e:
+                    return JsonResponse({'error': f'Invalid image: {str(e)}'}, status=400)
+
+            item.save()
         print(f"[DEBUG] Item {pk} saved. Available: {item.available}")
         return JsonResponse({
             'id': item.id, 'name': item.name, 'description': item.description,
             'price': float(item.price), 'category': item.category, 'available': item.available,
-            'image_url': item.image_url
+            'image_url': item.image_url, **thumbnail_fields(responsive_images(item))
         })
 
     if request.method == 'DELETE':
@@ -987,15 +1134,18 @@ def api_menu_item_detail(request, pk):
         return JsonResponse({'success': True}, status=204)
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
 def api_menu_item_upload_image(request, pk):
     """
-    Upload image for a menu item directly to Cloudinary.
+    Upload image for a menu item.
     Only handles POST requests with file upload.
-    Returns the Cloudinary URL directly sin guardar en la BD.
+
+    La foto se procesa aquí (derivados WebP/JPEG, ver images.py) y se publica
+    en segundo plano; responde 202 con image_status='processing'. La URL nueva
+    llega por el evento item-disponibilidad o en image_url una vez publicada.
     """
-    import cloudinary.uploader
-    
+    from .images import stage_menu_image
+
     try:
         item = MenuItem.objects.get(pk=pk)
     except MenuItem.DoesNotExist:
@@ -1007,30 +1157,22 @@ def api_menu_item_upload_image(request, pk):
         
         try:
             image_file = request.FILES['image']
-            print(f"[DEBUG] Uploading image for item {pk}: {image_file.name}")
-            
-            # Upload directly to Cloudinary using the file content
-            result = cloudinary.uploader.upload(
-                image_file.read(),
-                folder=f'restaurant/menu_items',
-                public_id=f'item_{pk}_{image_file.name.split(".")[0]}',
-                overwrite=True,
-                resource_type='auto'
-            )
-            
-            cloudinary_url = result.get('secure_url')
-            print(f"[DEBUG] Image uploaded to Cloudinary: {cloudinary_url}")
-            
-            # Store the Cloudinary URL public_id in the database (not the full URL)
-            # This avoids Django treating it as a relative path
-            item.image = f'cloudinary:{result.get("public_id")}'
-            item.save()
-            
+            print(f"[DEBUG] Processing image for item {pk}: {image_file.name}")
+
+            with transaction.atomic():
+                stage_menu_image(item, image_file)
+                item.save(update_fields=['image_version', 'image_status'])
+
             return JsonResponse({
                 'id': item.id,
-                'image_url': cloudinary_url,
-                'message': 'Image uploaded successfully'
-            }, status=200)
+                'image_url': item.image_url,
+                **thumbnail_fields(responsive_images(item)),
+                'image_status': item.image_status,
+                'image_version': item.image_version,
+                'message': 'Image accepted for processing'
+            }, status=202)
+        except ValueError as e:
+            return JsonResponse({'error': f'Invalid image: {str(e)}'}, status=400)
         except Exception as e:
             print(f"[ERROR] Image upload failed: {str(e)}")
             import traceback
@@ -1040,7 +1182,7 @@ def api_menu_item_upload_image(request, pk):
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
 def api_menu_item_delete_image(request, pk):
     """
     Delete image for a menu item.
@@ -1053,12 +1195,14 @@ def api_menu_item_delete_image(request, pk):
     
     if request.method == 'POST':
         try:
-            if item.image:
-                # Delete the file from storage
-                item.image.delete()
-                # Clear the image field
-                item.image = None
-                item.save()
+            if item.image or item.image_variants or item.image_status:
+                from .images import clear_menu_image
+                if item.image and not item.image_variants:
+                    # Imagen anterior al pipeline: borrarla del storage
+                    item.image.delete(save=False)
+                with transaction.atomic():
+                    clear_menu_image(item)
+                    item.save()
                 print(f"[DEBUG] Image deleted for item {pk}")
             
             return JsonResponse({
@@ -1073,81 +1217,105 @@ def api_menu_item_delete_image(request, pk):
     
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
+async def ndjson_report_lines(rows):
+    """NDJSON lines of report rows from an async iterator (api_orders_report under ASGI)."""
+    async for row in rows:
+        yield json.dumps(serialize_order_report_row(row)) + '\n'
+
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name__in=['Administrador', 'Recepcionista']).exists())
+@require_role('Administrador', 'Recepcionista')
+@etag_versioned('orders')
 def api_orders_report(request):
     """
     API endpoint to get a filtered list of orders for reporting purposes.
-    Optimized with select_related to avoid N+1 queries.
+
+    Pagination (keyset on created_at, id, newest first):
+    - ?limit=50[&cursor=<next>] -> {"results": [...], "next": "<cursor>" | null}
+    - ?format=ndjson[&cursor=<next>] -> one JSON row per line, streamed
+    - No limit/cursor/format -> full JSON array (kept for older clients)
     """
     if request.method == 'GET':
-        from django.db.models import Q
-        from datetime import datetime, timedelta, date
-        from django.utils import timezone
-        
-        # Optimización: select_related para el usuario (relación 1-to-N)
-        orders = Order.objects.select_related('user').all()
+        from django.core.handlers.asgi import ASGIRequest
+        from django.http import StreamingHttpResponse
+        from .pagination import after_cursor, keyset_page, parse_page_size
+        from .search import search_orders
+
+        orders = Order.objects.all()
 
         # Filtering
-        search_query = request.GET.get('search', '')
-        if search_query:
-            # Búsqueda segura: Intenta buscar por ID si es un número, si no, solo por número de mesa.
-            # Esto evita el error si el `search_query` no es un número válido.
-            id_query = Q()
-            if search_query.isdigit():
-                id_query = Q(id=int(search_query))
-            orders = orders.filter(id_query | Q(client_identifier__icontains=search_query) | Q(room_number__icontains=search_query))
+        # Búsqueda indexada por N° de pedido, cliente, habitación o plato (ver search.py)
+        orders = search_orders(orders, request.GET.get('search', ''))
 
         status_query = request.GET.get('status', '')
         if status_query:
             orders = orders.filter(status=status_query)
 
-        date_from_query = request.GET.get('date_from', '')
-        if date_from_query:
-            try:
-                date_from = datetime.strptime(date_from_query, '%Y-%m-%d').date()
-                # Convert to datetime at start of day in current timezone, then to UTC for comparison
-                dt_from = timezone.make_aware(datetime.combine(date_from, datetime.min.time()))
-                orders = orders.filter(created_at__gte=dt_from)
-            except ValueError:
-                pass
-
-        date_to_query = request.GET.get('date_to', '')
-        if date_to_query:
-            try:
-                date_to = datetime.strptime(date_to_query, '%Y-%m-%d').date()
-                # Convert to datetime at end of day in current timezone, then to UTC for comparison
-                dt_to = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
-                orders = orders.filter(created_at__lt=dt_to)
-            except ValueError:
-                pass
+        # Rango semiabierto en hora local: usa el índice de created_at
+        orders = filter_local_dates(orders, request.GET.get('date_from', ''), request.GET.get('date_to', ''))
 
-        orders = orders.order_by('-created_at')
+        rows = orders.values(*ORDER_REPORT_FIELDS)
+        cursor = request.GET.get('cursor', '')
 
-        # Prepare data for JSON response
-        data = []
-        for order in orders:
-            data.append({
-                'id': order.id,
-                'identifier': get_order_identifier(order),
-                'status': order.status,
-                'status_display': order.get_status_display(),
-                'status_class': order.status_class,
-                'payment_method': order.payment_method,
-                'payment_method_display': order.get_payment_method_display(),
-                'created_at': order.created_at.isoformat(), # Ensure datetime is serializable
-                'total': float(order.total_amount or 0), # Usar el nuevo campo total_amount
-            })
+        try:
+            if request.GET.get('format') == 'ndjson':
+                rows = after_cursor(rows, cursor)
+                if isinstance(request, ASGIRequest):
+                    # Bajo ASGI un iterador síncrono se consumiría entero antes de enviarse:
+                    # aiterator() trae los lotes de 500 filas desde el hilo de la request
+                    lines = ndjson_report_lines(rows.aiterator(chunk_size=500))
+                else:
+                    lines = (
+                        json.dumps(serialize_order_report_row(row)) + '\n'
+                        for row in rows.iterator(chunk_size=500)
+                    )
+                return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+            if 'limit' in request.GET or cursor:
+                page, next_cursor = keyset_page(rows, parse_page_size(request.GET.get('limit')), cursor)
+                return JsonResponse({
+                    'results': [serialize_order_report_row(row) for row in page],
+                    'next': next_cursor,
+                })
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
+        data = [serialize_order_report_row(row) for row in after_cursor(rows, None).iterator(chunk_size=500)]
         return JsonResponse(data, safe=False)
 
     return JsonResponse({'error': 'Invalid method'}, status=405)
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name__in=['Administrador', 'Recepcionista']).exists())
+@require_role('Administrador', 'Recepcionista', allow_superuser=True)
+def api_orders_search(request):
+    """
+    Type-ahead search of orders.
+    GET /api/orders/search/?q=<text>[&limit=10][&dishes=0]
+    Matches order number, client, room and (unless dishes=0) dish names, newest first.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid method'}, status=405)
+
+    from .pagination import parse_page_size
+    from .search import search_orders
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': []})
+
+    try:
+        limit = parse_page_size(request.GET.get('limit'), default=10)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    orders = search_orders(Order.objects.all(), query, include_dishes=request.GET.get('dishes') != '0')
+    rows = orders.order_by('-created_at', '-id').values(*ORDER_REPORT_FIELDS)[:limit]
+    return JsonResponse({'results': [serialize_order_report_row(row) for row in rows]})
+
+@login_required
+@require_role('Administrador', 'Recepcionista')
+@etag_versioned('orders', 'menu', 'categories', 'date')
 def api_dashboard_charts(request):
     from django.db.models import Sum, Count, F, Q, Case, When, Value, IntegerField
-    from django.db.models.functions import TruncDate, ExtractHour
     from django.utils import timezone
     from datetime import timedelta
 
@@ -1155,14 +1323,12 @@ def api_dashboard_charts(request):
     today = timezone.localtime().date()
 
     if chart_type == 'sales_by_day':
-        # Ventas de los últimos 7 días para pedidos pagados
+        # Ventas de los últimos 7 días para pedidos pagados (desde el rollup pre-agregado)
         seven_days_ago = timezone.localtime().date() - timedelta(days=6)
-        sales_data = Order.objects.filter(
+        sales_data = HourlySalesRollup.objects.filter(
             status='paid',
-            created_at__date__gte=seven_days_ago
-        ).annotate(
-            date=TruncDate('created_at')
-        ).values('date').annotate( # Use the new total_amount field
+            date__gte=seven_days_ago
+        ).values('date').annotate(
             daily_total=Sum('total_amount')
         ).order_by('date')
 
@@ -1174,23 +1340,23 @@ def api_dashboard_charts(request):
         return JsonResponse({'labels': labels, 'data': data})
 
     if chart_type == 'top_dishes':
-        # Top 5 platos más vendidos
-        top_dishes = MenuItem.objects.annotate(
-            total_sold=Sum('orderitem__quantity', filter=Q(orderitem__order__status='paid'))
+        # Top 5 platos más vendidos (desde el rollup pre-agregado)
+        top_dishes = DailySalesRollup.objects.filter(
+            status='paid'
+        ).values('menu_item__name').annotate(
+            total_sold=Sum('quantity')
         ).filter(total_sold__gt=0).order_by('-total_sold')[:5]
 
-        labels = [item.name for item in top_dishes]
-        data = [item.total_sold for item in top_dishes]
+        labels = [item['menu_item__name'] for item in top_dishes]
+        data = [item['total_sold'] for item in top_dishes]
         return JsonResponse({'labels': labels, 'data': data})
 
     if chart_type == 'sales_by_hour':
-        # Ventas de hoy por hora
-        sales_data = Order.objects.filter(
+        # Ventas de hoy por hora (desde el rollup pre-agregado)
+        sales_data = HourlySalesRollup.objects.filter(
             status='paid',
-            created_at__date=today
-        ).annotate(
-            hour=ExtractHour('created_at') # Use the new total_amount field
-        ).values('hour').annotate( 
+            date=today
+        ).values('hour').annotate(
             hourly_total=Sum('total_amount')
         ).order_by('hour')
 
@@ -1203,8 +1369,10 @@ def api_dashboard_charts(request):
     if chart_type == 'waiter_performance':
         # Rendimiento de garzones (pedidos atendidos hoy)
         waiters = User.objects.filter(groups__name='Garzón')
+        day_start, day_end = local_day_range(today)
         performance_data = Order.objects.filter(
-            created_at__date=today,
+            created_at__gte=day_start,
+            created_at__lt=day_end,
             user__in=waiters
         ).values('user__username').annotate(
             order_count=Count('id'), # Use the new total_amount field
@@ -1218,40 +1386,23 @@ def api_dashboard_charts(request):
         return JsonResponse({'labels': labels, 'orders': data_orders, 'sales': data_sales})
 
     if chart_type == 'sales_by_category':
-        # Ventas de hoy por categoría de producto
-        from django.db.models import DecimalField
-        try:
-            category_sales = OrderItem.objects.filter(
-                order__status='paid',
-                order__created_at__date=today,
-                menu_item__isnull=False,
-                menu_item__category__isnull=False
-            ).values('menu_item__category').annotate(
-                total=Sum(F('menu_item__price') * F('quantity'), output_field=DecimalField())
-            ).order_by('-total')
-            
-            labels = []
-            data = []
-            for item in category_sales:
-                category_id = item['menu_item__category']
-                if category_id:
-                    try:
-                        category = Category.objects.get(id=category_id)
-                        labels.append(category.name)
-                        data.append(float(item['total']))
-                    except Category.DoesNotExist:
-                        pass
-            
-            return JsonResponse({'labels': labels, 'data': data})
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            return JsonResponse({'labels': [], 'data': []})
+        # Ventas de hoy por categoría de producto (desde el rollup pre-agregado)
+        category_sales = DailySalesRollup.objects.filter(
+            status='paid',
+            date=today
+        ).values('category').annotate(
+            total=Sum('sales')
+        ).filter(total__gt=0).order_by('-total')
+
+        labels = [item['category'] for item in category_sales]
+        data = [float(item['total']) for item in category_sales]
+        return JsonResponse({'labels': labels, 'data': data})
 
     return JsonResponse({'error': 'Invalid chart type'}, status=400)
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Administrador').exists())
+@require_role('Administrador')
+@etag_versioned('orders')
 def api_admin_dashboard_stats(request):
     """
     API endpoint to get admin dashboard statistics for today.
@@ -1264,14 +1415,23 @@ def api_admin_dashboard_stats(request):
         today = timezone.localtime().date()
         
         # Obtener stats de todas las órdenes (sin filtro de fecha por ahora)
-        all_orders = Order.objects.all()
+        order_stats = Order.objects.aggregate(
+            total=Count('id'),
+            preparing=Count('id', filter=Q(status='preparing')),
+            ready=Count('id', filter=Q(status='ready')),
+        )
+        # Pedidos pagados desde el rollup pre-agregado
+        paid_stats = HourlySalesRollup.objects.filter(status='paid').aggregate(
+            completed=Sum('order_count'),
+            total_sales=Sum('total_amount'),
+        )
         
         stats = {
-            'total_today': all_orders.count(),
-            'preparing': all_orders.filter(status='preparing').count(),
-            'ready': all_orders.filter(status='ready').count(),
-            'completed': all_orders.filter(status='paid').count(),
-            'total_sales_today': float(all_orders.filter(status='paid').aggregate(Sum('total_amount'))['total_amount__sum'] or 0)
+            'total_today': order_stats['total'],
+            'preparing': order_stats['preparing'],
+            'ready': order_stats['ready'],
+            'completed': paid_stats['completed'] or 0,
+            'total_sales_today': float(paid_stats['total_sales'] or 0)
         }
         
         return JsonResponse(stats)
@@ -1281,43 +1441,49 @@ def api_admin_dashboard_stats(request):
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name__in=['Administrador', 'Recepcionista']).exists())
+@require_role('Administrador', 'Recepcionista')
+@etag_versioned('orders', 'date')
 def api_payment_methods_report(request):
     """
     API endpoint to get payment methods statistics with daily and weekly breakdowns.
     Returns monthly data, daily breakdown, and weekly breakdown.
+    Optional ?month=YYYY-MM (defaults to the current month).
+    Reads the pre-aggregated HourlySalesRollup (local dates), so only O(days)
+    rows come back regardless of the number of orders.
     """
     if request.method != 'GET':
         return JsonResponse({'error': f'Método {request.method} no permitido. Use GET.'}, status=405)
     
     from datetime import datetime, timedelta, date
-    from django.db.models import F, Q
     from django.utils import timezone
     
-    # Get current month in Santiago timezone
-    today = timezone.now().date()
-    month_start = today.replace(day=1)
-    
-    # Get last day of month
-    if today.month == 12:
-        month_end = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
+    # Get requested month (or current month) in Santiago timezone
+    month_query = request.GET.get('month', '')
+    if month_query:
+        try:
+            month_start = datetime.strptime(month_query, '%Y-%m').date()
+        except ValueError:
+            return JsonResponse({'error': 'Formato de mes inválido. Use YYYY-MM.'}, status=400)
     else:
-        month_end = today.replace(month=today.month + 1, day=1) - timedelta(days=1)
+        month_start = timezone.localdate().replace(day=1)
     
-    # Convert dates to timezone-aware datetimes for filtering
-    month_start_dt = timezone.make_aware(datetime.combine(month_start, datetime.min.time()))
-    month_end_dt = timezone.make_aware(datetime.combine(month_end, datetime.max.time()))
+    # First day of next month (half-open range) and last day of month
+    if month_start.month == 12:
+        next_month_start = month_start.replace(year=month_start.year + 1, month=1)
+    else:
+        next_month_start = month_start.replace(month=month_start.month + 1)
+    month_end = next_month_start - timedelta(days=1)
     
-    # Filtrar órdenes pagadas o cargadas a habitación en el mes actual
-    orders = Order.objects.filter(
-        Q(status='paid') | Q(status='charged_to_room'),
-        created_at__gte=month_start_dt,
-        created_at__lte=month_end_dt
+    # Rollup de órdenes pagadas o cargadas a habitación en el mes
+    rollup = HourlySalesRollup.objects.filter(
+        status__in=['paid', 'charged_to_room'],
+        date__gte=month_start,
+        date__lt=next_month_start
     )
     
     # === MONTHLY SUMMARY (por método de pago) ===
-    payment_stats = orders.values('payment_method').annotate(
-        count=Count('id'),
+    payment_stats = rollup.values('payment_method').annotate(
+        count=Sum('order_count'),
         total_sales=Sum('total_amount'),
         total_tips=Sum('tip_amount')
     ).order_by('-total_sales')
@@ -1326,15 +1492,17 @@ def api_payment_methods_report(request):
     monthly_data = []
     grand_total = decimal.Decimal('0.00')
     grand_tips = decimal.Decimal('0.00')
+    total_orders = 0
     
     for stat in payment_stats:
-        method = stat['payment_method']
+        method = stat['payment_method'] or None  # '' en el rollup = sin método de pago
         count = stat['count']
         total = stat['total_sales'] or decimal.Decimal('0.00')
         tips = stat['total_tips'] or decimal.Decimal('0.00')
         
         grand_total += total
         grand_tips += tips
+        total_orders += count
         
         monthly_data.append({
             'method': method,
@@ -1352,19 +1520,12 @@ def api_payment_methods_report(request):
             item['percentage'] = round((decimal.Decimal(str(item['total'])) / grand_total) * 100, 2)
     
     # === DAILY BREAKDOWN ===
-    # Group by date
-    daily_dict = {}
-    for order in orders:
-        order_date = order.created_at.date()
-        if order_date not in daily_dict:
-            daily_dict[order_date] = {
-                'count': 0,
-                'total': decimal.Decimal('0.00'),
-                'total_tips': decimal.Decimal('0.00')
-            }
-        daily_dict[order_date]['count'] += 1
-        daily_dict[order_date]['total'] += order.total_amount or decimal.Decimal('0.00')
-        daily_dict[order_date]['total_tips'] += order.tip_amount or decimal.Decimal('0.00')
+    # Group by local date in the database
+    daily_stats = rollup.values('date').annotate(
+        count=Sum('order_count'),
+        total=Sum('total_amount'),
+        total_tips=Sum('tip_amount')
+    ).order_by('date')
     
     daily_data = []
     days_spanish = {
@@ -1376,45 +1537,32 @@ def api_payment_methods_report(request):
         'Saturday': 'Sábado',
         'Sunday': 'Domingo'
     }
-    for date_obj in sorted(daily_dict.keys()):
-        stat = daily_dict[date_obj]
+    weekly_stats = {}
+    for stat in daily_stats:
+        date_obj = stat['date']
+        total = stat['total'] or decimal.Decimal('0.00')
         day_name_en = date_obj.strftime('%A')
         day_name_es = days_spanish.get(day_name_en, day_name_en)
         daily_data.append({
             'date': str(date_obj),
             'day_name': day_name_es,
             'count': stat['count'],
-            'total': float(stat['total']),
-            'total_tips': float(stat['total_tips']),
-            'average': float(stat['total'] / stat['count']) if stat['count'] > 0 else 0
+            'total': float(total),
+            'total_tips': float(stat['total_tips'] or 0),
+            'average': float(total / stat['count']) if stat['count'] > 0 else 0
         })
-    
-    # === WEEKLY BREAKDOWN ===
-    # Group by ISO week with date range
-    from datetime import timedelta
-    weekly_stats = {}
-    for order in orders:
-        year, week_num, weekday = order.created_at.isocalendar()
-        week_key = f"W{week_num}"
-        
-        if week_key not in weekly_stats:
-            # Calculate week start (Monday) and end (Sunday)
-            order_date = order.created_at.date()
-            week_start = order_date - timedelta(days=weekday - 1)  # ISO weekday: Mon=1, Sun=7
-            week_end = week_start + timedelta(days=6)
-            
-            weekly_stats[week_key] = {
-                'week_num': week_num,
-                'week_start': week_start,
-                'week_end': week_end,
-                'count': 0,
-                'total': decimal.Decimal('0.00'),
-                'total_tips': decimal.Decimal('0.00')
-            }
-        
-        weekly_stats[week_key]['count'] += 1
-        weekly_stats[week_key]['total'] += order.total_amount or decimal.Decimal('0.00')
-        weekly_stats[week_key]['total_tips'] += order.tip_amount or decimal.Decimal('0.00')
+
+        # === WEEKLY BREAKDOWN ===
+        # Group the daily rows by ISO week (Monday start)
+        week_start = date_obj - timedelta(days=date_obj.weekday())
+        week = weekly_stats.setdefault(week_start, {
+            'count': 0,
+            'total': decimal.Decimal('0.00'),
+            'total_tips': decimal.Decimal('0.00')
+        })
+        week['count'] += stat['count']
+        week['total'] += total
+        week['total_tips'] += stat['total_tips'] or decimal.Decimal('0.00')
     
     weekly_data = []
     months_spanish = {
@@ -1422,24 +1570,24 @@ def api_payment_methods_report(request):
         'May': 'May', 'June': 'Jun', 'July': 'Jul', 'August': 'Ago',
         'September': 'Sep', 'October': 'Oct', 'November': 'Nov', 'December': 'Dic'
     }
-    for week_key in sorted(weekly_stats.keys()):
-        stat = weekly_stats[week_key]
+    for week_start in sorted(weekly_stats):
+        stat = weekly_stats[week_start]
+        week_end = week_start + timedelta(days=6)
+        total = stat['total']
         # Format as "8-14 Dic" or similar
-        start_date = stat['week_start'].strftime('%d')
-        month_name_en = stat['week_end'].strftime('%B')
+        month_name_en = week_end.strftime('%B')
         month_name_es = months_spanish.get(month_name_en, month_name_en)
-        end_date = stat['week_end'].strftime('%d')
-        week_label = f"{start_date}-{end_date} {month_name_es}"
+        week_label = f"{week_start.strftime('%d')}-{week_end.strftime('%d')} {month_name_es}"
         
         weekly_data.append({
             'week': week_label,
-            'week_num': stat['week_num'],
-            'week_start': str(stat['week_start']),
-            'week_end': str(stat['week_end']),
+            'week_num': week_start.isocalendar()[1],
+            'week_start': str(week_start),
+            'week_end': str(week_end),
             'count': stat['count'],
-            'total': float(stat['total']),
+            'total': float(total),
             'total_tips': float(stat['total_tips']),
-            'average': float(stat['total'] / stat['count']) if stat['count'] > 0 else 0
+            'average': float(total / stat['count']) if stat['count'] > 0 else 0
         })
     
     months_spanish_full = {
@@ -1456,11 +1604,11 @@ def api_payment_methods_report(request):
         'month_start': str(month_start),
         'month_end': str(month_end),
         'summary': {
-            'total_orders': len(orders),
+            'total_orders': total_orders,
             'grand_total': float(grand_total),
             'grand_tips': float(grand_tips),
-            'average_order': float(grand_total / len(orders)) if len(orders) > 0 else 0,
-            'average_tip': float(grand_tips / len(orders)) if len(orders) > 0 else 0,
+            'average_order': float(grand_total / total_orders) if total_orders > 0 else 0,
+            'average_tip': float(grand_tips / total_orders) if total_orders > 0 else 0,
         },
         'monthly': monthly_data,
         'daily': daily_data,
@@ -1469,7 +1617,7 @@ def api_payment_methods_report(request):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
 def api_registration_pins(request, pk=None):
     """
     API para gestionar los PINs de registro.
@@ -1528,98 +1676,31 @@ def api_registration_pins(request, pk=None):
     return JsonResponse({'error': f'Método {request.method} no permitido.'}, status=405)
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name__in=['Administrador', 'Recepcionista']).exists())
+@require_role('Administrador', 'Recepcionista', allow_superuser=True)
 def export_orders_excel(request):
     """
     Exports a filtered list of orders to an Excel file (.xlsx).
+    The workbook is built in write-only mode and streamed back.
     """
-    from django.http import HttpResponse
     from django.utils import timezone
-
-    orders = Order.objects.prefetch_related('orderitem_set__menu_item').all()
+    from .exports import XLSX_CONTENT_TYPE, build_workbook_file, filter_orders_for_export, write_orders_workbook
+    from .streaming import file_response
 
     # Filtering (same logic as api_orders_report)
-    search_query = request.GET.get('search', '')
-    if search_query:
-        orders = orders.filter(Q(id__icontains=search_query) | Q(client_identifier__icontains=search_query) | Q(room_number__icontains=search_query))
-
-    status_query = request.GET.get('status', '')
-    if status_query:
-        orders = orders.filter(status=status_query)
-
-    date_from_query = request.GET.get('date_from', '')
-    if date_from_query:
-        orders = orders.filter(created_at__date__gte=date_from_query)
-
-    date_to_query = request.GET.get('date_to', '')
-    if date_to_query:
-        orders = orders.filter(created_at__date__lte=date_to_query)
-
-    orders = orders.order_by('-created_at')
-
-    # Create an Excel workbook and sheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte de Pedidos"
-
-    # Define styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    total_font = Font(bold=True)
-    currency_format = '"$"#,##0'
-
-    # Write headers
-    headers = ['ID Order', 'Cliente/Habitación', 'Estado', 'Método de Pago', 'Fecha y Hora', 'Total']
-    for col_num, header_title in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header_title)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-
-    # Write data rows
-    grand_total = 0
-    row_num = 2
-    grand_total = decimal.Decimal('0.00')
-    for order in orders:
-        final_total = order.total_amount # Use the new field
-        if final_total:
-            grand_total += final_total
-        local_time = timezone.localtime(order.created_at).strftime('%Y-%m-%d %H:%M')
-        
-        ws.cell(row=row_num, column=1, value=order.id)
-        ws.cell(row=row_num, column=2, value=get_order_identifier(order))
-        ws.cell(row=row_num, column=3, value=order.get_status_display())
-        ws.cell(row=row_num, column=4, value=order.get_payment_method_display())
-        ws.cell(row=row_num, column=5, value=local_time)
-        total_cell = ws.cell(row=row_num, column=6, value=final_total)
-        total_cell.number_format = currency_format
-        row_num += 1
-
-    # Write total row
-    total_label_cell = ws.cell(row=row_num + 1, column=5, value="Total Vendido:")
-    total_label_cell.font = total_font
-    total_label_cell.alignment = Alignment(horizontal='right')
-
-    grand_total_cell = ws.cell(row=row_num + 1, column=6, value=grand_total)
-    grand_total_cell.font = total_font
-    grand_total_cell.number_format = currency_format
-    grand_total_cell.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid") # Yellow fill
-
-    # Adjust column widths
-    for col_num, header_title in enumerate(headers, 1):
-        column_letter = get_column_letter(col_num)
-        ws.column_dimensions[column_letter].width = 20
-
-    # Create the response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="reporte_pedidos_{timezone.now().strftime("%Y-%m-%d")}.xlsx"'
-    wb.save(response)
-
-    return response
+    orders = filter_orders_for_export(request.GET)
+
+    return file_response(
+        request,
+        build_workbook_file(write_orders_workbook, orders),
+        as_attachment=True,
+        filename=f'reporte_pedidos_{timezone.now().strftime("%Y-%m-%d")}.xlsx',
+        content_type=XLSX_CONTENT_TYPE,
+    )
 
 @login_required
-@user_passes_test(lambda u: u.is_superuser or u.groups.filter(name='Administrador').exists())
+@require_role('Administrador', allow_superuser=True)
 @csrf_exempt
+@query_budget(queries=18, duplicates=2)  # máx. medido: 14 (DELETE; con pedidos, unas 6 más por pedido)
 def api_users(request, pk=None):
     """
     API endpoint to manage users.
@@ -1655,14 +1736,18 @@ def api_users(request, pk=None):
     # --- Manejo de la lista de usuarios (GET) ---
     elif request.method == 'GET':
         users = User.objects.prefetch_related('groups').all().order_by('username')
-        data = [{
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'group_id': user.groups.first().id if user.groups.exists() else None,
-            'group_name': user.groups.first().name if user.groups.exists() else 'N/A',
-            'last_login': user.last_login.strftime('%Y-%m-%d %H:%M') if user.last_login else 'Nunca'
-        } for user in users]
+        data = []
+        for user in users:
+            # Grupos ya precargados: first()/exists() harían una consulta por usuario
+            group = min(user.groups.all(), key=lambda g: g.id, default=None)
+            data.append({
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'group_id': group.id if group else None,
+                'group_name': group.name if group else 'N/A',
+                'last_login': user.last_login.strftime('%Y-%m-%d %H:%M') if user.last_login else 'Nunca'
+            })
         return JsonResponse(data, safe=False)
 
     # Método no permitido para la URL solicitada
@@ -1674,7 +1759,7 @@ def serve_media_file(request, file_path):
     This is needed for production environments where DEBUG=False.
     """
     import os
-    from django.http import FileResponse
+    from .streaming import file_response
     
     # Secure the file path to prevent directory traversal attacks
     media_root = settings.MEDIA_ROOT
@@ -1690,13 +1775,16 @@ def serve_media_file(request, file_path):
     if not os.path.exists(requested_file) or not os.path.isfile(requested_file):
         return JsonResponse({'error': 'File not found'}, status=404)
     
+    import mimetypes
+    content_type = mimetypes.guess_type(requested_file)[0] or 'image/jpeg'
     try:
-        return FileResponse(open(requested_file, 'rb'), content_type='image/jpeg')
+        return file_response(request, open(requested_file, 'rb'), content_type=content_type)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 
 @csrf_exempt
+@etag_versioned('categories')
 def api_categories(request):
     """
     API para gestionar categorías.
@@ -1706,18 +1794,11 @@ def api_categories(request):
     """
     if request.method == 'GET':
         # GET es público - no requiere autenticación
-        categories = Category.objects.all().order_by('name')
-        data = [{
-            'id': cat.id,
-            'name': cat.name,
-            'description': cat.description or '',
-            'created_at': cat.created_at.isoformat()
-        } for cat in categories]
-        return JsonResponse(data, safe=False)
+        return JsonResponse(get_menu_catalog().categories, safe=False)
     
     elif request.method == 'POST':
         # POST requiere que sea admin
-        if not (request.user.is_authenticated and (request.user.is_superuser or request.user.groups.filter(name='Administrador').exists())):
+        if not has_role(request.user, 'Administrador', allow_superuser=True):
             return JsonResponse({'error': 'No tienes permiso para crear categorías.'}, status=403)
         
         try:
@@ -1750,7 +1831,7 @@ def api_categories(request):
     
     elif request.method == 'DELETE':
         # DELETE requiere que sea admin
-        if not (request.user.is_authenticated and (request.user.is_superuser or request.user.groups.filter(name='Administrador').exists())):
+        if not has_role(request.user, 'Administrador', allow_superuser=True):
             return JsonResponse({'error': 'No tienes permiso para eliminar categorías.'}, status=403)
         
         # Eliminar una categoría específica
@@ -1772,6 +1853,7 @@ def api_categories(request):
 
 
 @csrf_exempt
+@etag_versioned('categories')
 def api_categories_check(request):
     """
     Verifica si una categoría existe (case-insensitive) y detecta similares.
@@ -1827,7 +1909,8 @@ def api_categories_check(request):
 
 @csrf_exempt
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
+@query_budget(queries=23)  # máx. medido: 18
 def api_process_payment(request, pk):
     """
     API endpoint to process payment for an order.
@@ -1867,11 +1950,8 @@ def api_process_payment(request, pk):
             order.tip_amount = tip_amount
             if payment_reference:
                 order.payment_reference = payment_reference
-            # El total ya incluye los items, solo sumamos la propina
-            order.total_amount = sum(
-                item.menu_item.price * item.quantity 
-                for item in order.orderitem_set.all()
-            ) + tip_amount
+            # Subtotal de los items (una consulta agregada) más la propina
+            order.total_amount = calculate_order_subtotal(order) + tip_amount
             order.save()
         
         return JsonResponse({
@@ -1893,9 +1973,11 @@ def api_process_payment(request, pk):
 # ============ APIS PARA ROOMBILL ============
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 @csrf_exempt
-def api_get_unpaid_orders_by_room(request):
+@etag_versioned('orders', 'menu')
+@query_budget(queries=10, duplicates=1)  # máx. medido: 8
+async def api_get_unpaid_orders_by_room(request):
     """
     GET: Retorna los pedidos sin pagar agrupados por habitación y dentro de cada habitación por cliente
     """
@@ -1908,11 +1990,13 @@ def api_get_unpaid_orders_by_room(request):
         # Obtener solo pedidos servidos que no estén pagados
         unpaid_orders = Order.objects.filter(
             status__in=['served', 'charged_to_room']
-        ).select_related('user').order_by('room_number', 'client_identifier', '-created_at')
+        ).select_related('user').prefetch_related(
+            'orderitem_set__menu_item'
+        ).order_by('room_number', 'client_identifier', '-created_at')
         
         # Agrupar por habitación y dentro de cada habitación por cliente
         rooms = {}
-        for order in unpaid_orders:
+        async for order in unpaid_orders:
             room = order.room_number or 'Sin Habitación'
             client = order.client_identifier or 'Sin nombre'
             
@@ -1968,8 +2052,9 @@ def api_get_unpaid_orders_by_room(request):
 
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 @csrf_exempt
+@query_budget(queries=19, duplicates=2)  # máx. medido: 15
 def api_create_roombill(request):
     """
     POST: Crea una nueva factura de habitación con los pedidos seleccionados
@@ -2009,12 +2094,13 @@ def api_create_roombill(request):
             if order.room_number != room_number:
                 return JsonResponse({'error': f'El pedido {order.id} no es de la habitación {room_number}'}, status=400)
         
-        # Crear la factura
+        # Crear la factura con su total (suma de los pedidos ya cargados, como calculate_total)
         from .models import RoomBill
         bill = RoomBill.objects.create(
             room_number=room_number,
             guest_name=guest_name,
             tip_amount=tip_amount,
+            total_amount=sum(order.total_amount for order in orders) + tip_amount,
             created_by=request.user,
             status='draft'
         )
@@ -2022,11 +2108,6 @@ def api_create_roombill(request):
         # Agregar los pedidos
         bill.orders.set(orders)
         
-        # Calcular el total
-        total = bill.calculate_total() + tip_amount
-        bill.total_amount = total
-        bill.save()
-        
         return JsonResponse({
             'success': True,
             'bill_id': bill.id,
@@ -2042,8 +2123,9 @@ def api_create_roombill(request):
 
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 @csrf_exempt
+@etag_versioned('roombills')
 def api_get_roombills(request):
     """
     GET: Retorna las facturas de habitación filtradas por estado
@@ -2091,8 +2173,9 @@ def api_get_roombills(request):
 
 
 @login_required
-@user_passes_test(lambda u: u.groups.filter(name='Recepcionista').exists())
+@require_role('Recepcionista')
 @csrf_exempt
+@etag_versioned('roombills', 'orders', 'menu')
 def api_roombill_detail(request, bill_id):
     """
     GET: Obtiene los detalles de una factura
@@ -2188,129 +2271,107 @@ def api_roombill_detail(request, bill_id):
 def export_roombills_excel(request):
     """
     Exporta un reporte de facturas de habitación a un archivo Excel.
+    El libro se genera en modo write-only y se envía como streaming.
     """
-    from django.http import HttpResponse
     from django.utils import timezone
+    from .exports import XLSX_CONTENT_TYPE, build_workbook_file, filter_roombills_for_export, write_roombills_workbook
+    from .streaming import file_response
 
-    # Obtener todas las facturas
-    bills = RoomBill.objects.prefetch_related('orders__orderitem_set').all()
-
-    # Filtrado opcional por estado (puede ser múltiple separado por comas)
-    status_query = request.GET.get('status', '')
-    if status_query:
-        if status_query != 'all':
-            statuses = status_query.split(',')
-            bills = bills.filter(status__in=statuses)
-
-    # Filtrado opcional por fecha
-    date_from_query = request.GET.get('date_from', '')
-    if date_from_query:
-        bills = bills.filter(created_at__date__gte=date_from_query)
-
-    date_to_query = request.GET.get('date_to', '')
-    if date_to_query:
-        bills = bills.filter(created_at__date__lte=date_to_query)
-
-    # Filtrado opcional por habitación
-    room_query = request.GET.get('room', '')
-    if room_query:
-        bills = bills.filter(room_number__icontains=room_query)
-
-    bills = bills.order_by('-created_at')
-
-    # Crear libro de Excel
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte de Facturas"
-
-    # Definir estilos
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="6F4E37", end_color="6F4E37", fill_type="solid")  # Color café
-    total_font = Font(bold=True)
-    currency_format = '"$"#,##0.00'
-    date_format = 'yyyy-mm-dd hh:mm'
-
-    # Escribir encabezados
-    headers = ['ID Factura', 'Habitación', 'Estado', 'Subtotal', 'Propina', 'Total', 'Método de Pago', 'Fecha de Creación', 'Fecha de Pago']
-    for col_num, header_title in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_num, value=header_title)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-
-    # Escribir datos
-    grand_total = decimal.Decimal('0.00')
-    grand_subtotal = decimal.Decimal('0.00')
-    grand_tip = decimal.Decimal('0.00')
-    row_num = 2
-
-    for bill in bills:
-        subtotal = bill.total_amount - bill.tip_amount
-        grand_total += bill.total_amount
-        grand_subtotal += subtotal
-        grand_tip += bill.tip_amount
-
-        local_time = timezone.localtime(bill.created_at).strftime('%Y-%m-%d %H:%M')
-        paid_time = timezone.localtime(bill.paid_at).strftime('%Y-%m-%d %H:%M') if bill.paid_at else '-'
-
-        ws.cell(row=row_num, column=1, value=bill.id)
-        ws.cell(row=row_num, column=2, value=bill.room_number)
-        ws.cell(row=row_num, column=3, value=bill.get_status_display())
-
-        subtotal_cell = ws.cell(row=row_num, column=4, value=float(subtotal))
-        subtotal_cell.number_format = currency_format
-
-        tip_cell = ws.cell(row=row_num, column=5, value=float(bill.tip_amount))
-        tip_cell.number_format = currency_format
-
-        total_cell = ws.cell(row=row_num, column=6, value=float(bill.total_amount))
-        total_cell.number_format = currency_format
-
-        ws.cell(row=row_num, column=7, value=bill.get_payment_method_display() if bill.payment_method else '-')
-        ws.cell(row=row_num, column=8, value=local_time)
-        ws.cell(row=row_num, column=9, value=paid_time)
-
-        row_num += 1
-
-    # Escribir fila de totales
-    # Fila de Subtotal
-    subtotal_label_cell = ws.cell(row=row_num + 1, column=3, value="Subtotal:")
-    subtotal_label_cell.font = total_font
-    subtotal_label_cell.alignment = Alignment(horizontal='right')
-
-    subtotal_total_cell = ws.cell(row=row_num + 1, column=4, value=float(grand_subtotal))
-    subtotal_total_cell.font = total_font
-    subtotal_total_cell.number_format = currency_format
-    subtotal_total_cell.fill = PatternFill(start_color="FCD34D", end_color="FCD34D", fill_type="solid")
-
-    # Fila de Propina
-    tip_label_cell = ws.cell(row=row_num + 2, column=3, value="Propina:")
-    tip_label_cell.font = total_font
-    tip_label_cell.alignment = Alignment(horizontal='right')
-
-    tip_total_cell = ws.cell(row=row_num + 2, column=5, value=float(grand_tip))
-    tip_total_cell.font = total_font
-    tip_total_cell.number_format = currency_format
-    tip_total_cell.fill = PatternFill(start_color="FCD34D", end_color="FCD34D", fill_type="solid")
-
-    # Fila de Total con Propina
-    final_total_label_cell = ws.cell(row=row_num + 3, column=3, value="TOTAL CON PROPINA:")
-    final_total_label_cell.font = Font(bold=True, size=12)
-    final_total_label_cell.alignment = Alignment(horizontal='right')
-
-    grand_total_cell = ws.cell(row=row_num + 3, column=6, value=float(grand_total))
-    grand_total_cell.font = Font(bold=True, size=12)
-    grand_total_cell.number_format = currency_format
-    grand_total_cell.fill = PatternFill(start_color="FCD34D", end_color="FCD34D", fill_type="solid")
-
-    # Ajustar ancho de columnas
-    for col_num, header_title in enumerate(headers, 1):
-        column_letter = get_column_letter(col_num)
-        ws.column_dimensions[column_letter].width = 18
-
-    # Crear respuesta HTTP
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="reporte_facturas_{timezone.now().strftime("%Y-%m-%d")}.xlsx"'
-    wb.save(response)
-
-    return response
\ No newline at end of file
+    bills = filter_roombills_for_export(request.GET)
+
+    return file_response(
+        request,
+        build_workbook_file(write_roombills_workbook, bills),
+        as_attachment=True,
+        filename=f'reporte_facturas_{timezone.now().strftime("%Y-%m-%d")}.xlsx',
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+# Roles que pueden exportar cada tipo de reporte (None = cualquier usuario autenticado),
+# igual que export_orders_excel y export_roombills_excel
+EXPORT_JOB_ROLES = {
+    'orders': ('Administrador', 'Recepcionista'),
+    'roombills': None,
+}
+
+
+def can_access_export(user, kind):
+    roles = EXPORT_JOB_ROLES.get(kind)
+    return roles is None or has_role(user, *roles, allow_superuser=True)
+
+
+@login_required
+@csrf_exempt
+def api_export_jobs(request):
+    """
+    POST /api/exports/ -> Enqueue a background export.
+    Body: {"kind": "orders"|"roombills", "format": "xlsx"|"csv", "filters": {...}}
+    Returns 202 with the job; identical recent requests reuse the same job.
+    """
+    from .export_jobs import request_export, serialize_export_job
+
+    if request.method != 'POST':
+        return JsonResponse({'error': f'Método {request.method} no permitido.'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    kind = data.get('kind', 'orders')
+    if kind not in EXPORT_JOB_ROLES:
+        return JsonResponse({'error': f'Tipo de exportación no válido: {kind}'}, status=400)
+    if not can_access_export(request.user, kind):
+        return JsonResponse({'error': 'No tienes permiso para esta exportación'}, status=403)
+
+    try:
+        job, reused = request_export(kind, data.get('format', 'xlsx'), data.get('filters') or {}, request.user)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response_data = serialize_export_job(job)
+    response_data['reused'] = reused
+    return JsonResponse(response_data, status=202)
+
+
+@login_required
+def api_export_job_detail(request, pk):
+    """
+    GET /api/exports/<pk>/ -> Status of an export job (poll until status is 'done' or 'failed').
+    """
+    from .export_jobs import serialize_export_job
+    from .models import ExportJob
+
+    job = get_object_or_404(ExportJob, pk=pk)
+    if not can_access_export(request.user, job.kind):
+        return JsonResponse({'error': 'No tienes permiso para esta exportación'}, status=403)
+    return JsonResponse(serialize_export_job(job))
+
+
+@login_required
+def api_export_job_download(request, pk):
+    """
+    GET /api/exports/<pk>/download/ -> Stream the generated file.
+    """
+    from .export_jobs import artifact_path
+    from .exports import CSV_CONTENT_TYPE, XLSX_CONTENT_TYPE
+    from .models import ExportJob
+    from .streaming import file_response
+
+    job = get_object_or_404(ExportJob, pk=pk)
+    if not can_access_export(request.user, job.kind):
+        return JsonResponse({'error': 'No tienes permiso para esta exportación'}, status=403)
+    if job.status != 'done':
+        return JsonResponse({'error': 'La exportación aún no está lista', 'status': job.status}, status=409)
+
+    path = artifact_path(job)
+    if not os.path.exists(path):
+        return JsonResponse({'error': 'El archivo de exportación ya no está disponible'}, status=410)
+
+    return file_response(
+        request,
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=job.filename,
+        content_type=XLSX_CONTENT_TYPE if job.format == 'xlsx' else CSV_CONTENT_TYPE,
+    )